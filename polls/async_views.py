@@ -0,0 +1,214 @@
+"""
+投票、结果和详情接口的原生异步版本，需要以ASGI方式部署（settings.POLLS_ASYNC_VIEWS = True 时由urls.py启用）
+
+等待Postgres和Redis时不占用线程，一个ASGI worker可以同时处理大量进行中的投票请求。
+数据库访问使用Django的异步ORM，缓存访问使用 redis.asyncio；
+响应内容与 views.py 中对应的同步视图相同，WSGI部署继续使用同步视图。
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+
+from .auth import CustomerAuthentication
+from .cache import (
+    aget_or_load_versioned_poll, aset_poll_to_cache, aincrement_option_count, aget_unique_voter_count, aget_poll_version,
+    aget_poll_by_identifier_from_cache, aset_poll_identifiers_to_cache, DUPLICATE_VOTE, ALREADY_VOTED, POLL_CLOSED,
+    VOTE_CACHE_UNAVAILABLE,
+)
+from .counters import aadd_option_votes
+from .identifiers import IDENTIFIER_DIGITS
+from .models import Poll
+from .results import build_poll_results
+from .serializers import PollSerializer
+from .views import (
+    POLL_OPTIONS_PREFETCH, PollViewSet, get_idempotency_key, get_voter_id, remember_voter, requested_poll_etags,
+    not_modified_for_version, with_etag,
+)
+
+# 详情之外的方法（修改、删除）仍交给同步的视图集处理
+poll_viewset_detail = PollViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+})
+
+
+def poll_detail_queryset():
+    # 序列化发生在异步上下文中，不能隐式查询，选项和分片计数必须预取
+    return Poll.objects.prefetch_related(*POLL_OPTIONS_PREFETCH)
+
+
+async def aload_versioned_poll_data(poll_id, min_version=None):
+    """load_versioned_poll_data 的异步版本"""
+    async def load_from_db():
+        try:
+            poll = await poll_detail_queryset().aget(poll_id=poll_id)
+        except Poll.DoesNotExist:
+            raise Http404("找不到该投票问卷")
+        return PollSerializer(poll).data
+
+    return await aget_or_load_versioned_poll(poll_id, load_from_db, min_version)
+
+
+async def aauthenticate(request):
+    """用 CustomerAuthentication 认证请求，没有令牌时返回AnonymousUser，不访问会话"""
+    if not request.META.get('HTTP_AUTHORIZATION', '').startswith('Bearer '):
+        return AnonymousUser()
+    result = await sync_to_async(CustomerAuthentication().authenticate)(request)
+    return result[0] if result else AnonymousUser()
+
+
+async def anot_modified_response(request, poll_id=None, identifier=None):
+    """not_modified_response 的异步版本"""
+    target, etags = requested_poll_etags(request, poll_id)
+    if target is None:
+        return None, None
+    version = await aget_poll_version(target, identifier)
+    return not_modified_for_version(target, etags, version), version
+
+
+def parse_request_data(request):
+    """解析JSON或表单请求体，JSON格式错误时抛出ValueError"""
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是JSON对象")
+        return data
+    return request.POST
+
+
+async def arecord_vote_on_cache_miss(poll, option, idempotency_key=None, voter_id=None):
+    """record_vote_on_cache_miss 的异步版本，poll需要预取选项"""
+    await aset_poll_to_cache(poll.poll_id, PollSerializer(poll).data)
+    result = await aincrement_option_count(poll.poll_id, option.option_id, idempotency_key, voter_id)
+    if result == VOTE_CACHE_UNAVAILABLE:
+        await aadd_option_votes(option.option_id, 1, option.shard_count)
+    return result
+
+
+@csrf_exempt
+async def poll_detail(request, pk):
+    """PollViewSet.retrieve 的异步版本"""
+    if request.method != 'GET':
+        return await sync_to_async(poll_viewset_detail)(request, pk=pk)
+    response, current_version = await anot_modified_response(request, poll_id=pk)
+    if response is not None:
+        return response
+    try:
+        poll_data, version = await aload_versioned_poll_data(pk, current_version)
+        return with_etag(JsonResponse(poll_data), pk, version)
+    except Http404 as e:
+        return JsonResponse({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+
+@require_GET
+async def poll_results(request, poll_id):
+    """poll_results 的异步版本，投票数据和独立投票人数并发读取"""
+    response, current_version = await anot_modified_response(request, poll_id=poll_id)
+    if response is not None:
+        return response
+    try:
+        (poll_data, version), unique_voters = await asyncio.gather(
+            aload_versioned_poll_data(poll_id, current_version), aget_unique_voter_count(poll_id),
+        )
+    except Http404 as e:
+        return JsonResponse({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+    results = build_poll_results(poll_data)
+    results['unique_voters'] = unique_voters
+    return with_etag(JsonResponse(results), poll_id, version)
+
+
+@require_GET
+async def get_poll_by_identifier(request, identifier):
+    """get_poll_by_identifier 的异步版本"""
+    not_found = JsonResponse({"error": "找不到该投票问卷"}, status=status.HTTP_404_NOT_FOUND)
+    if len(identifier) != IDENTIFIER_DIGITS or not identifier.isdigit():
+        return not_found
+
+    response, current_version = await anot_modified_response(request, identifier=identifier)
+    if response is not None:
+        return response
+
+    poll_id, poll_data, version = await aget_poll_by_identifier_from_cache(identifier)
+    if poll_data is not None:
+        return with_etag(JsonResponse(poll_data), poll_id, version)
+    if poll_id == 0:
+        return not_found
+    if poll_id is None:
+        poll_id = await Poll.objects.filter(identifier=identifier).values_list('poll_id', flat=True).afirst()
+        if poll_id is None:
+            await aset_poll_identifiers_to_cache({identifier: None})
+            return not_found
+
+    try:
+        poll_data, version = await aload_versioned_poll_data(poll_id, current_version)
+        return with_etag(JsonResponse(poll_data), poll_id, version)
+    except Http404:
+        await aset_poll_identifiers_to_cache({identifier: None})
+        return not_found
+
+
+@csrf_exempt
+@require_POST
+async def public_vote(request, poll_id):
+    """public_vote 的异步版本"""
+    try:
+        try:
+            data = parse_request_data(request)
+            idempotency_key = get_idempotency_key(request, data)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            user = await aauthenticate(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_403_FORBIDDEN)
+        option_id = data.get('option_id')
+
+        # 快速路径：缓存命中时一次Redis往返即可完成校验、去重、投票人检查和计票
+        voter_id = get_voter_id(request, user)
+        result = await aincrement_option_count(poll_id, option_id, idempotency_key, voter_id) if option_id else None
+        if result == POLL_CLOSED:
+            return JsonResponse({"error": "此投票已结束"}, status=status.HTTP_400_BAD_REQUEST)
+        if result == ALREADY_VOTED:
+            return remember_voter(
+                request, JsonResponse({"error": "您已经投过票了"}, status=status.HTTP_400_BAD_REQUEST), voter_id)
+        if result == DUPLICATE_VOTE:
+            return remember_voter(request, JsonResponse({"status": "投票成功", "duplicate": True}), voter_id)
+        if result is not None and result != VOTE_CACHE_UNAVAILABLE:
+            return remember_voter(request, JsonResponse({"status": "投票成功"}), voter_id)
+
+        try:
+            poll = await poll_detail_queryset().aget(poll_id=poll_id)
+        except Poll.DoesNotExist:
+            return JsonResponse({"error": "找不到该投票问卷"}, status=status.HTTP_404_NOT_FOUND)
+
+        if not poll.active:
+            return JsonResponse({"error": "此投票已结束"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not option_id:
+            return JsonResponse({"error": "请选择一个选项"}, status=status.HTTP_400_BAD_REQUEST)
+
+        option = next((option for option in poll.options.all() if str(option.option_id) == str(option_id)), None)
+        if option is None:
+            return JsonResponse({"error": "找不到该选项"}, status=status.HTTP_404_NOT_FOUND)
+
+        result = await arecord_vote_on_cache_miss(poll, option, idempotency_key, voter_id)
+        if result is None:
+            return JsonResponse({"error": "暂时无法计票，请稍后重试"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if result == POLL_CLOSED:
+            return JsonResponse({"error": "此投票已结束"}, status=status.HTTP_400_BAD_REQUEST)
+        if result == ALREADY_VOTED:
+            return remember_voter(
+                request, JsonResponse({"error": "您已经投过票了"}, status=status.HTTP_400_BAD_REQUEST), voter_id)
+        if result == DUPLICATE_VOTE:
+            return remember_voter(request, JsonResponse({"status": "投票成功", "duplicate": True}), voter_id)
+
+        return remember_voter(request, JsonResponse({"status": "投票成功"}), voter_id)
+
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1,12 +1,81 @@
+import hashlib
+import time
+
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 import jwt
 from django.conf import settings
+from .cache import LocalCache, is_token_revoked
 from .models import Customer
 from .models import Administrator
 
+# 令牌中没有name/email声明时，缓存数据库查到的 (name, email)，避免每个请求都查询用户
+principal_cache = LocalCache(
+    maxsize=getattr(settings, 'JWT_PRINCIPAL_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'JWT_PRINCIPAL_CACHE_TTL', 0),
+)
+
+
+# 已验证令牌的载荷缓存，键为令牌的SHA-256摘要，条目在令牌的exp时刻过期
+token_cache = LocalCache(
+    maxsize=getattr(settings, 'JWT_TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'JWT_TOKEN_CACHE_MAX_TTL', 3600),
+)
+
+
+def decode_token(token):
+    """
+    验证并解码令牌
+    同一令牌在有效期内重复出现时直接返回缓存的载荷，省去HS256签名校验和JSON解析
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    exp = payload.get('exp')
+    ttl = token_cache.ttl if exp is None else min(token_cache.ttl, exp - time.time())
+    token_cache.set(key, payload, ttl=ttl)
+    return payload
+
+
+def get_token_cache_stats():
+    """令牌缓存的命中率等指标"""
+    return token_cache.stats()
+
+
+def build_customer_principal(user_id, name, email):
+    """
+    用令牌中的声明构造Customer实例，不查询数据库
+    password等其余字段为延迟加载，真正用到时（如修改密码）才查询；
+    save() 只更新已加载的字段
+    """
+    return Customer.from_db('default', ['customer_id', 'name', 'email'], [user_id, name, email])
+
 
 class CustomerAuthentication(BaseAuthentication):
+    def get_customer(self, user_id, payload):
+        """
+        获取当前用户
+        无状态模式下直接信任已签名的声明（generate_token/get_tokens_for_customer 写入的 name、email），
+        声明不完整时查询数据库，并可选地缓存查询结果
+        """
+        stateless = getattr(settings, 'JWT_STATELESS_AUTH', True)
+        if stateless:
+            claims = None
+            if payload.get('name') is not None and payload.get('email') is not None:
+                claims = (payload['name'], payload['email'])
+            else:
+                claims = principal_cache.get(user_id)
+            if claims:
+                return build_customer_principal(user_id, *claims)
+
+        user = Customer.objects.filter(customer_id=user_id).first()
+        if user and stateless:
+            principal_cache.set(user_id, (user.name, user.email))
+        return user
+
     def authenticate(self, request):
         # 获取认证头
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
@@ -18,11 +87,7 @@ class CustomerAuthentication(BaseAuthentication):
 
         try:
             # 解码令牌
-            payload = jwt.decode(
-                token,
-                settings.SECRET_KEY,
-                algorithms=['HS256']
-            )
+            payload = decode_token(token)
 
             admin_id = payload.get('admin_id')
 
@@ -37,8 +102,12 @@ class CustomerAuthentication(BaseAuthentication):
             if not user_id:
                 raise AuthenticationFailed('令牌无效')
 
-            # 查询用户
-            user = Customer.objects.filter(customer_id=user_id).first()
+            # 检查令牌是否已被吊销
+            if is_token_revoked(user_id, payload.get('iat')):
+                raise AuthenticationFailed('令牌已失效')
+
+            # 获取用户
+            user = self.get_customer(user_id, payload)
             if not user:
                 raise AuthenticationFailed('用户不存在')
 
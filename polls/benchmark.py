@@ -0,0 +1,160 @@
+"""
+投票热点路径的压测工具，由 manage.py benchmark_polls 调用
+
+对每个接口在给定并发下发送请求，统计延迟分位数、吞吐量和每个请求的SQL查询数，
+结果以JSON输出，并可以与之前的结果对比以发现性能回退。
+"""
+import itertools
+import json
+import random
+import statistics
+import threading
+import time
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Customer, Poll, Option
+
+# 可压测的接口：名称 -> (HTTP方法, 生成URL和请求体的函数)
+ENDPOINTS = {
+    'public_vote': ('post', lambda poll, option: (
+        reverse('polls:public-vote-api', args=[poll.poll_id]), {'option_id': option.option_id})),
+    'vote': ('post', lambda poll, option: (
+        reverse('polls:poll-vote', args=[poll.poll_id]), {'option_id': option.option_id})),
+    'results': ('get', lambda poll, option: (
+        reverse('polls:poll-results', args=[poll.poll_id]), None)),
+    'retrieve': ('get', lambda poll, option: (
+        reverse('polls:poll-detail', args=[poll.poll_id]), None)),
+}
+
+# 投票请求的模拟投票人地址序号，所有接口共用，同一进程内的每个投票请求都来自不同的投票人
+_voter_sequence = itertools.count()
+
+
+def next_voter_address():
+    """返回一个尚未使用过的模拟投票人地址"""
+    n = next(_voter_sequence)
+    return f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}'
+
+
+# 对比时判定为回退的指标：指标名 -> 数值越大越好
+COMPARED_METRICS = {
+    'p50_ms': False,
+    'p99_ms': False,
+    'throughput_rps': True,
+    'queries_per_request': False,
+}
+
+
+def seed_polls(poll_count, option_count):
+    """创建压测用的投票数据"""
+    customer = Customer.objects.create(name='benchmark', email='benchmark@example.com', password='!')
+    polls = []
+    for i in range(poll_count):
+        poll = Poll.objects.create(customer=customer, title=f'benchmark {i}', active=True)
+        Option.objects.bulk_create(Option(poll=poll, content=f'option {j}') for j in range(option_count))
+        polls.append(poll)
+    return [(poll, list(poll.options.all())) for poll in polls]
+
+
+def percentile(sorted_values, pct):
+    """最近秩法计算分位数"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_endpoint(name, polls, requests, concurrency):
+    """在给定并发下压测单个接口，返回统计结果"""
+    method, build = ENDPOINTS[name]
+    latencies = []
+    queries = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker():
+        nonlocal errors
+        client = Client()
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                    address = next_voter_address() if method == 'post' else None
+                poll, options = random.choice(polls)
+                url, data = build(poll, random.choice(options))
+
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    if method == 'post':
+                        # 每个请求模拟一个不同的投票人，避免被每人一票的限制拒绝
+                        response = client.post(url, data, content_type='application/json', REMOTE_ADDR=address)
+                    else:
+                        response = client.get(url)
+                    elapsed = (time.perf_counter() - start) * 1000
+
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(len(ctx.captured_queries))
+                    if response.status_code >= 400:
+                        errors += 1
+        finally:
+            # 每个线程有自己的数据库连接，结束时关闭，便于销毁测试数据库
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'throughput_rps': round(requests / wall, 1),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+    }
+
+
+def compare_results(baseline, current, threshold):
+    """
+    对比两次压测结果，返回回退列表
+    某个指标比基线差超过threshold（比例）时视为回退
+    """
+    regressions = []
+    for name, metrics in current['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(name)
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -threshold) if higher_is_better else (change > threshold):
+                regressions.append({
+                    'endpoint': name,
+                    'metric': metric,
+                    'baseline': old,
+                    'current': new,
+                    'change': round(change * 100, 1),
+                })
+    return regressions
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -1,45 +1,1296 @@
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
 import redis
+import redis.asyncio
+import redis.asyncio.retry
+import redis.asyncio.sentinel
+import redis.sentinel
 import json
 from django.conf import settings
+from django.http import Http404
+from redis.backoff import ExponentialBackoff
+from redis.connection import parse_url
+from redis.retry import Retry
+
+# Redis客户端的默认配置，可以在 settings.POLLS_REDIS 中逐项覆盖
+DEFAULT_REDIS_OPTIONS = {
+    'LOCATION': None,
+    'MAX_CONNECTIONS': 50,
+    'POOL_TIMEOUT': 1.0,
+    'SOCKET_TIMEOUT': 0.5,
+    'SOCKET_CONNECT_TIMEOUT': 0.5,
+    'HEALTH_CHECK_INTERVAL': 30,
+    'RETRY_ATTEMPTS': 1,
+    'SENTINELS': [],
+    'SENTINEL_SERVICE': 'mymaster',
+}
+
+# 订阅频道时每次等待消息的时间（秒），空闲时不会触发socket_timeout
+PUBSUB_POLL_INTERVAL = 1.0
+
+
+def redis_options():
+    """合并 POLLS_REDIS 与默认配置；未指定LOCATION时使用 CACHES['default'] 的地址"""
+    options = dict(DEFAULT_REDIS_OPTIONS)
+    options.update(getattr(settings, 'POLLS_REDIS', {}))
+    if not options['LOCATION']:
+        location = settings.CACHES.get('default', {}).get('LOCATION') or 'redis://localhost:6379/1'
+        if isinstance(location, (list, tuple)):
+            location = location[0]
+        options['LOCATION'] = location.split(',')[0]
+    return options
+
+
+def build_redis_client(asyncio=False, options=None):
+    """
+    根据配置创建Redis客户端：有界的阻塞连接池、连接和读写超时、定期健康检查，
+    连接错误和超时只快速重试有限次数，Redis不可用时各缓存函数可以尽快回退。
+    配置了SENTINELS时通过Sentinel发现主节点，主从切换后自动重连新的主节点。
+    """
+    options = options or redis_options()
+    retry_class = redis.asyncio.retry.Retry if asyncio else Retry
+    connection_kwargs = {
+        'socket_timeout': options['SOCKET_TIMEOUT'],
+        'socket_connect_timeout': options['SOCKET_CONNECT_TIMEOUT'],
+        'socket_keepalive': True,
+        'health_check_interval': options['HEALTH_CHECK_INTERVAL'],
+        'retry': retry_class(ExponentialBackoff(cap=0.1, base=0.01), options['RETRY_ATTEMPTS']),
+    }
+
+    if options['SENTINELS']:
+        sentinel_module = redis.asyncio.sentinel if asyncio else redis.sentinel
+        url_kwargs = parse_url(options['LOCATION'])
+        sentinel = sentinel_module.Sentinel(
+            [tuple(address) for address in options['SENTINELS']],
+            sentinel_kwargs={
+                'socket_timeout': options['SOCKET_TIMEOUT'],
+                'socket_connect_timeout': options['SOCKET_CONNECT_TIMEOUT'],
+            },
+        )
+        return sentinel.master_for(
+            options['SENTINEL_SERVICE'],
+            db=url_kwargs.get('db', 0),
+            username=url_kwargs.get('username'),
+            password=url_kwargs.get('password'),
+            max_connections=options['MAX_CONNECTIONS'],
+            **connection_kwargs,
+        )
+
+    module = redis.asyncio if asyncio else redis
+    pool = module.BlockingConnectionPool.from_url(
+        options['LOCATION'],
+        max_connections=options['MAX_CONNECTIONS'],
+        timeout=options['POOL_TIMEOUT'],
+        **connection_kwargs,
+    )
+    return module.Redis(connection_pool=pool)
+
 
 # 连接到Redis
-redis_client = redis.Redis(host='localhost', port=6379, db=1)
+redis_client = build_redis_client()
+
+# ASGI视图（如实时结果推送）使用的异步客户端
+async_redis_client = build_redis_client(asyncio=True)
+
+# 缓存过期时间（秒），写入时随机缩短最多POLL_CACHE_TTL_JITTER比例，避免同时写入的缓存同时过期
+POLL_CACHE_TTL = 3600
+POLL_CACHE_TTL_JITTER = 0.1
+
+# 防止缓存击穿：重建锁的持有时间（毫秒），其他worker等待重建结果的最长时间和轮询间隔（秒）
+POLL_REBUILD_LOCK_MS = 3000
+POLL_REBUILD_WAIT = 1.0
+POLL_REBUILD_POLL_INTERVAL = 0.05
+
+# 概率性提前刷新（XFetch）的系数，越大越早刷新；没有记录重建耗时时按此耗时（秒）估计
+POLL_EARLY_REFRESH_BETA = 1.0
+POLL_DEFAULT_REBUILD_TIME = 0.05
+
+# 释放重建锁：只删除自己持有的锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+RELEASE_LOCK_SCRIPT_SHA = hashlib.sha1(RELEASE_LOCK_SCRIPT.encode()).hexdigest()
+
+# 重建时发现投票不存在：持锁者把锁的值换成该标记并缩短过期时间（毫秒），等待者看到标记后直接返回404
+POLL_MISSING_MARKER = 'missing'
+POLL_MISSING_TTL_MS = 5000
+
+# 标记投票不存在：只替换自己持有的锁
+MARK_MISSING_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+    return 1
+end
+return 0
+"""
+MARK_MISSING_SCRIPT_SHA = hashlib.sha1(MARK_MISSING_SCRIPT.encode()).hexdigest()
+
+# 本地缓存失效广播频道，消息内容为poll_id
+POLL_INVALIDATION_CHANNEL = 'polls:invalidate'
+
+# 写后（write-behind）模式下的投票缓冲队列，元素格式为 "poll_id:option_id"
+VOTE_BUFFER_KEY = 'votes:buffer'
+
+# 正在写库的投票批次：每批移入 votes:processing:<批次ID> 列表，写库提交后删除；
+# 有序集合记录各批次的取出时间，超过VOTE_PROCESSING_TIMEOUT（秒）仍未删除的批次（worker崩溃）放回缓冲队列
+VOTE_PROCESSING_KEY = 'votes:processing'
+VOTE_PROCESSING_TIMEOUT = 300
+
+# 取出一批缓冲投票：从队列头部移入批次列表并登记取出时间，一次往返内完成
+CLAIM_VOTES_SCRIPT = """
+local entries = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #entries == 0 then
+    return entries
+end
+redis.call('LTRIM', KEYS[1], #entries, -1)
+for i = 1, #entries, 1000 do
+    redis.call('RPUSH', KEYS[2], unpack(entries, i, math.min(i + 999, #entries)))
+end
+redis.call('ZADD', KEYS[3], ARGV[2], KEYS[2])
+return entries
+"""
+CLAIM_VOTES_SCRIPT_SHA = hashlib.sha1(CLAIM_VOTES_SCRIPT.encode()).hexdigest()
+
+# 把一个批次按原顺序放回缓冲队列头部并删除批次
+REQUEUE_VOTES_SCRIPT = """
+local entries = redis.call('LRANGE', KEYS[2], 0, -1)
+for i = #entries, 1, -1 do
+    redis.call('LPUSH', KEYS[1], entries[i])
+end
+redis.call('DEL', KEYS[2])
+redis.call('ZREM', KEYS[3], KEYS[2])
+return #entries
+"""
+REQUEUE_VOTES_SCRIPT_SHA = hashlib.sha1(REQUEUE_VOTES_SCRIPT.encode()).hexdigest()
+
+# 直接模式下有新投票、尚未同步到数据库的投票ID集合
+DIRTY_POLLS_KEY = 'polls:dirty'
+
+# 投票幂等键的保留时间（秒），在此期间使用同一幂等键的重复提交不会重复计票
+VOTE_IDEMPOTENCY_TTL = 24 * 3600
+
+# increment_option_count 对重复提交、同一投票人再次投票和已结束投票的返回值
+DUPLICATE_VOTE = -1
+ALREADY_VOTED = -2
+POLL_CLOSED = -3
+# Redis不可用时 increment_option_count 的返回值，只有这种情况下调用方才直接更新数据库
+VOTE_CACHE_UNAVAILABLE = -4
+
+# 投票人记录的保留时间（秒），每次投票时刷新
+VOTER_RECORD_TTL = 30 * 24 * 3600
+
+# 按截止时间排序的有序集合，score为cut_off的时间戳，用于在截止时刻准时关闭投票
+POLL_EXPIRY_KEY = 'polls:expiry'
+
+# 投票版本号（用作ETag）的保留时间（秒），每次递增时刷新。
+# 版本号键不存在时以当前毫秒时间戳为初值再递增，过期后重建的版本号仍大于之前发出的任何版本号
+POLL_VERSION_TTL = 30 * 24 * 3600
+
+# 原子投票脚本：校验投票仍然有效、选项存在后对计数哈希执行HINCRBY，并刷新过期时间；
+# 写后模式下同时把投票追加到缓冲队列，由Celery任务批量写入数据库；
+# 直接模式下把投票ID加入脏集合，由定时同步任务只处理有变化的投票；
+# 最后在投票的更新频道上发布 "option_id:count"，供实时结果推送使用。
+# 带幂等键时（ARGV[6]为键的TTL）KEYS[5]已存在说明是重复提交，返回-1且不计票。
+# 投票人限制（ARGV[7]为模式，ARGV[8]为投票人标识）：set模式用集合KEYS[6]精确记录投票人，
+# bloom模式在位图KEYS[6]上检查和设置ARGV[12..]给出的布隆过滤器位；已投过票时返回-2且不计票。
+# 投票人同时加入HyperLogLog KEYS[7]，用于近似统计独立投票人数。
+# 计票的同时递增版本号KEYS[8]（ARGV[10]为版本号初值，ARGV[11]为保留时间）。
+# 返回新的票数；投票已结束时返回-3；缓存未命中或选项不在缓存中时返回nil，由调用方回退到数据库校验。
+VOTE_SCRIPT = """
+local meta = redis.call('GET', KEYS[1])
+if not meta then
+    return false
+end
+if cjson.decode(meta)['active'] == false then
+    return -3
+end
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 0 then
+    return false
+end
+if ARGV[6] ~= '0' and redis.call('EXISTS', KEYS[5]) == 1 then
+    return -1
+end
+if ARGV[7] == 'set' then
+    if redis.call('SADD', KEYS[6], ARGV[8]) == 0 then
+        return -2
+    end
+elseif ARGV[7] == 'bloom' then
+    local seen = true
+    for i = 12, #ARGV do
+        if redis.call('GETBIT', KEYS[6], ARGV[i]) == 0 then
+            seen = false
+            break
+        end
+    end
+    if seen then
+        return -2
+    end
+    for i = 12, #ARGV do
+        redis.call('SETBIT', KEYS[6], ARGV[i], 1)
+    end
+end
+if ARGV[7] ~= 'off' then
+    redis.call('EXPIRE', KEYS[6], ARGV[9])
+    redis.call('PFADD', KEYS[7], ARGV[8])
+    redis.call('EXPIRE', KEYS[7], ARGV[9])
+end
+if ARGV[6] ~= '0' then
+    redis.call('SET', KEYS[5], '1', 'EX', ARGV[6])
+end
+local count = redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+if ARGV[3] == 'buffered' then
+    redis.call('RPUSH', KEYS[3], ARGV[4] .. ':' .. ARGV[1])
+else
+    redis.call('SADD', KEYS[4], ARGV[4])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('SET', KEYS[8], ARGV[10], 'NX')
+redis.call('INCR', KEYS[8])
+redis.call('EXPIRE', KEYS[8], ARGV[11])
+redis.call('PUBLISH', ARGV[5], ARGV[1] .. ':' .. count)
+return count
+"""
+VOTE_SCRIPT_SHA = hashlib.sha1(VOTE_SCRIPT.encode()).hexdigest()
+
+# 投票码到poll_id的映射的保留时间（秒）；投票码不会改变，映射可以比投票数据保留得更久
+POLL_IDENTIFIER_TTL = 24 * 3600
+# 不存在的投票码的否定缓存：值为POLL_IDENTIFIER_MISSING，保留时间较短，
+# 抵御枚举投票码的扫描，同时避免新建投票长时间查不到
+POLL_IDENTIFIER_MISSING = '0'
+POLL_IDENTIFIER_MISS_TTL = 30
+
+# 按投票码读取投票：一次往返内解析映射并读取版本号、元数据和计数哈希
+# （键名与poll_version_key、poll_cache_key、poll_counts_key一致）。
+# 映射不存在时返回nil；否定缓存时返回 {'0'}；否则返回 {poll_id, 版本号, 元数据, 计数哈希的字段和值}
+IDENTIFIER_LOOKUP_SCRIPT = """
+local poll_id = redis.call('GET', KEYS[1])
+if not poll_id then
+    return false
+end
+if poll_id == ARGV[1] then
+    return {poll_id}
+end
+local key = 'poll:' .. poll_id
+local version = redis.call('GET', key .. ':version')
+return {poll_id, version, redis.call('GET', key), redis.call('HGETALL', key .. ':counts')}
+"""
+IDENTIFIER_LOOKUP_SCRIPT_SHA = hashlib.sha1(IDENTIFIER_LOOKUP_SCRIPT.encode()).hexdigest()
+
+
+class LocalCache:
+    """进程内的有界LRU缓存，条目写入ttl秒后过期，线程安全，并统计命中率"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """返回命中次数、未命中次数、命中率和当前条目数"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'size': len(self._data),
+            }
+
+
+# Redis前的进程内一级缓存，条目为 (poll_data, version)，版本号未知时为None；
+# TTL即读取时允许的最大陈旧时间；TTL为0时关闭
+local_poll_cache = LocalCache(
+    maxsize=getattr(settings, 'POLL_LOCAL_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'POLL_LOCAL_CACHE_TTL', 1.0),
+)
+_invalidation_listener = None
+_invalidation_listener_lock = threading.Lock()
+
+
+def _listen_for_invalidations():
+    """订阅失效广播，其他进程写入或清除投票缓存时删除本地副本；连接断开后退避重连"""
+    backoff = 1
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(POLL_INVALIDATION_CHANNEL)
+            backoff = 1
+            while True:
+                message = pubsub.get_message(timeout=PUBSUB_POLL_INTERVAL)
+                if message and message['type'] == 'message':
+                    local_poll_cache.delete(int(message['data']))
+        except Exception as e:
+            # 断线期间可能错过失效消息，清空本地缓存
+            local_poll_cache.clear()
+            print(f"订阅缓存失效广播失败: {str(e)}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+def _ensure_invalidation_listener():
+    """首次使用本地缓存时在后台线程中启动失效广播监听"""
+    global _invalidation_listener
+    if _invalidation_listener is not None:
+        return
+    with _invalidation_listener_lock:
+        if _invalidation_listener is None:
+            _invalidation_listener = threading.Thread(
+                target=_listen_for_invalidations, name='poll-cache-invalidation', daemon=True)
+            _invalidation_listener.start()
+
+
+def revoked_tokens_key(customer_id):
+    """记录用户令牌吊销时间的键，在此时间之前签发的令牌全部失效"""
+    return f'auth:revoked:{customer_id}'
+
+
+def poll_cache_key(poll_id):
+    """投票元数据（标题、选项内容等）的缓存键"""
+    return f'poll:{poll_id}'
+
+
+def poll_identifier_key(identifier):
+    """投票码到poll_id的映射"""
+    return f'poll:ident:{identifier}'
+
+
+def poll_version_key(poll_id):
+    """投票版本号，投票和编辑时递增，用作ETag"""
+    return f'poll:{poll_id}:version'
+
+
+def poll_rebuild_lock_key(poll_id):
+    """缓存重建锁，同一时间只有持有锁的worker从数据库重建投票缓存"""
+    return f'poll:{poll_id}:lock'
+
+
+def poll_counts_key(poll_id):
+    """投票计数哈希的缓存键，字段为option_id，值为票数"""
+    return f'poll:{poll_id}:counts'
+
+
+def poll_synced_counts_key(poll_id):
+    """计数哈希中已写回数据库的票数（同步基线），同步时只把超出基线的增量加到数据库"""
+    return f'poll:{poll_id}:synced'
+
+
+def vote_idempotency_key(poll_id, idempotency_key):
+    """幂等键按投票隔离，客户端提供的键经过哈希，Redis中的键长度固定"""
+    digest = hashlib.sha1(str(idempotency_key).encode()).hexdigest()
+    return f'vote:idem:{poll_id}:{digest}'
+
+
+def poll_voters_key(poll_id):
+    """已投票的投票人记录：set模式下为集合，bloom模式下为布隆过滤器位图"""
+    return f'poll:{poll_id}:voters'
+
+
+def poll_unique_voters_key(poll_id):
+    """独立投票人数的HyperLogLog"""
+    return f'poll:{poll_id}:uniques'
+
+
+def poll_updates_channel(poll_id):
+    """投票票数变化的发布/订阅频道"""
+    return f'poll:{poll_id}:updates'
+
+
+def vote_ingestion_mode():
+    """投票写入模式：direct（默认，由定时同步写回数据库）或 buffered（写后缓冲、批量落库）"""
+    return getattr(settings, 'VOTE_INGESTION_MODE', 'direct')
+
+
+def voter_limit_mode():
+    """
+    每个投票人只能投一票的校验方式：
+    set（默认）精确记录每个投票人；bloom 使用按预期投票人数确定大小的布隆过滤器，内存有界但有少量误判；off 不限制
+    """
+    return getattr(settings, 'VOTER_LIMIT_MODE', 'set')
+
+
+def bloom_filter_size():
+    """
+    按每个投票的预期投票人数n和目标误判率p计算布隆过滤器的位数m和哈希函数个数k：
+    m = -n·ln(p) / (ln2)²，k = (m/n)·ln2。投票人超过预期后误判率逐渐升高
+    """
+    n = max(int(getattr(settings, 'VOTER_BLOOM_EXPECTED_VOTERS', 100000)), 1)
+    p = float(getattr(settings, 'VOTER_BLOOM_ERROR_RATE', 0.01))
+    bits = max(math.ceil(-n * math.log(p) / math.log(2) ** 2), 8)
+    return bits, max(round(bits / n * math.log(2)), 1)
+
+
+def _bloom_positions(voter_id):
+    """用双重哈希计算投票人在布隆过滤器中的位"""
+    bits, hashes = bloom_filter_size()
+    digest = hashlib.sha256(voter_id.encode()).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:16], 'big') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def _run_script(script, sha, keys, args):
+    """优先用EVALSHA执行Lua脚本，Redis尚未缓存该脚本时回退到EVAL"""
+    try:
+        return redis_client.evalsha(sha, len(keys), *keys, *args)
+    except redis.exceptions.NoScriptError:
+        return redis_client.eval(script, len(keys), *keys, *args)
+
+
+async def _arun_script(script, sha, keys, args):
+    """_run_script 的异步版本"""
+    try:
+        return await async_redis_client.evalsha(sha, len(keys), *keys, *args)
+    except redis.exceptions.NoScriptError:
+        return await async_redis_client.eval(script, len(keys), *keys, *args)
+
+
+def _merge_poll_data(meta, counts):
+    """把元数据和计数哈希合并为与PollSerializer输出相同结构的数据，计数不完整时返回None"""
+    if not meta:
+        return None
+
+    poll_data = json.loads(meta)
+    poll_data.pop('_rebuild_time', None)
+    counts = {int(k): int(v) for k, v in counts.items()}
+    for option in poll_data['options']:
+        # 计数哈希缺少某个选项时视为未命中，由调用方从数据库重建
+        if option['option_id'] not in counts:
+            return None
+        option['count'] = counts[option['option_id']]
+    return poll_data
+
+
+def _get_local_poll(poll_id):
+    """读取进程内缓存，返回 (poll_data, version)；未命中或本地缓存关闭时返回 (None, None)"""
+    if local_poll_cache.ttl <= 0:
+        return None, None
+    _ensure_invalidation_listener()
+    return local_poll_cache.get(int(poll_id)) or (None, None)
+
 
 def get_poll_from_cache(poll_id):
-    """从Redis缓存获取投票数据"""
+    """
+    获取投票数据：先查进程内缓存，未命中时从Redis读取
+    Redis中的元数据和计数哈希在一次往返中读取并合并；返回的数据为共享副本，调用方不应修改
+    """
+    poll_data, _ = _get_local_poll(poll_id)
+    if poll_data is not None:
+        return poll_data
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(poll_cache_key(poll_id))
+        pipe.hgetall(poll_counts_key(poll_id))
+        poll_data = _merge_poll_data(*pipe.execute())
+        if poll_data is not None:
+            local_poll_cache.set(int(poll_id), (poll_data, None))
+        return poll_data
+    except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+    return None
+
+
+def get_polls_from_cache(poll_ids):
+    """
+    批量获取多个投票的数据：先查进程内缓存，其余投票的元数据和计数哈希在一次Redis往返中读取
+    返回 {poll_id: poll_data}，未命中的投票不出现在结果中
+    """
+    result, missing = {}, []
+    for poll_id in poll_ids:
+        poll_data, _ = _get_local_poll(poll_id)
+        if poll_data is not None:
+            result[poll_id] = poll_data
+        else:
+            missing.append(poll_id)
+    if not missing:
+        return result
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for poll_id in missing:
+            pipe.get(poll_cache_key(poll_id))
+            pipe.hgetall(poll_counts_key(poll_id))
+        replies = pipe.execute()
+        for i, poll_id in enumerate(missing):
+            poll_data = _merge_poll_data(replies[2 * i], replies[2 * i + 1])
+            if poll_data is not None:
+                local_poll_cache.set(int(poll_id), (poll_data, None))
+                result[poll_id] = poll_data
+    except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+    return result
+
+
+async def aget_poll_from_cache(poll_id):
+    """get_poll_from_cache 的异步版本"""
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(poll_cache_key(poll_id))
+            pipe.hgetall(poll_counts_key(poll_id))
+            return _merge_poll_data(*await pipe.execute())
+    except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+    return None
+
+
+def poll_cache_ttl():
+    """带随机抖动的缓存过期时间"""
+    return int(POLL_CACHE_TTL * (1 - random.uniform(0, POLL_CACHE_TTL_JITTER)))
+
+
+def _version_seed():
+    return int(time.time() * 1000)
+
+
+def _queue_version_bump(pipe, poll_id):
+    key = poll_version_key(poll_id)
+    pipe.set(key, _version_seed(), nx=True)
+    pipe.incr(key)
+    pipe.expire(key, POLL_VERSION_TTL)
+
+
+def _queue_version_ensure(pipe, poll_id):
+    """版本号不存在时设置初值，已有版本号保持不变"""
+    key = poll_version_key(poll_id)
+    pipe.set(key, _version_seed(), nx=True)
+    pipe.expire(key, POLL_VERSION_TTL)
+
+
+def _parse_version(version):
+    return int(version) if version is not None else None
+
+
+def _queue_poll_data(pipe, poll_id, poll_data, removed_option_ids=(), rebuild_time=None, bump_version=False):
+    """把写入一个投票缓存所需的命令加入流水线"""
+    meta = dict(poll_data)
+    meta['options'] = [
+        {k: v for k, v in option.items() if k != 'count'}
+        for option in poll_data.get('options', [])
+    ]
+    if rebuild_time is not None:
+        meta['_rebuild_time'] = rebuild_time
+
+    ttl = poll_cache_ttl()
+    pipe.set(poll_cache_key(poll_id), json.dumps(meta), ex=ttl)
+    if removed_option_ids:
+        pipe.hdel(poll_counts_key(poll_id), *removed_option_ids)
+        pipe.hdel(poll_synced_counts_key(poll_id), *removed_option_ids)
+    for option in poll_data.get('options', []):
+        # 计数和同步基线同时从数据库票数开始，基线只在计数第一次写入时设置
+        pipe.hsetnx(poll_counts_key(poll_id), option['option_id'], option.get('count', 0))
+        pipe.hsetnx(poll_synced_counts_key(poll_id), option['option_id'], option.get('count', 0))
+    pipe.expire(poll_counts_key(poll_id), ttl)
+    pipe.expire(poll_synced_counts_key(poll_id), ttl)
+    if poll_data.get('identifier'):
+        # 同时写入投票码映射，覆盖可能存在的否定缓存
+        pipe.set(poll_identifier_key(poll_data['identifier']), int(poll_id), ex=POLL_IDENTIFIER_TTL)
+    if bump_version:
+        _queue_version_bump(pipe, poll_id)
+    else:
+        _queue_version_ensure(pipe, poll_id)
+    pipe.publish(POLL_INVALIDATION_CHANNEL, int(poll_id))
+    local_poll_cache.delete(int(poll_id))
+
+
+def set_poll_to_cache(poll_id, poll_data, removed_option_ids=(), rebuild_time=None, bump_version=False):
+    """
+    将投票数据存入Redis缓存
+    元数据整体覆盖；计数只用HSETNX补齐缺失的选项，不覆盖已有计数，
+    避免丢失尚未同步到数据库的票数。编辑投票后传入已删除的选项ID，同一次往返内删除它们的计数
+    rebuild_time为从数据库重建这份数据的耗时（秒），用于决定何时提前刷新
+    只有内容改变（编辑投票）时传入bump_version=True递增版本号；从数据库重新填充缓存时内容不变，
+    版本号保持不变，客户端已有的ETag仍能得到304
+    """
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_poll_data(pipe, poll_id, poll_data, removed_option_ids, rebuild_time, bump_version)
+        pipe.execute()
+    except Exception as e:
+        print(f"设置缓存失败: {str(e)}")
+
+
+async def aset_poll_to_cache(poll_id, poll_data, removed_option_ids=(), rebuild_time=None, bump_version=False):
+    """set_poll_to_cache 的异步版本"""
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            _queue_poll_data(pipe, poll_id, poll_data, removed_option_ids, rebuild_time, bump_version)
+            await pipe.execute()
+    except Exception as e:
+        print(f"设置缓存失败: {str(e)}")
+
+
+def _queue_read_for_refresh(pipe, poll_id):
+    # 版本号先于数据读取，数据只可能比版本号新
+    pipe.get(poll_version_key(poll_id))
+    pipe.get(poll_cache_key(poll_id))
+    pipe.hgetall(poll_counts_key(poll_id))
+    pipe.pttl(poll_cache_key(poll_id))
+
+
+def _read_poll_for_refresh(poll_id):
+    """一次往返读取投票数据、元数据剩余过期时间（秒）、记录的重建耗时和版本号"""
+    pipe = redis_client.pipeline(transaction=False)
+    _queue_read_for_refresh(pipe, poll_id)
+    return _parse_refresh_reply(*pipe.execute())
+
+
+async def _aread_poll_for_refresh(poll_id):
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        _queue_read_for_refresh(pipe, poll_id)
+        return _parse_refresh_reply(*await pipe.execute())
+
+
+def _parse_refresh_reply(version, meta, counts, pttl):
+    version = _parse_version(version)
+    poll_data = _merge_poll_data(meta, counts)
+    if poll_data is None:
+        return None, 0, POLL_DEFAULT_REBUILD_TIME, version
+    rebuild_time = json.loads(meta).get('_rebuild_time') or POLL_DEFAULT_REBUILD_TIME
+    return poll_data, max(pttl, 0) / 1000, rebuild_time, version
+
+
+def _should_refresh_early(ttl, rebuild_time):
+    """XFetch：剩余时间越短、重建越慢，越可能提前刷新，使热点投票在过期前由一个请求重建"""
+    return -rebuild_time * POLL_EARLY_REFRESH_BETA * math.log(1 - random.random()) >= ttl
+
+
+def _acquire_rebuild_lock(poll_id):
+    token = uuid.uuid4().hex
+    if redis_client.set(poll_rebuild_lock_key(poll_id), token, nx=True, px=POLL_REBUILD_LOCK_MS):
+        return token
+    return None
+
+
+async def _aacquire_rebuild_lock(poll_id):
+    token = uuid.uuid4().hex
+    if await async_redis_client.set(poll_rebuild_lock_key(poll_id), token, nx=True, px=POLL_REBUILD_LOCK_MS):
+        return token
+    return None
+
+
+def _release_rebuild_lock(poll_id, token):
+    try:
+        _run_script(RELEASE_LOCK_SCRIPT, RELEASE_LOCK_SCRIPT_SHA, [poll_rebuild_lock_key(poll_id)], [token])
+    except Exception as e:
+        print(f"释放缓存重建锁失败: {str(e)}")
+
+
+async def _arelease_rebuild_lock(poll_id, token):
+    try:
+        await _arun_script(RELEASE_LOCK_SCRIPT, RELEASE_LOCK_SCRIPT_SHA, [poll_rebuild_lock_key(poll_id)], [token])
+    except Exception as e:
+        print(f"释放缓存重建锁失败: {str(e)}")
+
+
+def _mark_poll_missing(poll_id, token):
+    """把自己持有的重建锁换成不存在标记，之后释放锁时不会删除该标记"""
+    try:
+        _run_script(MARK_MISSING_SCRIPT, MARK_MISSING_SCRIPT_SHA, [poll_rebuild_lock_key(poll_id)],
+                    [token, POLL_MISSING_MARKER, POLL_MISSING_TTL_MS])
+    except Exception as e:
+        print(f"标记投票不存在失败: {str(e)}")
+
+
+async def _amark_poll_missing(poll_id, token):
+    try:
+        await _arun_script(MARK_MISSING_SCRIPT, MARK_MISSING_SCRIPT_SHA, [poll_rebuild_lock_key(poll_id)],
+                           [token, POLL_MISSING_MARKER, POLL_MISSING_TTL_MS])
+    except Exception as e:
+        print(f"标记投票不存在失败: {str(e)}")
+
+
+def _poll_marked_missing(poll_id):
+    try:
+        return redis_client.get(poll_rebuild_lock_key(poll_id)) == POLL_MISSING_MARKER.encode()
+    except Exception as e:
+        print(f"读取缓存重建锁失败: {str(e)}")
+        return False
+
+
+async def _apoll_marked_missing(poll_id):
+    try:
+        return await async_redis_client.get(poll_rebuild_lock_key(poll_id)) == POLL_MISSING_MARKER.encode()
+    except Exception as e:
+        print(f"读取缓存重建锁失败: {str(e)}")
+        return False
+
+
+def _rebuild_poll(poll_id, loader):
+    """重建投票缓存，返回 (poll_data, version)"""
+    started = time.monotonic()
+    poll_data = loader()
+    set_poll_to_cache(poll_id, poll_data, rebuild_time=round(time.monotonic() - started, 4))
+    # 计数哈希可能包含尚未同步到数据库的票数，以缓存中的计数为准；版本号与数据一起重新读取
+    try:
+        return _cached_rebuild_result(poll_id, poll_data, _read_poll_for_refresh(poll_id))
+    except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+    return poll_data, None
+
+
+async def _arebuild_poll(poll_id, loader):
+    started = time.monotonic()
+    poll_data = await loader()
+    await aset_poll_to_cache(poll_id, poll_data, rebuild_time=round(time.monotonic() - started, 4))
     try:
-        poll_data = redis_client.get(f'poll:{poll_id}')
-        if poll_data:
-            return json.loads(poll_data)
+        return _cached_rebuild_result(poll_id, poll_data, await _aread_poll_for_refresh(poll_id))
     except Exception as e:
         print(f"从缓存获取数据失败: {str(e)}")
+    return poll_data, None
+
+
+def _cached_rebuild_result(poll_id, poll_data, refresh_reply):
+    cached, _, _, version = refresh_reply
+    if cached is None:
+        return poll_data, None
+    local_poll_cache.set(int(poll_id), (cached, version))
+    return cached, version
+
+
+def get_or_load_poll(poll_id, loader):
+    """
+    读取投票数据，缓存未命中或即将过期时只由一个worker调用loader从数据库重建
+    - 命中：直接返回；剩余时间按XFetch概率触发提前刷新，拿到重建锁的请求重建，其余请求继续使用当前数据
+    - 未命中：拿到重建锁的worker重建，其余worker轮询等待重建结果，超时后自行加载
+    - 不存在：loader抛出Http404时在重建锁键上短时间记录，等待中和之后到达的请求直接抛出Http404
+    - Redis不可用：直接调用loader
+    loader返回与PollSerializer输出相同结构的数据，投票不存在时由loader抛出异常（如Http404）
+    """
+    poll_data, _ = _get_local_poll(poll_id)
+    if poll_data is not None:
+        return poll_data
+    return get_or_load_versioned_poll(poll_id, loader)[0]
+
+
+def get_or_load_versioned_poll(poll_id, loader, min_version=None):
+    """
+    与 get_or_load_poll 相同，同时返回版本号：(poll_data, version)
+    进程内缓存中的条目带有与数据同时读取的版本号、且不低于min_version时直接返回；
+    调用方已读到当前版本号（如条件请求未命中）时传入min_version，避免返回客户端已有的旧版本。
+    版本号与数据在同一次往返中读取，返回的数据不会比版本号旧；
+    无法保证这一点（等待其他worker重建、Redis不可用）时版本号为None
+    """
+    poll_data, version = _get_local_poll(poll_id)
+    if version is not None and version >= (min_version or 0):
+        return poll_data, version
+    try:
+        poll_data, ttl, rebuild_time, version = _read_poll_for_refresh(poll_id)
+        if poll_data is not None and not _should_refresh_early(ttl, rebuild_time):
+            local_poll_cache.set(int(poll_id), (poll_data, version))
+            return poll_data, version
+        token = _acquire_rebuild_lock(poll_id)
+    except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+        return loader(), None
+
+    if token is None:
+        if poll_data is not None:
+            # 其他worker正在提前刷新，继续使用当前数据
+            return poll_data, version
+        deadline = time.monotonic() + POLL_REBUILD_WAIT
+        while not _poll_marked_missing(poll_id):
+            if time.monotonic() >= deadline:
+                return _rebuild_poll(poll_id, loader)
+            time.sleep(POLL_REBUILD_POLL_INTERVAL)
+            poll_data = get_poll_from_cache(poll_id)
+            if poll_data is not None:
+                return poll_data, None
+        raise Http404("找不到该投票问卷")
+
+    try:
+        return _rebuild_poll(poll_id, loader)
+    except Http404:
+        _mark_poll_missing(poll_id, token)
+        raise
+    finally:
+        _release_rebuild_lock(poll_id, token)
+
+
+async def aget_or_load_poll(poll_id, loader):
+    """get_or_load_poll 的异步版本，loader为返回投票数据的协程函数，等待重建结果时不占用线程"""
+    poll_data, _ = _get_local_poll(poll_id)
+    if poll_data is not None:
+        return poll_data
+    return (await aget_or_load_versioned_poll(poll_id, loader))[0]
+
+
+async def aget_or_load_versioned_poll(poll_id, loader, min_version=None):
+    """get_or_load_versioned_poll 的异步版本"""
+    poll_data, version = _get_local_poll(poll_id)
+    if version is not None and version >= (min_version or 0):
+        return poll_data, version
+    try:
+        poll_data, ttl, rebuild_time, version = await _aread_poll_for_refresh(poll_id)
+        if poll_data is not None and not _should_refresh_early(ttl, rebuild_time):
+            local_poll_cache.set(int(poll_id), (poll_data, version))
+            return poll_data, version
+        token = await _aacquire_rebuild_lock(poll_id)
+    except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+        return await loader(), None
+
+    if token is None:
+        if poll_data is not None:
+            return poll_data, version
+        deadline = time.monotonic() + POLL_REBUILD_WAIT
+        while not await _apoll_marked_missing(poll_id):
+            if time.monotonic() >= deadline:
+                return await _arebuild_poll(poll_id, loader)
+            await asyncio.sleep(POLL_REBUILD_POLL_INTERVAL)
+            poll_data = await aget_poll_from_cache(poll_id)
+            if poll_data is not None:
+                return poll_data, None
+        raise Http404("找不到该投票问卷")
+
+    try:
+        return await _arebuild_poll(poll_id, loader)
+    except Http404:
+        await _amark_poll_missing(poll_id, token)
+        raise
+    finally:
+        await _arelease_rebuild_lock(poll_id, token)
+
+
+def get_poll_version(poll_id, identifier=None):
+    """
+    读取投票的当前版本号，只需一次Redis往返；Redis不可用或版本号不存在时返回None
+    提供投票码时在同一次往返中确认投票码映射到该投票，不一致时返回None
+    """
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_version_read(pipe, poll_id, identifier)
+        return _parse_version_reply(poll_id, identifier, pipe.execute())
+    except Exception as e:
+        print(f"获取投票版本号失败: {str(e)}")
     return None
 
-def set_poll_to_cache(poll_id, poll_data):
-    """将投票数据存入Redis缓存"""
+
+async def aget_poll_version(poll_id, identifier=None):
+    """get_poll_version 的异步版本"""
     try:
-        redis_client.set(f'poll:{poll_id}', json.dumps(poll_data))
-        redis_client.expire(f'poll:{poll_id}', 3600)
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            _queue_version_read(pipe, poll_id, identifier)
+            return _parse_version_reply(poll_id, identifier, await pipe.execute())
+    except Exception as e:
+        print(f"获取投票版本号失败: {str(e)}")
+    return None
+
+
+def _queue_version_read(pipe, poll_id, identifier):
+    pipe.get(poll_version_key(poll_id))
+    if identifier is not None:
+        pipe.get(poll_identifier_key(identifier))
+
+
+def _parse_version_reply(poll_id, identifier, replies):
+    if identifier is not None and (replies[1] is None or int(replies[1]) != int(poll_id)):
+        return None
+    return _parse_version(replies[0])
+
+
+def set_polls_to_cache(polls_data):
+    """批量写入多个投票的缓存，polls_data为 {poll_id: poll_data}，所有命令在一次往返中发送"""
+    if not polls_data:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for poll_id, poll_data in polls_data.items():
+            _queue_poll_data(pipe, poll_id, poll_data)
+        pipe.execute()
     except Exception as e:
         print(f"设置缓存失败: {str(e)}")
 
-def increment_option_count(poll_id, option_id):
-    """增加选项的投票数"""
+
+def _parse_identifier_lookup(reply):
+    if reply is None:
+        return None, None, None
+    poll_id = int(reply[0])
+    if not poll_id:
+        return 0, None, None
+    version, meta, fields = reply[1], reply[2], reply[3]
+    poll_data = _merge_poll_data(meta, dict(zip(fields[::2], fields[1::2])))
+    if poll_data is None:
+        return poll_id, None, None
+    version = _parse_version(version)
+    local_poll_cache.set(poll_id, (poll_data, version))
+    return poll_id, poll_data, version
+
+
+def get_poll_by_identifier_from_cache(identifier):
+    """
+    按投票码读取投票数据，映射、版本号、元数据和计数哈希在一次Redis往返中读取
+    返回 (poll_id, poll_data, version)：
+    - 投票码在否定缓存中：poll_id为0
+    - 映射未命中或Redis不可用：poll_id为None
+    - 映射命中但投票数据未命中：poll_data为None，调用方按poll_id加载
+    """
+    try:
+        return _parse_identifier_lookup(_run_script(
+            IDENTIFIER_LOOKUP_SCRIPT, IDENTIFIER_LOOKUP_SCRIPT_SHA,
+            [poll_identifier_key(identifier)], [POLL_IDENTIFIER_MISSING],
+        ))
+    except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+    return None, None, None
+
+
+async def aget_poll_by_identifier_from_cache(identifier):
+    """get_poll_by_identifier_from_cache 的异步版本"""
     try:
-        poll_data = get_poll_from_cache(poll_id)
-        if poll_data:
-            for option in poll_data['options']:
-                if option['option_id'] == option_id:
-                    option['count'] += 1
-                    set_poll_to_cache(poll_id, poll_data)
-                    return True
+        return _parse_identifier_lookup(await _arun_script(
+            IDENTIFIER_LOOKUP_SCRIPT, IDENTIFIER_LOOKUP_SCRIPT_SHA,
+            [poll_identifier_key(identifier)], [POLL_IDENTIFIER_MISSING],
+        ))
     except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+    return None, None, None
+
+
+def get_poll_ids_by_identifiers(identifiers):
+    """
+    批量解析投票码，一次MGET读取所有映射
+    返回 {identifier: poll_id}，否定缓存中的投票码poll_id为0；映射未命中的投票码不出现在结果中，Redis不可用时返回空字典
+    """
+    if not identifiers:
+        return {}
+    try:
+        values = redis_client.mget([poll_identifier_key(identifier) for identifier in identifiers])
+    except Exception as e:
+        print(f"从缓存获取数据失败: {str(e)}")
+        return {}
+    return {identifier: int(value) for identifier, value in zip(identifiers, values) if value is not None}
+
+
+def _queue_poll_identifiers(pipe, identifiers):
+    for identifier, poll_id in identifiers.items():
+        if poll_id is None:
+            pipe.set(poll_identifier_key(identifier), POLL_IDENTIFIER_MISSING, ex=POLL_IDENTIFIER_MISS_TTL)
+        else:
+            pipe.set(poll_identifier_key(identifier), int(poll_id), ex=POLL_IDENTIFIER_TTL)
+
+
+def set_poll_identifiers_to_cache(identifiers):
+    """
+    批量写入投票码映射，identifiers为 {identifier: poll_id}
+    poll_id为None表示投票码不存在，写入短期的否定缓存
+    """
+    if not identifiers:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_poll_identifiers(pipe, identifiers)
+        pipe.execute()
+    except Exception as e:
+        print(f"设置缓存失败: {str(e)}")
+
+
+async def aset_poll_identifiers_to_cache(identifiers):
+    """set_poll_identifiers_to_cache 的异步版本"""
+    if not identifiers:
+        return
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            _queue_poll_identifiers(pipe, identifiers)
+            await pipe.execute()
+    except Exception as e:
+        print(f"设置缓存失败: {str(e)}")
+
+
+def _vote_script_call(poll_id, option_id, idempotency_key, voter_id):
+    """投票脚本的 (keys, args)"""
+    idem_key = vote_idempotency_key(poll_id, idempotency_key) if idempotency_key else ''
+    mode = voter_limit_mode() if voter_id else 'off'
+    args = [int(option_id), poll_cache_ttl(), vote_ingestion_mode(), int(poll_id), poll_updates_channel(poll_id),
+            VOTE_IDEMPOTENCY_TTL if idempotency_key else 0, mode, voter_id or '', VOTER_RECORD_TTL,
+            _version_seed(), POLL_VERSION_TTL]
+    if mode == 'bloom':
+        args.extend(_bloom_positions(voter_id))
+    keys = [poll_cache_key(poll_id), poll_counts_key(poll_id), VOTE_BUFFER_KEY, DIRTY_POLLS_KEY, idem_key,
+            poll_voters_key(poll_id), poll_unique_voters_key(poll_id), poll_version_key(poll_id)]
+    return keys, args
+
+
+def increment_option_count(poll_id, option_id, idempotency_key=None, voter_id=None):
+    """
+    原子地增加选项的投票数，只需一次Redis往返
+    写后模式下同一次往返内把投票追加到缓冲队列，直接模式下标记投票为待同步
+    提供幂等键时同一次往返内完成去重，重复提交返回DUPLICATE_VOTE；
+    提供投票人标识时同一次往返内检查该投票人是否已投过票，已投过返回ALREADY_VOTED
+    投票已结束时返回POLL_CLOSED，Redis不可用时返回VOTE_CACHE_UNAVAILABLE
+    返回新的票数；缓存未命中或选项不在缓存中时返回None，由调用方从数据库校验
+    """
+    try:
+        count = _run_script(VOTE_SCRIPT, VOTE_SCRIPT_SHA,
+                            *_vote_script_call(poll_id, option_id, idempotency_key, voter_id))
+        if count is not None:
+            return int(count)
+    except redis.exceptions.RedisError as e:
         print(f"增加选项计数失败: {str(e)}")
-    return False
+        return VOTE_CACHE_UNAVAILABLE
+    except Exception as e:
+        print(f"增加选项计数失败: {str(e)}")
+    return None
+
+
+async def aincrement_option_count(poll_id, option_id, idempotency_key=None, voter_id=None):
+    """increment_option_count 的异步版本"""
+    try:
+        count = await _arun_script(VOTE_SCRIPT, VOTE_SCRIPT_SHA,
+                                   *_vote_script_call(poll_id, option_id, idempotency_key, voter_id))
+        if count is not None:
+            return int(count)
+    except redis.exceptions.RedisError as e:
+        print(f"增加选项计数失败: {str(e)}")
+        return VOTE_CACHE_UNAVAILABLE
+    except Exception as e:
+        print(f"增加选项计数失败: {str(e)}")
+    return None
+
+
+def get_unique_voter_count(poll_id):
+    """返回独立投票人数的近似值（HyperLogLog，标准误差约0.81%），Redis不可用时返回None"""
+    try:
+        return redis_client.pfcount(poll_unique_voters_key(poll_id))
+    except Exception as e:
+        print(f"获取独立投票人数失败: {str(e)}")
+    return None
+
+
+def get_unique_voter_counts(poll_ids):
+    """批量读取多个投票的独立投票人数，一次往返；返回 {poll_id: 人数}，Redis不可用时人数为None"""
+    if not poll_ids:
+        return {}
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for poll_id in poll_ids:
+            pipe.pfcount(poll_unique_voters_key(poll_id))
+        return dict(zip(poll_ids, pipe.execute()))
+    except Exception as e:
+        print(f"获取独立投票人数失败: {str(e)}")
+    return dict.fromkeys(poll_ids)
+
+
+async def aget_unique_voter_count(poll_id):
+    """get_unique_voter_count 的异步版本"""
+    try:
+        return await async_redis_client.pfcount(poll_unique_voters_key(poll_id))
+    except Exception as e:
+        print(f"获取独立投票人数失败: {str(e)}")
+    return None
+
 
 def clear_poll_cache(poll_id):
     """清除投票缓存"""
+    clear_polls_cache([poll_id])
+
+
+def clear_polls_cache(poll_ids, chunk_size=500, keep_counts=False):
+    """
+    批量清除多个投票的缓存，所有DEL和失效广播在一次流水线往返中发送
+    keep_counts为True时保留计数哈希，用于其中的票数尚未写回数据库的情况；重建缓存时不会覆盖已有的计数
+    """
+    try:
+        keys = []
+        for poll_id in poll_ids:
+            keys.append(poll_cache_key(poll_id))
+            if not keep_counts:
+                keys.extend((poll_counts_key(poll_id), poll_synced_counts_key(poll_id)))
+            local_poll_cache.delete(int(poll_id))
+        if not keys:
+            return
+        pipe = redis_client.pipeline(transaction=False)
+        for i in range(0, len(keys), chunk_size):
+            pipe.delete(*keys[i:i + chunk_size])
+        for poll_id in poll_ids:
+            # 投票被关闭或删除后版本号也要变化，旧ETag不能再得到304
+            _queue_version_bump(pipe, poll_id)
+            pipe.publish(POLL_INVALIDATION_CHANNEL, int(poll_id))
+        pipe.execute()
+    except Exception as e:
+        print(f"清除缓存失败: {str(e)}")
+
+
+def claim_buffered_votes(batch_size):
+    """
+    从缓冲队列头部原子地取出最多batch_size张投票，移入新的批次列表
+    返回 (批次键, [(poll_id, option_id), ...])；写库提交后调用 ack_buffered_votes，
+    写库失败时调用 requeue_buffered_votes，worker崩溃时由 recover_buffered_votes 放回队列
+    """
+    batch_key = f'{VOTE_PROCESSING_KEY}:{uuid.uuid4().hex}'
+    entries = _run_script(CLAIM_VOTES_SCRIPT, CLAIM_VOTES_SCRIPT_SHA,
+                          [VOTE_BUFFER_KEY, batch_key, VOTE_PROCESSING_KEY], [batch_size, time.time()])
+    votes = []
+    for entry in entries:
+        poll_id, option_id = entry.decode().split(':')
+        votes.append((int(poll_id), int(option_id)))
+    return batch_key, votes
+
+
+def ack_buffered_votes(batch_key):
+    """批次已写入数据库，删除批次"""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(batch_key)
+    pipe.zrem(VOTE_PROCESSING_KEY, batch_key)
+    pipe.execute()
+
+
+def requeue_buffered_votes(batch_key):
+    """写库失败时把批次中的投票按原顺序放回队列头部，避免丢票"""
+    return _run_script(REQUEUE_VOTES_SCRIPT, REQUEUE_VOTES_SCRIPT_SHA,
+                       [VOTE_BUFFER_KEY, batch_key, VOTE_PROCESSING_KEY], [])
+
+
+def recover_buffered_votes(timeout=VOTE_PROCESSING_TIMEOUT):
+    """把取出超过timeout秒仍未删除的批次（处理它的worker已崩溃）放回缓冲队列，返回放回的投票数"""
+    stale = redis_client.zrangebyscore(VOTE_PROCESSING_KEY, '-inf', time.time() - timeout)
+    return sum(requeue_buffered_votes(batch_key.decode()) for batch_key in stale)
+
+
+def pop_dirty_polls(count):
+    """从脏集合中原子地取出最多count个待同步的投票ID"""
+    return [int(poll_id) for poll_id in redis_client.spop(DIRTY_POLLS_KEY, count) or []]
+
+
+def mark_polls_dirty(poll_ids):
+    """把投票重新标记为待同步（同步失败时使用）"""
+    if poll_ids:
+        redis_client.sadd(DIRTY_POLLS_KEY, *poll_ids)
+
+
+def get_cached_counts(poll_ids):
+    """
+    一次往返批量读取多个投票的计数哈希和同步基线
+    返回 {poll_id: {option_id: (count, synced)}}，没有同步基线的选项synced为None，
+    缓存中不存在的投票不出现在结果中
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for poll_id in poll_ids:
+        pipe.hgetall(poll_counts_key(poll_id))
+        pipe.hgetall(poll_synced_counts_key(poll_id))
+    replies = pipe.execute()
+    result = {}
+    for poll_id, counts, synced in zip(poll_ids, replies[::2], replies[1::2]):
+        if counts:
+            synced = {int(k): int(v) for k, v in synced.items()}
+            result[poll_id] = {int(k): (int(v), synced.get(int(k))) for k, v in counts.items()}
+    return result
+
+
+def set_synced_counts(synced):
+    """票数写回数据库后推进同步基线，synced为 {poll_id: {option_id: 已写回的计数}}"""
+    if not synced:
+        return
+    poll_ids = list(synced)
+    pipe = redis_client.pipeline(transaction=False)
+    for poll_id in poll_ids:
+        pipe.pttl(poll_counts_key(poll_id))
+    ttls = pipe.execute()
+    for poll_id, ttl in zip(poll_ids, ttls):
+        pipe.hset(poll_synced_counts_key(poll_id), mapping=synced[poll_id])
+        # 基线不能比计数哈希活得更久：计数哈希过期后从数据库重新开始，旧基线会让增量重复计入
+        if ttl > 0:
+            pipe.pexpire(poll_synced_counts_key(poll_id), ttl)
+        elif ttl == -2:
+            pipe.delete(poll_synced_counts_key(poll_id))
+    pipe.execute()
+
+
+def schedule_poll_expiry(expiries):
+    """
+    登记投票的截止时间，expiries为 {poll_id: cut_off}
+    cut_off为None的投票从调度中移除
+    """
+    try:
+        scheduled = {poll_id: cut_off.timestamp() for poll_id, cut_off in expiries.items() if cut_off}
+        removed = [poll_id for poll_id, cut_off in expiries.items() if not cut_off]
+        pipe = redis_client.pipeline(transaction=False)
+        if scheduled:
+            pipe.zadd(POLL_EXPIRY_KEY, scheduled)
+        if removed:
+            pipe.zrem(POLL_EXPIRY_KEY, *removed)
+        pipe.execute()
+    except Exception as e:
+        print(f"登记投票截止时间失败: {str(e)}")
+
+
+def get_due_polls(now):
+    """返回截止时间不晚于now的已登记投票ID"""
+    return [int(poll_id) for poll_id in redis_client.zrangebyscore(POLL_EXPIRY_KEY, '-inf', now.timestamp())]
+
+
+def unschedule_poll_expiry(poll_ids):
+    """从截止时间调度中移除投票"""
+    if poll_ids:
+        redis_client.zrem(POLL_EXPIRY_KEY, *poll_ids)
+
+
+def revoke_customer_tokens(customer_id, ttl=7 * 24 * 3600):
+    """
+    吊销用户此前签发的所有令牌；ttl不短于刷新令牌的有效期
+    吊销时间以毫秒记录，紧接着签发的新令牌（iat带小数部分）不会被误判为已吊销
+    """
+    try:
+        redis_client.set(revoked_tokens_key(customer_id), int(time.time() * 1000), ex=ttl)
+    except Exception as e:
+        print(f"吊销令牌失败: {str(e)}")
+
+
+def is_token_revoked(customer_id, issued_at):
+    """
+    检查令牌是否已被吊销，只需一次Redis GET
+    issued_at为令牌的iat（秒，可带小数）；用户有吊销记录而令牌没有iat时，无法证明令牌签发于吊销之后，视为已吊销
+    Redis不可用时不拒绝请求，与其他缓存操作一样降级处理
+    """
     try:
-        redis_client.delete(f'poll:{poll_id}')
+        revoked_at = redis_client.get(revoked_tokens_key(customer_id))
     except Exception as e:
-        print(f"清除缓存失败: {str(e)}")
\ No newline at end of file
+        print(f"检查令牌吊销状态失败: {str(e)}")
+        return False
+    if revoked_at is None:
+        return False
+    if issued_at is None:
+        return True
+    return float(issued_at) * 1000 <= int(revoked_at)
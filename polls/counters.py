@@ -0,0 +1,97 @@
+"""
+热点选项的分片计数
+
+一个选项的所有票数都写入同一行时，并发写库会在这一行的行锁上排队。
+被标记为热点的选项（Option.shard_count > 0）把增量随机写入N个分片行之一，
+读取时把分片票数加到count上，fold_option_shards 定期把分片票数并入count。
+"""
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import Option, OptionCountShard
+
+
+def hot_option_shards():
+    return getattr(settings, 'HOT_OPTION_SHARDS', 16)
+
+
+def hot_option_promotion_votes():
+    return getattr(settings, 'HOT_OPTION_PROMOTION_VOTES', 1000)
+
+
+def add_option_votes(option_id, delta, shard_count=0, poll_id=None):
+    """
+    给选项增加票数，返回更新的行数
+    热点选项随机选择一个分片写入，分片行缺失时（例如刚被提升）回退到选项本身
+    """
+    if shard_count:
+        updated = OptionCountShard.objects.filter(
+            option_id=option_id, shard=random.randrange(shard_count)
+        ).update(count=F('count') + delta)
+        if updated:
+            return updated
+    options = Option.objects.filter(option_id=option_id)
+    if poll_id is not None:
+        options = options.filter(poll_id=poll_id)
+    return options.update(count=F('count') + delta)
+
+
+async def aadd_option_votes(option_id, delta, shard_count=0):
+    """add_option_votes 的异步版本，使用异步ORM"""
+    if shard_count:
+        updated = await OptionCountShard.objects.filter(
+            option_id=option_id, shard=random.randrange(shard_count)
+        ).aupdate(count=F('count') + delta)
+        if updated:
+            return updated
+    return await Option.objects.filter(option_id=option_id).aupdate(count=F('count') + delta)
+
+
+def promote_hot_options(option_ids, shards=None):
+    """把选项标记为热点并创建分片行，返回新提升的选项数"""
+    shards = shards or hot_option_shards()
+    with transaction.atomic():
+        promoted = list(
+            Option.objects.select_for_update()
+            .filter(option_id__in=option_ids, shard_count=0)
+            .values_list('option_id', flat=True)
+        )
+        if not promoted:
+            return 0
+        OptionCountShard.objects.bulk_create(
+            [OptionCountShard(option_id=option_id, shard=i) for option_id in promoted for i in range(shards)],
+            ignore_conflicts=True,
+        )
+        Option.objects.filter(option_id__in=promoted).update(shard_count=shards)
+    return len(promoted)
+
+
+def get_shard_totals(option_ids):
+    """一次查询返回 {option_id: 尚未并入count的分片票数}"""
+    totals = (
+        OptionCountShard.objects.filter(option_id__in=option_ids, count__gt=0)
+        .values('option_id').annotate(total=Sum('count'))
+    )
+    return {row['option_id']: row['total'] for row in totals}
+
+
+def fold_option_shards():
+    """把分片票数并入Option.count并清零分片，返回并入的票数"""
+    folded = 0
+    with transaction.atomic():
+        shards = list(
+            OptionCountShard.objects.select_for_update()
+            .filter(count__gt=0).order_by('option_id', 'shard')
+        )
+        totals = {}
+        for shard in shards:
+            totals[shard.option_id] = totals.get(shard.option_id, 0) + shard.count
+        for option_id, total in sorted(totals.items()):
+            Option.objects.filter(option_id=option_id).update(count=F('count') + total)
+            folded += total
+        if shards:
+            OptionCountShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(count=0)
+    return folded
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Customer
+from .models import Customer, Poll
 
 
 class CustomerRegistrationForm(forms.ModelForm):
@@ -29,4 +29,12 @@ class CustomerLoginForm(forms.Form):
 class CustomerUpdateForm(forms.ModelForm):
     class Meta:
         model = Customer
-        fields = ['name', 'email']
\ No newline at end of file
+        fields = ['name', 'email']
+
+
+class PollForm(forms.ModelForm):
+    """管理后台创建、编辑投票的表单，选项由视图从 options[] 中单独处理"""
+
+    class Meta:
+        model = Poll
+        fields = ['title', 'cut_off', 'active', 'chart_type']
@@ -0,0 +1,84 @@
+"""
+投票码分配
+
+8位投票码由Redis中的递增序列经过格式保持的置换（十进制Feistel网络）得到：
+置换是[0, 10^8)上的双射，不同序列号必然得到不同的投票码，因此分配时不需要查询数据库，
+一次INCRBY即可批量分配。置换以SECRET_KEY为密钥，相邻序列号得到的投票码看起来是随机的。
+Redis不可用时退化为随机投票码，由数据库唯一约束兜底重试。
+"""
+import hashlib
+import random
+import time
+
+from django.conf import settings
+
+from . import cache
+
+IDENTIFIER_SEQUENCE_KEY = 'polls:identifier_seq'
+IDENTIFIER_DIGITS = 8
+IDENTIFIER_SPACE = 10 ** IDENTIFIER_DIGITS
+FEISTEL_ROUNDS = 4
+# Redis连接失败后在这段时间内直接使用随机投票码，避免每次保存都等待连接超时
+REDIS_RETRY_INTERVAL = 30
+
+_HALF_SPACE = 10 ** (IDENTIFIER_DIGITS // 2)
+_redis_retry_at = 0.0
+
+
+def _round_key():
+    return hashlib.sha256(f'poll-identifier:{settings.SECRET_KEY}'.encode()).digest()
+
+
+def _round_function(round_index, value, key):
+    digest = hashlib.blake2b(f'{round_index}:{value}'.encode(), key=key, digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % _HALF_SPACE
+
+
+def permute(number):
+    """将[0, 10^8)内的序列号置换为同一范围内的另一个数"""
+    key = _round_key()
+    left, right = divmod(number % IDENTIFIER_SPACE, _HALF_SPACE)
+    for round_index in range(FEISTEL_ROUNDS):
+        left, right = right, (left + _round_function(round_index, right, key)) % _HALF_SPACE
+    return left * _HALF_SPACE + right
+
+
+def format_identifier(number):
+    return str(number).zfill(IDENTIFIER_DIGITS)
+
+
+def _random_identifiers(count):
+    return [format_identifier(n) for n in random.sample(range(IDENTIFIER_SPACE), count)]
+
+
+def _sequence_seed():
+    """序列键丢失（清空、淘汰、更换Redis实例）后重新开始的位置：跳过已有投票数量的序列号"""
+    from .models import Poll
+    return Poll.objects.count()
+
+
+def allocate_identifiers(count=1, sequential=True):
+    """
+    批量分配投票码，序列存在时不访问数据库
+
+    序列键丢失后从数据库中的投票数量重新开始，不会从0开始重复生成已有的投票码；
+    序列号用尽一轮或序列号曾被跳过时仍可能与旧投票码重复，此时调用方传入sequential=False，
+    改用随机投票码重新分配，而不是继续尝试相邻的序列号
+    """
+    global _redis_retry_at
+    if count <= 0:
+        return []
+    if sequential and time.monotonic() >= _redis_retry_at:
+        try:
+            end = cache.redis_client.incrby(IDENTIFIER_SEQUENCE_KEY, count)
+            if end == count:
+                # 序列键刚被创建：只有第一个分配者会看到，把序列推进到已有投票之后，
+                # 本次分配取跳过区间的最后count个序列号
+                seed = _sequence_seed()
+                if seed:
+                    end = cache.redis_client.incrby(IDENTIFIER_SEQUENCE_KEY, seed)
+            return [format_identifier(permute(seq)) for seq in range(end - count, end)]
+        except Exception as e:
+            print(f"分配投票码序列错误: {e}")
+            _redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+    return _random_identifiers(count)
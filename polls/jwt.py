@@ -5,6 +5,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 import jwt
 import datetime
+import time
 from django.conf import settings
 
 class CustomerToken(Token):
@@ -53,13 +54,16 @@ class CustomerTokenObtainPairView(TokenObtainPairView):
 
 def generate_token(user):
     """生成访问令牌和刷新令牌"""
+    # iat保留小数部分，与毫秒精度的吊销时间比较（见 polls.cache.is_token_revoked）
+    issued_at = time.time()
+
     # 设置访问令牌有效期为1小时
     access_payload = {
         'user_id': user.customer_id,
         'name': user.name,
         'email': user.email,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1),
-        'iat': datetime.datetime.utcnow(),
+        'iat': issued_at,
         'type': 'access'
     }
 
@@ -67,7 +71,7 @@ def generate_token(user):
     refresh_payload = {
         'user_id': user.customer_id,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(days=7),
-        'iat': datetime.datetime.utcnow(),
+        'iat': issued_at,
         'type': 'refresh'
     }
 
@@ -0,0 +1,118 @@
+import json
+import platform
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from redis.connection import parse_url
+
+from polls import benchmark
+from polls.cache import build_redis_client, local_poll_cache, redis_options
+
+
+class Command(BaseCommand):
+    help = "压测投票、结果和详情接口，输出延迟分位数、吞吐量和查询数（JSON）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', default=','.join(benchmark.ENDPOINTS),
+                            help=f"逗号分隔的接口列表，可选: {', '.join(benchmark.ENDPOINTS)}")
+        parser.add_argument('--requests', type=int, default=1000, help="每个接口的请求数")
+        parser.add_argument('--concurrency', type=int, default=8, help="并发线程数")
+        parser.add_argument('--polls', type=int, default=10, help="压测用的投票数")
+        parser.add_argument('--options', type=int, default=4, help="每个投票的选项数")
+        parser.add_argument('--redis', choices=['real', 'fake'], default='fake',
+                            help="fake（默认）使用进程内的fakeredis，real 使用 --redis-url 指定的独立Redis")
+        parser.add_argument('--redis-url',
+                            help="--redis real 时使用的Redis地址，如 redis://localhost:6379/15；"
+                                 "必须是与配置的Redis不同的空库，压测结束后清空")
+        parser.add_argument('--output', help="把结果写入该JSON文件")
+        parser.add_argument('--compare', help="与之前保存的JSON结果对比")
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help="判定为回退的变化比例，默认0.10即10%%")
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(benchmark.ENDPOINTS)
+        if unknown:
+            raise CommandError(f"未知接口: {', '.join(sorted(unknown))}")
+
+        # 压测数据库中的poll_id从1开始，与线上投票重叠；不能写入线上使用的Redis，
+        # 否则压测票数会被同步任务写回同id的真实投票
+        if options['redis'] == 'fake':
+            try:
+                import fakeredis
+                import fakeredis.aioredis
+            except ImportError:
+                raise CommandError("--redis fake 需要安装 fakeredis[lua]")
+            server = fakeredis.FakeServer()
+            redis_client = fakeredis.FakeRedis(server=server)
+            async_redis_client = fakeredis.aioredis.FakeRedis(server=server)
+        else:
+            redis_client, async_redis_client = self.build_benchmark_redis(options['redis_url'])
+        patches = [
+            mock.patch('polls.cache.redis_client', redis_client),
+            mock.patch('polls.cache.async_redis_client', async_redis_client),
+        ]
+
+        # 在独立的测试数据库中压测，不影响现有数据
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        for patch in patches:
+            patch.start()
+        try:
+            polls = benchmark.seed_polls(options['polls'], options['options'])
+            results = {
+                'database': connection.vendor,
+                'redis': options['redis'],
+                'python': platform.python_version(),
+                'polls': options['polls'],
+                'options': options['options'],
+                'endpoints': {},
+            }
+            for name in endpoints:
+                results['endpoints'][name] = benchmark.run_endpoint(
+                    name, polls, options['requests'], options['concurrency'])
+                self.stderr.write(f"{name}: {results['endpoints'][name]}")
+        finally:
+            if options['redis'] == 'real':
+                # 删除压测写入的投票缓存、计数、脏集合、投票码映射和幂等键
+                redis_client.flushdb()
+            local_poll_cache.clear()
+            for patch in patches:
+                patch.stop()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if options['compare']:
+            regressions = benchmark.compare_results(
+                benchmark.load_results(options['compare']), results, options['threshold'])
+            for r in regressions:
+                self.stderr.write(
+                    f"回退: {r['endpoint']} {r['metric']} {r['baseline']} -> {r['current']} ({r['change']:+}%)")
+            if regressions:
+                raise CommandError(f"发现 {len(regressions)} 项性能回退")
+
+    def build_benchmark_redis(self, url):
+        """创建压测专用的Redis客户端，拒绝使用配置的Redis或非空的库"""
+        if not url:
+            raise CommandError("--redis real 需要用 --redis-url 指定独立的Redis库")
+        configured = redis_options()
+
+        def address(location):
+            kwargs = parse_url(location)
+            return kwargs.get('host', 'localhost'), kwargs.get('port', 6379), int(kwargs.get('db', 0))
+
+        if not configured['SENTINELS'] and address(url) == address(configured['LOCATION']):
+            raise CommandError("--redis-url 不能与线上使用的Redis相同")
+        options = dict(configured, LOCATION=url, SENTINELS=[])
+        client = build_redis_client(options=options)
+        if client.dbsize():
+            raise CommandError(f"{url} 不是空库，压测结束后会清空该库，请指定专用的库")
+        return client, build_redis_client(asyncio=True, options=options)
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+from django.db import NotSupportedError, migrations, models
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    PostgreSQL上用 CREATE INDEX CONCURRENTLY 建索引，不阻塞投票和用户表的写入；
+    其他数据库按普通AddIndex建索引。与 django.contrib.postgres 的同名操作相同，
+    但不依赖psycopg，SQLite等环境也可以执行迁移
+    """
+
+    def _ensure_not_in_transaction(self, schema_editor):
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError("CONCURRENTLY 不能在事务中执行，迁移需要设置 atomic = False")
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        self._ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY 不能在事务中执行
+    atomic = False
+
+    dependencies = [
+        ('polls', '0008_option_shard_count_optioncountshard'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='customer',
+            index=models.Index(fields=['email'], name='customer_email_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='poll',
+            index=models.Index(condition=models.Q(('active', True)), fields=['cut_off'], name='poll_active_cut_off_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='poll',
+            index=models.Index(fields=['customer', 'active'], name='poll_customer_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='poll',
+            index=models.Index(fields=['-created_at', '-poll_id'], name='poll_created_idx'),
+        ),
+    ]
@@ -1,9 +1,12 @@
-import random
-
 from django.contrib.auth.hashers import check_password
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 
+from .identifiers import allocate_identifiers
+
+# 投票码唯一约束冲突时的最大重新分配次数
+IDENTIFIER_MAX_ATTEMPTS = 5
+
 
 class Customer(models.Model):
     customer_id = models.AutoField(primary_key=True)
@@ -11,6 +14,12 @@ class Customer(models.Model):
     email = models.EmailField(max_length=30)
     password = models.CharField(max_length=100)  # 实际应用中应使用更安全的密码存储方式
 
+    class Meta:
+        indexes = [
+            # 登录时按邮箱查找用户
+            models.Index(fields=['email'], name='customer_email_idx'),
+        ]
+
     def __str__(self):
         return self.name
     def check_password(self, raw_password):
@@ -48,15 +57,31 @@ class Poll(models.Model):
         default='barChart'
     )
 
+    class Meta:
+        indexes = [
+            # 关闭过期投票：只索引进行中的投票，已关闭的投票不占索引空间
+            models.Index(fields=['cut_off'], condition=models.Q(active=True), name='poll_active_cut_off_idx'),
+            # 用户编辑、删除自己进行中的投票
+            models.Index(fields=['customer', 'active'], name='poll_customer_active_idx'),
+            # 投票列表的游标分页顺序
+            models.Index(fields=['-created_at', '-poll_id'], name='poll_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if not self.identifier:
-            # 生成8位随机数字标识符
-            while True:
-                identifier = ''.join([str(random.randint(0, 9)) for _ in range(8)])
-                if not Poll.objects.filter(identifier=identifier).exists():
-                    self.identifier = identifier
-                    break
-        super().save(*args, **kwargs)
+        if self.identifier:
+            return super().save(*args, **kwargs)
+        # 预先分配的投票码直接插入，只有唯一约束冲突时才改用随机投票码重新分配
+        for attempt in range(IDENTIFIER_MAX_ATTEMPTS):
+            self.identifier = allocate_identifiers(1, sequential=attempt == 0)[0]
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                duplicated = Poll.objects.filter(identifier=self.identifier).exists()
+                if not duplicated or attempt == IDENTIFIER_MAX_ATTEMPTS - 1:
+                    self.identifier = ''
+                    raise
+
     def __str__(self):
         return self.title
 
@@ -66,6 +91,29 @@ class Option(models.Model):
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='options')
     content = models.CharField(max_length=20)
     count = models.IntegerField(default=0)
+    # 热点选项的分片计数器数量，0表示不分片；分片中的票数由 fold_option_shards 定期并入count
+    shard_count = models.PositiveSmallIntegerField(default=0)
 
     def __str__(self):
         return self.content
+
+    def total_count(self):
+        """包括尚未并入count的分片票数在内的总票数"""
+        if not self.shard_count:
+            return self.count
+        return self.count + sum(shard.count for shard in self.count_shards.all())
+
+
+class OptionCountShard(models.Model):
+    """热点选项的分片计数器，每次写入随机选择一个分片，分散对同一行的锁竞争"""
+    option = models.ForeignKey(Option, on_delete=models.CASCADE, related_name='count_shards')
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['option', 'shard'], name='unique_option_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.option_id}#{self.shard}"
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PollCursorPagination(CursorPagination):
+    """按 (created_at, poll_id) 倒序的游标分页，翻页开销与投票总数无关"""
+    ordering = ('-created_at', '-poll_id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,112 @@
+"""
+热点查询的执行计划检查
+
+在足够大的数据集上对每个热点查询执行EXPLAIN，发现退化为全表扫描的查询。
+数据量很小时数据库本来就会选择全表扫描，因此检查前需要先用 seed_plan_dataset 灌入数据并更新统计信息。
+支持PostgreSQL（"Seq Scan on 表名"）和SQLite（不带USING INDEX的"SCAN 表名"）。
+"""
+import datetime
+import re
+
+from django.db import connection
+from django.utils import timezone
+
+from .identifiers import format_identifier
+from .models import Customer, Poll, Option
+
+# 灌入数据时每批插入的行数
+SEED_BATCH_SIZE = 1000
+
+# 每种数据库中表示全表扫描的执行计划行，第一个分组为表名
+SEQUENTIAL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on "?(\w+)"?'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?"?(\w+)"?(?! USING)(?:\s|$)'),
+}
+
+
+# 热点查询：名称 -> 根据样本数据生成QuerySet的函数
+HOT_QUERIES = {
+    # LoginAPIView 按邮箱查找用户
+    'login_by_email': lambda sample: Customer.objects.filter(email=sample['email']),
+    # expire_polls / update_poll_status 查找已过截止时间的进行中投票
+    'expired_active_polls': lambda sample: Poll.objects.filter(active=True, cut_off__lt=sample['now']),
+    # PollUpdateAPIView / PollDeleteAPIView 的查询集
+    'customer_active_polls': lambda sample: Poll.objects.filter(customer_id=sample['customer_id'], active=True),
+    # 投票列表第一页（游标分页）
+    'poll_list_page': lambda sample: Poll.objects.order_by('-created_at', '-poll_id')[:50],
+    # 分享链接按投票码查找
+    'poll_by_identifier': lambda sample: Poll.objects.filter(identifier=sample['identifier']),
+    # 投票详情加载选项
+    'poll_options': lambda sample: Option.objects.filter(poll_id=sample['poll_id']),
+}
+
+
+def seed_plan_dataset(customers=500, polls_per_customer=20, options_per_poll=4, active_ratio=0.05):
+    """
+    灌入检查执行计划用的数据集并更新统计信息，返回查询样本参数
+    大部分投票为已关闭状态，与线上数据的分布一致
+    """
+    now = timezone.now()
+    Customer.objects.bulk_create(
+        [Customer(name=f"plan{i}", email=f"plan{i}@example.com", password="x") for i in range(customers)],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    customer_ids = list(
+        Customer.objects.filter(email__startswith='plan').order_by('customer_id').values_list('customer_id', flat=True)
+    )
+    active_every = max(int(1 / active_ratio), 1) if active_ratio else 0
+    polls = []
+    for i in range(customers * polls_per_customer):
+        active = bool(active_every) and i % active_every == 0
+        polls.append(Poll(
+            customer_id=customer_ids[i % len(customer_ids)],
+            title=f"plan{i}",
+            identifier=format_identifier(i),
+            active=active,
+            cut_off=now + datetime.timedelta(hours=(i % 48) - 24),
+        ))
+    Poll.objects.bulk_create(polls, batch_size=SEED_BATCH_SIZE)
+    poll_ids = list(Poll.objects.filter(title__startswith='plan').values_list('poll_id', flat=True))
+    Option.objects.bulk_create(
+        [Option(poll_id=poll_id, content=f"o{j}") for poll_id in poll_ids for j in range(options_per_poll)],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    middle = len(poll_ids) // 2
+    return {
+        'now': now,
+        'email': f"plan{customers // 2}@example.com",
+        'customer_id': customer_ids[len(customer_ids) // 2],
+        'identifier': format_identifier(middle),
+        'poll_id': poll_ids[middle],
+    }
+
+
+def explain(queryset):
+    """返回查询的执行计划文本"""
+    return queryset.explain()
+
+
+def sequential_scans(plan, vendor=None):
+    """返回执行计划中做了全表扫描的表名列表"""
+    pattern = SEQUENTIAL_SCAN_PATTERNS[vendor or connection.vendor]
+    return [match.group(1) for match in pattern.finditer(plan)]
+
+
+def find_plan_regressions(sample, queries=None):
+    """
+    对热点查询执行EXPLAIN，返回 {查询名称: (全表扫描的表名列表, 执行计划)}，没有回退时返回空字典
+    当前数据库不受支持时抛出 ValueError
+    """
+    if connection.vendor not in SEQUENTIAL_SCAN_PATTERNS:
+        raise ValueError(f"不支持检查 {connection.vendor} 的执行计划，"
+                         f"支持的数据库: {', '.join(SEQUENTIAL_SCAN_PATTERNS)}")
+    regressions = {}
+    for name, build_query in (queries or HOT_QUERIES).items():
+        plan = explain(build_query(sample))
+        tables = sequential_scans(plan)
+        if tables:
+            regressions[name] = (tables, plan)
+    return regressions
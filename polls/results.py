@@ -0,0 +1,21 @@
+def build_poll_results(poll_data):
+    """
+    根据投票数据（PollSerializer的输出或缓存中的数据）计算投票结果
+    附加总票数和每个选项的百分比；总票数为0时所有百分比均为0.0
+    """
+    results = dict(poll_data)
+    results['options'] = [dict(option) for option in poll_data['options']]
+
+    # 计算总票数
+    total_votes = sum(option['count'] for option in results['options'])
+
+    # 计算每个选项的百分比
+    for option in results['options']:
+        if total_votes > 0:
+            option['percentage'] = round((option['count'] / total_votes) * 100, 1)
+        else:
+            option['percentage'] = 0.0
+
+    # 添加总票数信息
+    results['total_votes'] = total_votes
+    return results
@@ -1,6 +1,11 @@
 from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import Customer, Poll, Option, Administrator
+from .identifiers import allocate_identifiers
+from .models import Customer, Poll, Option, Administrator, IDENTIFIER_MAX_ATTEMPTS
+
+# 一次批量创建的最大投票问卷数
+BULK_CREATE_MAX_POLLS = 500
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -40,6 +45,9 @@ class LoginSerializer(serializers.Serializer):
 
 
 class OptionSerializer(serializers.ModelSerializer):
+    # 热点选项的票数包括尚未并入的分片票数
+    count = serializers.IntegerField(source='total_count', read_only=True)
+
     class Meta:
         model = Option
         fields = ['option_id', 'content', 'count']
@@ -52,7 +60,18 @@ class OptionSerializer(serializers.ModelSerializer):
 #         model = Poll
 #         fields = ['poll_id', 'identifier', 'title', 'created_at', 'cut_off', 'active', 'options']
 #         read_only_fields = ['poll_id', 'identifier', 'created_at']
-class PollSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """支持通过 fields 参数只输出部分字段的序列化器"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class PollSerializer(DynamicFieldsModelSerializer):
     options = OptionSerializer(many=True, read_only=True)
 
     class Meta:
@@ -60,6 +79,15 @@ class PollSerializer(serializers.ModelSerializer):
         fields = ['poll_id', 'identifier', 'title', 'created_at', 'cut_off', 'active', 'options', 'chart_type']
         read_only_fields = ['poll_id', 'identifier', 'created_at']
 
+
+class PollDashboardSerializer(PollSerializer):
+    """管理员仪表盘使用的投票序列化器，额外提供由查询注解得到的总票数"""
+    customer_id = serializers.IntegerField(read_only=True)
+    total_votes = serializers.IntegerField(read_only=True)
+
+    class Meta(PollSerializer.Meta):
+        fields = PollSerializer.Meta.fields + ['customer_id', 'total_votes']
+
 class AdministratorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Administrator
@@ -83,14 +111,43 @@ class PollCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         options_data = validated_data.pop('options')
         validated_data['customer'] = self.context['request'].user
-        poll = Poll.objects.create(**validated_data)
-
-        for option_text in options_data:
-            Option.objects.create(poll=poll, content=option_text)
+        with transaction.atomic():
+            poll = Poll.objects.create(**validated_data)
+            Option.objects.bulk_create([Option(poll=poll, content=option_text) for option_text in options_data])
 
         return poll
 
 
+class PollBulkCreateSerializer(serializers.Serializer):
+    """一次请求创建多个投票问卷及其选项"""
+    polls = PollCreateSerializer(many=True, allow_empty=False, max_length=BULK_CREATE_MAX_POLLS)
+
+    def create(self, validated_data):
+        polls_data = validated_data['polls']
+        customer = self.context['request'].user
+
+        # 投票码预先批量分配，只有唯一约束冲突时才改用随机投票码整批重新分配
+        for attempt in range(IDENTIFIER_MAX_ATTEMPTS):
+            identifiers = allocate_identifiers(len(polls_data), sequential=attempt == 0)
+            try:
+                with transaction.atomic():
+                    polls = Poll.objects.bulk_create([
+                        Poll(customer=customer, identifier=identifier,
+                             **{key: value for key, value in data.items() if key != 'options'})
+                        for identifier, data in zip(identifiers, polls_data)
+                    ])
+                    Option.objects.bulk_create([
+                        Option(poll=poll, content=option_text)
+                        for poll, data in zip(polls, polls_data)
+                        for option_text in data['options']
+                    ])
+                return {'polls': polls}
+            except IntegrityError:
+                duplicated = Poll.objects.filter(identifier__in=identifiers).exists()
+                if not duplicated or attempt == IDENTIFIER_MAX_ATTEMPTS - 1:
+                    raise
+
+
 class OptionUpdateSerializer(serializers.Serializer):
     option_id = serializers.IntegerField(required=False)
     content = serializers.CharField(max_length=50)
@@ -103,10 +160,14 @@ class PollUpdateSerializer(serializers.ModelSerializer):
         child=serializers.DictField(),
         required=False
     )
+    new_options = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        required=False
+    )
 
     class Meta:
         model = Poll
-        fields = ['title', 'cut_off', 'options', 'chart_type']
+        fields = ['title', 'cut_off', 'options', 'new_options', 'chart_type']
 
 
 class AdminLoginSerializer(serializers.Serializer):
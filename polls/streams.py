@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import cache
+from .results import build_poll_results
+
+# 每个投票向订阅者推送结果的最高频率（次/秒）
+STREAM_UPDATES_PER_SECOND = 4
+
+# 没有票数变化时发送SSE心跳注释的间隔（秒），避免代理断开空闲连接
+STREAM_KEEPALIVE_SECONDS = 15
+
+# 订阅出错后重新订阅的等待时间（秒），每次失败翻倍，直到上限
+STREAM_RECONNECT_MIN_SECONDS = 0.5
+STREAM_RECONNECT_MAX_SECONDS = 30
+
+# 本进程内正在广播的投票 {poll_id: PollBroadcaster}
+_broadcasters = {}
+
+
+class PollBroadcaster:
+    """
+    单个投票在本进程内的结果广播器
+    无论有多少观看者，每个进程每个投票只订阅一次Redis频道；
+    频道上的票数变化按固定频率合并，读取一次最新结果后推送给所有本地订阅者
+    """
+
+    def __init__(self, poll_id):
+        self.poll_id = poll_id
+        self.queues = set()
+        self.task = None
+
+    def subscribe(self):
+        # 每个订阅者只保留最新的一份结果，慢客户端不会积压
+        queue = asyncio.Queue(maxsize=1)
+        self.queues.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+        if not self.queues:
+            if self.task is not None:
+                self.task.cancel()
+                self.task = None
+            _broadcasters.pop(self.poll_id, None)
+
+    def publish(self, results):
+        for queue in self.queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(results)
+
+    async def run(self):
+        """订阅并推送票数变化；出错时记录日志并按指数退避重新订阅，直到所有订阅者退出时被取消"""
+        delay = STREAM_RECONNECT_MIN_SECONDS
+        resync = False
+        while True:
+            pubsub = cache.async_redis_client.pubsub()
+            try:
+                await pubsub.subscribe(cache.poll_updates_channel(self.poll_id))
+                delay = STREAM_RECONNECT_MIN_SECONDS
+                if resync:
+                    # 断开期间的票数变化没有收到，重新订阅后推送一次最新结果
+                    await self.publish_latest()
+                await self.listen(pubsub)
+            except Exception as e:
+                print(f"订阅投票更新失败: {str(e)}，{delay}秒后重新订阅")
+                resync = True
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception as e:
+                    print(f"关闭投票更新订阅失败: {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STREAM_RECONNECT_MAX_SECONDS)
+
+    async def listen(self, pubsub):
+        interval = 1 / STREAM_UPDATES_PER_SECOND
+        while True:
+            # 按固定间隔等待消息，空闲时不会触发连接的读超时
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=cache.PUBSUB_POLL_INTERVAL)
+            if message is None:
+                continue
+
+            # 等待一个节流周期，把期间到达的所有变化合并为一次推送
+            await asyncio.sleep(interval)
+            while await pubsub.get_message(ignore_subscribe_messages=True, timeout=0):
+                pass
+            await self.publish_latest()
+
+    async def publish_latest(self):
+        poll_data = await cache.aget_poll_from_cache(self.poll_id)
+        if poll_data is not None:
+            self.publish(build_poll_results(poll_data))
+
+
+def get_broadcaster(poll_id):
+    """获取（必要时创建）投票在本进程内的广播器"""
+    broadcaster = _broadcasters.get(poll_id)
+    if broadcaster is None:
+        broadcaster = _broadcasters[poll_id] = PollBroadcaster(poll_id)
+    return broadcaster
+
+
+def _sse_event(results):
+    return f"data: {json.dumps(results, cls=DjangoJSONEncoder, ensure_ascii=False)}\n\n"
+
+
+async def stream_poll_results(poll_id, initial_results):
+    """生成SSE事件流：先发送当前结果，之后推送合并后的票数变化"""
+    broadcaster = get_broadcaster(poll_id)
+    queue = broadcaster.subscribe()
+    try:
+        yield _sse_event(initial_results)
+        while True:
+            try:
+                results = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse_event(results)
+    finally:
+        broadcaster.unsubscribe(queue)
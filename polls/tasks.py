@@ -1,40 +1,229 @@
+import logging
+from collections import Counter
+
 from celery import shared_task
+from django.db import connection, transaction
+from django.db.models import F
+
+from .counters import (
+    add_option_votes, fold_option_shards, get_shard_totals,
+    hot_option_promotion_votes, promote_hot_options,
+)
 from .models import Poll, Option
-from .cache import get_poll_from_cache, clear_poll_cache
+from .cache import (
+    clear_polls_cache, claim_buffered_votes, ack_buffered_votes, requeue_buffered_votes, recover_buffered_votes,
+    pop_dirty_polls, mark_polls_dirty, get_cached_counts, set_synced_counts,
+    get_due_polls, unschedule_poll_expiry, vote_ingestion_mode,
+)
 from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 同步任务每批处理的投票数，同时用作bulk_update的批大小
+SYNC_BATCH_SIZE = 1000
+
+# 每批从缓冲队列取出的投票数，以及单次任务最多处理的批数
+VOTE_FLUSH_BATCH_SIZE = 5000
+VOTE_FLUSH_MAX_BATCHES = 20
+
+
+def reconcile_poll_counts(poll_ids):
+    """
+    把指定投票在Redis中的计数写回数据库，返回更新的选项数
+    只把计数超出同步基线的增量用 count = count + delta 加到数据库，
+    Redis不可用时直接写入数据库的票数不会被覆盖；写回后在同一事务内推进基线。
+    没有同步基线的选项退回到与数据库票数（包括尚未并入的分片票数）比较
+    """
+    cached = get_cached_counts(poll_ids)
+    if not cached:
+        return 0
+
+    options = list(Option.objects.filter(poll_id__in=list(cached)).only('option_id', 'poll_id', 'count', 'shard_count'))
+    unbased = [option.option_id for option in options
+               if option.shard_count and cached[option.poll_id].get(option.option_id, (None, 0))[1] is None]
+    shard_totals = get_shard_totals(unbased) if unbased else {}
+
+    changed = []
+    synced = {}
+    for option in options:
+        count, baseline = cached[option.poll_id].get(option.option_id, (None, None))
+        if count is None:
+            continue
+        if baseline is None:
+            baseline = option.count + shard_totals.get(option.option_id, 0)
+        # 计数只增不减，缓存值不大于基线时视为缓存过期，不写回
+        if count > baseline:
+            option.count = F('count') + (count - baseline)
+            changed.append(option)
+            synced.setdefault(option.poll_id, {})[option.option_id] = count
+
+    # 分批写入时也要整体成功或失败；推进基线失败时回滚，下次同步重新计算增量
+    with transaction.atomic():
+        Option.objects.bulk_update(changed, ['count'], batch_size=SYNC_BATCH_SIZE)
+        set_synced_counts(synced)
+    return len(changed)
+
+
 @shared_task
 def sync_poll_data_to_db():
     """
     将Redis中的投票数据同步到PostgreSQL
-    此任务应该定期运行
-    """
-    polls = Poll.objects.filter(active=True)
-    for poll in polls:
-        poll_data = get_poll_from_cache(poll.poll_id)
-        if poll_data:
-            # 更新选项的投票数
-            for option_data in poll_data['options']:
+    此任务应该定期运行；只处理脏集合中的投票，没有新投票的投票不产生任何开销。
+    写后模式下的投票不进入脏集合，由 flush_vote_buffer 按增量落库。
+    """
+    updated = 0
+    while True:
+        poll_ids = pop_dirty_polls(SYNC_BATCH_SIZE)
+        if not poll_ids:
+            break
+        try:
+            updated += reconcile_poll_counts(poll_ids)
+        except Exception:
+            mark_polls_dirty(poll_ids)
+            raise
+    return f"已同步 {updated} 个选项的票数"
+
+
+def expire_polls(now, poll_ids=None):
+    """
+    用一条 UPDATE ... RETURNING 关闭已过截止时间的投票，返回被关闭的poll_id列表
+    关闭后先把缓存中尚未同步的票数写回数据库，再批量清除写回成功的投票的缓存；
+    写后模式下尚未落库的票数仍在缓冲队列中，先由 flush_vote_buffer 按增量写入，不能再按缓存计数写回
+    """
+    table = connection.ops.quote_name(Poll._meta.db_table)
+    # 条件写成 active 而不是 active = TRUE，与部分索引 poll_active_cut_off_idx 的条件一致
+    sql = f'UPDATE {table} SET active = %s WHERE active AND cut_off < %s'
+    params = [False, now]
+    if poll_ids:
+        sql += f' AND poll_id IN ({", ".join(["%s"] * len(poll_ids))})'
+        params.extend(poll_ids)
+    sql += ' RETURNING poll_id'
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        expired_ids = [row[0] for row in cursor.fetchall()]
+
+    if expired_ids:
+        synced = _sync_expired_votes(expired_ids)
+        unsynced = [poll_id for poll_id in expired_ids if poll_id not in synced]
+        if unsynced:
+            # 写回失败的投票保留计数哈希，只清除投票信息，使缓存不再接受已关闭投票的投票
+            clear_polls_cache(unsynced, keep_counts=True)
+            if vote_ingestion_mode() != 'buffered':
                 try:
-                    option = Option.objects.get(option_id=option_data['option_id'])
-                    option.count = option_data['count']
-                    option.save()
-                except Option.DoesNotExist:
-                    pass
+                    mark_polls_dirty(unsynced)
+                except Exception:
+                    logger.exception("重新标记过期投票待同步失败: %s", unsynced)
+        if synced:
+            clear_polls_cache(synced)
+    return expired_ids
+
+
+def _sync_expired_votes(poll_ids):
+    """
+    把即将清除缓存的投票中尚未落库的票数写入数据库，返回成功写入的poll_id列表
+    写后模式下先消费缓冲队列，否则清除缓存后重建的结果会少算仍在队列中的投票
+    """
+    if vote_ingestion_mode() == 'buffered':
+        try:
+            flush_vote_buffer()
+            return list(poll_ids)
+        except Exception:
+            logger.exception("写入过期投票的缓冲投票失败: %s", poll_ids)
+            return []
+
+    try:
+        reconcile_poll_counts(poll_ids)
+        return list(poll_ids)
+    except Exception:
+        logger.exception("同步过期投票票数失败，逐个重试: %s", poll_ids)
+    synced = []
+    for poll_id in poll_ids:
+        try:
+            reconcile_poll_counts([poll_id])
+            synced.append(poll_id)
+        except Exception:
+            logger.exception("同步过期投票票数失败: %s", poll_id)
+    return synced
+
+
 @shared_task
 def update_poll_status():
     """
     检查并更新已过期的投票问卷状态
+    作为兜底的全量扫描，准时关闭由 close_due_polls 负责
+    """
+    expired_ids = expire_polls(timezone.now())
+    return f"已更新 {len(expired_ids)} 个过期投票问卷的状态"
+
+
+@shared_task
+def close_due_polls():
+    """
+    根据Redis中按截止时间排序的调度集合，准时关闭到期的投票
     """
     now = timezone.now()
-    expired_polls = Poll.objects.filter(cut_off__lt=now, active=True)
-    for poll in expired_polls:
-        poll.active = False
-        poll.save()
+    due_ids = get_due_polls(now)
+    if not due_ids:
+        return "没有到期的投票问卷"
 
-        # 清除缓存
+    expired_ids = expire_polls(now, due_ids)
+    unschedule_poll_expiry(due_ids)
+    return f"已关闭 {len(expired_ids)} 个到期投票问卷"
+
+
+@shared_task
+def flush_vote_buffer():
+    """
+    写后模式下批量消费Redis投票缓冲队列
+    每批按选项聚合增量，每个选项只执行一条 UPDATE ... SET count = count + delta；
+    热点选项的增量写入随机分片，一批内票数达到阈值的选项自动提升为分片计数。
+    每批先移入批次列表，写库事务提交后才删除，写库失败或worker崩溃时放回队列
+    """
+    recovered = recover_buffered_votes()
+    if recovered:
+        logger.warning("已将 %s 张未完成写库的缓冲投票放回队列", recovered)
+
+    flushed = 0
+    for _ in range(VOTE_FLUSH_MAX_BATCHES):
+        batch_key, votes = claim_buffered_votes(VOTE_FLUSH_BATCH_SIZE)
+        if not votes:
+            break
+
+        deltas = Counter(votes)
         try:
-            clear_poll_cache(poll.poll_id)
-        except Exception as e:
-            print(f"清除缓存失败: {str(e)}")
+            option_ids = {option_id for _, option_id in deltas}
+            shard_counts = dict(
+                Option.objects.filter(option_id__in=option_ids, shard_count__gt=0)
+                .values_list('option_id', 'shard_count')
+            )
+            with transaction.atomic():
+                # 按option_id排序加锁，避免多个worker并发写库时死锁
+                for (poll_id, option_id), delta in sorted(deltas.items(), key=lambda item: item[0][1]):
+                    add_option_votes(option_id, delta, shard_counts.get(option_id, 0), poll_id=poll_id)
+        except Exception:
+            requeue_buffered_votes(batch_key)
+            raise
+        # 事务提交后才删除批次，提交前崩溃的批次会被放回队列
+        ack_buffered_votes(batch_key)
+
+        hot = [option_id for (_, option_id), delta in deltas.items()
+               if delta >= hot_option_promotion_votes() and option_id not in shard_counts]
+        if hot:
+            try:
+                promote_hot_options(hot)
+            except Exception:
+                logger.exception("提升热点选项失败: %s", hot)
+
+        flushed += len(votes)
+        if len(votes) < VOTE_FLUSH_BATCH_SIZE:
+            break
 
-    return f"已更新 {expired_polls.count()} 个过期投票问卷的状态"
\ No newline at end of file
+    return f"已写入 {flushed} 张缓冲投票"
+
+
+@shared_task
+def fold_shard_counts():
+    """把热点选项分片中的票数并入选项计数"""
+    folded = fold_option_shards()
+    return f"已并入 {folded} 张分片投票"
@@ -1,10 +1,13 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 import json
 
-from polls.models import Administrator
+from polls.models import Administrator, Customer, Poll, Option
 
 
 class TestApiAdminLogin(TestCase):
@@ -135,5 +138,96 @@ class TestApiAdminDashboard(TestCase):
         # 验证响应状态码
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        # 验证响应是否为列表形式
-        self.assertIsInstance(response.data, list)
\ No newline at end of file
+        # 验证响应为游标分页形式，结果是列表
+        self.assertIsInstance(response.data['results'], list)
+        self.assertIn('next', response.data)
+
+    def create_polls(self, n, active=True):
+        customer = Customer.objects.create(name="仪表盘用户", email=f"dash{Customer.objects.count()}@example.com",
+                                           password="pwd")
+        polls = []
+        for i in range(n):
+            poll = Poll.objects.create(customer=customer, title=f"投票{i}", active=active)
+            Option.objects.create(poll=poll, content="选项1", count=i)
+            Option.objects.create(poll=poll, content="选项2", count=1)
+            polls.append(poll)
+        return customer, polls
+
+    def test_dashboard_cursor_pagination(self):
+        """测试游标分页可以逐页遍历所有投票且不重复"""
+        self.create_polls(5)
+        seen = []
+        url = f'{self.url}?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(poll['poll_id'] for poll in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_dashboard_fields_projection(self):
+        """测试fields参数只返回指定字段，并支持总票数"""
+        self.create_polls(2)
+        response = self.client.get(self.url, {'fields': 'poll_id,title,active,total_votes'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for poll in response.data['results']:
+            self.assertEqual(set(poll), {'poll_id', 'title', 'active', 'total_votes'})
+        self.assertCountEqual([poll['total_votes'] for poll in response.data['results']], [1, 2])
+
+        response = self.client.get(self.url, {'fields': 'title,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_dashboard_filters(self):
+        """测试按状态和创建者过滤"""
+        customer, _ = self.create_polls(2, active=True)
+        self.create_polls(3, active=False)
+
+        response = self.client.get(self.url, {'active': 'false'})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(self.url, {'customer': customer.customer_id})
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class TestAdminPanelPollForms(TestCase):
+    """测试管理后台创建、编辑投票的表单视图"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpwd', is_staff=True)
+        # manage_poll 以登录用户的id查找投票所属的用户
+        self.customer = Customer.objects.create(customer_id=self.staff.id, name="后台用户",
+                                                email="staff@example.com", password="pwd")
+        self.client.force_login(self.staff)
+
+    def test_manage_poll_creates_poll_with_options(self):
+        """测试创建投票时一次插入所有选项"""
+        data = {'title': '后台投票', 'active': 'on', 'chart_type': 'pieChart', 'options[]': ['选项1', '选项2', '选项3']}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('polls:manage_poll'), data)
+        self.assertRedirects(response, reverse('polls:admin_dashboard'), fetch_redirect_response=False)
+        option_inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "polls_option"')]
+        self.assertEqual(len(option_inserts), 1)
+
+        poll = Poll.objects.get(title='后台投票')
+        self.assertEqual(poll.customer, self.customer)
+        self.assertEqual(poll.chart_type, 'pieChart')
+        self.assertEqual(list(poll.options.order_by('option_id').values_list('content', flat=True)),
+                         ['选项1', '选项2', '选项3'])
+
+    def test_edit_poll_updates_and_adds_options(self):
+        """测试编辑投票时更新已有选项并追加新选项，已有票数不变"""
+        poll = Poll.objects.create(customer=self.customer, title="旧标题")
+        first = Option.objects.create(poll=poll, content="旧选项", count=4)
+
+        data = {'title': '新标题', 'active': 'on', 'chart_type': 'barChart', 'options[]': ['新选项', '追加选项']}
+        response = self.client.post(reverse('polls:edit_poll', args=[poll.poll_id]), data)
+        self.assertRedirects(response, reverse('polls:admin_dashboard'), fetch_redirect_response=False)
+
+        poll.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(poll.title, '新标题')
+        self.assertEqual((first.content, first.count), ('新选项', 4))
+        self.assertEqual(list(poll.options.order_by('option_id').values_list('content', flat=True)),
+                         ['新选项', '追加选项'])
@@ -0,0 +1,107 @@
+import json
+
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from unittest import mock, skipUnless
+
+from polls import async_views
+from polls.cache import local_poll_cache
+from polls.models import Customer, Poll, Option
+from polls.views import VOTER_COOKIE_NAME
+
+try:
+    import fakeredis
+    import fakeredis.aioredis
+except ImportError:  # Lua脚本相关测试需要fakeredis[lua]，见requirements-dev.txt
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+@override_settings(VOTER_LIMIT_MODE='set')
+class TestAsyncViews(TestCase):
+    """测试投票、结果和详情接口的异步版本"""
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server)
+        for target, client in (('polls.cache.redis_client', self.redis),
+                               ('polls.cache.async_redis_client', fakeredis.aioredis.FakeRedis(server=server))):
+            patcher = mock.patch(target, client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        customer = Customer.objects.create(name="测试用户", email="test@example.com", password="testpwd")
+        self.poll = Poll.objects.create(customer=customer, title="异步投票", identifier="12345678")
+        self.option1 = Option.objects.create(poll=self.poll, content="选项1", count=2)
+        self.option2 = Option.objects.create(poll=self.poll, content="选项2", count=0)
+        self.factory = AsyncRequestFactory()
+
+    async def vote(self, option_id, ip='127.0.0.1', **extra):
+        request = self.factory.post('/vote/', {'option_id': option_id}, content_type='application/json', **extra)
+        request.META['REMOTE_ADDR'] = ip
+        return await async_views.public_vote(request, self.poll.poll_id)
+
+    async def test_vote_on_cache_miss_then_cache_hit(self):
+        """测试缓存未命中时用异步ORM加载并预热缓存，之后的投票走Redis快速路径"""
+        response = await self.vote(self.option1.option_id, ip='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {"status": "投票成功"})
+
+        response = await self.vote(self.option1.option_id, ip='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(self.redis.hget(f'poll:{self.poll.poll_id}:counts', self.option1.option_id)), 4)
+
+    async def test_same_voter_cannot_vote_twice(self):
+        response = await self.vote(self.option1.option_id, ip='10.0.0.1')
+        # 投票人由投票时下发的Cookie识别，更换IP也不能再投一票
+        self.factory.cookies[VOTER_COOKIE_NAME] = response.cookies[VOTER_COOKIE_NAME].value
+        response = await self.vote(self.option2.option_id, ip='10.0.0.2')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['error'], "您已经投过票了")
+
+    async def test_vote_rejects_unknown_option_and_poll(self):
+        response = await self.vote(999999)
+        self.assertEqual(response.status_code, 404)
+        request = self.factory.post('/vote/', {'option_id': 1}, content_type='application/json')
+        response = await async_views.public_vote(request, 999999)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_results_match_sync_view(self):
+        await self.vote(self.option2.option_id)
+        response = await async_views.poll_results(self.factory.get('/results/'), self.poll.poll_id)
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)
+        self.assertEqual(results['total_votes'], 3)
+        self.assertEqual(results['unique_voters'], 1)
+
+        sync_response = await self.async_client.get(reverse('polls:poll-results', args=[self.poll.poll_id]))
+        self.assertEqual(results, sync_response.json())
+
+    async def test_detail_and_identifier_lookup(self):
+        response = await async_views.poll_detail(self.factory.get('/detail/'), self.poll.poll_id)
+        self.assertEqual(json.loads(response.content)['title'], "异步投票")
+
+        response = await async_views.get_poll_by_identifier(self.factory.get('/find/'), "12345678")
+        self.assertEqual(json.loads(response.content)['poll_id'], self.poll.poll_id)
+
+        response = await async_views.get_poll_by_identifier(self.factory.get('/find/'), "87654321")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.redis.get('poll:ident:87654321'), b'0')
+
+        response = await async_views.poll_detail(self.factory.get('/detail/'), 999999)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_results_conditional_get(self):
+        response = await async_views.poll_results(self.factory.get('/results/'), self.poll.poll_id)
+        etag = response['ETag']
+        response = await async_views.poll_results(
+            self.factory.get('/results/', headers={'If-None-Match': etag}), self.poll.poll_id)
+        self.assertEqual(response.status_code, 304)
+
+        await self.vote(self.option1.option_id)
+        response = await async_views.poll_results(
+            self.factory.get('/results/', headers={'If-None-Match': etag}), self.poll.poll_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['total_votes'], 3)
@@ -1,10 +1,24 @@
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.auth.hashers import make_password
 from rest_framework.exceptions import AuthenticationFailed
-from polls.auth import CustomerAuthentication
+from polls.auth import CustomerAuthentication, decode_token, get_token_cache_stats, token_cache
 from polls.models import Customer
+from polls.jwt import generate_token
+from polls.cache import revoke_customer_tokens, is_token_revoked
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from unittest import mock, skipUnless
 from django.conf import settings
 import jwt
 import datetime
+import hashlib
+import time
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
 
 class CustomerAuthenticationTest(TestCase):
     def setUp(self):
@@ -63,4 +77,142 @@ class CustomerAuthenticationTest(TestCase):
     def test_corrupt_jwt_token(self):
         request = self.get_request('corrupted.token')
         with self.assertRaises(AuthenticationFailed):
-            self.auth.authenticate(request)
\ No newline at end of file
+            self.auth.authenticate(request)
+
+@mock.patch('polls.auth.is_token_revoked', return_value=False)
+class StatelessAuthenticationTest(TestCase):
+    def setUp(self):
+        self.auth = CustomerAuthentication()
+        self.factory = RequestFactory()
+        self.user = Customer.objects.create(name='Test User', email='test@example.com',
+                                            password=make_password('secret123'))
+        self.token = generate_token(self.user)['access']
+
+    def get_request(self, token):
+        request = self.factory.get('/')
+        request.META['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        return request
+
+    def test_claims_build_principal_without_query(self, _):
+        with self.assertNumQueries(0):
+            user, _ = self.auth.authenticate(self.get_request(self.token))
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.name, 'Test User')
+        self.assertEqual(user.email, 'test@example.com')
+
+    def test_principal_loads_password_lazily_and_saves_loaded_fields(self, _):
+        user, _ = self.auth.authenticate(self.get_request(self.token))
+        self.assertTrue(user.check_password('secret123'))
+
+        user, _ = self.auth.authenticate(self.get_request(self.token))
+        user.name = 'Renamed'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Renamed')
+        self.assertTrue(self.user.check_password('secret123'))
+
+    def test_revoked_token_rejected(self, is_token_revoked):
+        is_token_revoked.return_value = True
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate(self.get_request(self.token))
+
+    @override_settings(JWT_STATELESS_AUTH=False)
+    def test_stateless_mode_disabled_queries_database(self, _):
+        with self.assertNumQueries(1):
+            user, _ = self.auth.authenticate(self.get_request(self.token))
+        self.assertEqual(user, self.user)
+
+
+class TokenCacheTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+
+    def test_repeated_token_decoded_once(self):
+        token = jwt.encode({'user_id': 1, 'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=5)},
+                           settings.SECRET_KEY, algorithm='HS256')
+        with mock.patch('polls.auth.jwt.decode', wraps=jwt.decode) as decode:
+            self.assertEqual(decode_token(token)['user_id'], 1)
+            self.assertEqual(decode_token(token)['user_id'], 1)
+        self.assertEqual(decode.call_count, 1)
+        self.assertGreaterEqual(get_token_cache_stats()['hits'], 1)
+
+    def test_cached_payload_expires_with_token(self):
+        token = jwt.encode({'user_id': 1, 'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=5)},
+                           settings.SECRET_KEY, algorithm='HS256')
+        decode_token(token)
+        later = time.monotonic() + 301
+        with mock.patch('polls.cache.time.monotonic', return_value=later):
+            self.assertIsNone(token_cache.get(hashlib.sha256(token.encode()).digest()))
+
+    def test_invalid_token_not_cached(self):
+        with self.assertRaises(jwt.InvalidTokenError):
+            decode_token('invalid.jwt.token')
+        self.assertEqual(get_token_cache_stats()['size'], 0)
+
+
+@skipUnless(fakeredis, "需要安装fakeredis")
+class TokenRevocationTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('polls.cache.redis_client', fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = Customer.objects.create(name='Test User', email='test@example.com',
+                                            password=make_password('secret123'))
+        self.client = APIClient()
+
+    def authorized(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.client
+
+    def test_change_password_revokes_old_tokens(self):
+        """测试修改密码后旧令牌失效，同时返回的新令牌立即可用"""
+        tokens = generate_token(self.user)
+        response = self.authorized(tokens['access']).post(
+            reverse('polls:change-password'), {'old_password': 'secret123', 'new_password': 'secret456'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.authorized(tokens['access']).get(reverse('polls:profile')).status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.client.credentials()
+        response = self.client.post(reverse('polls:token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        new_access = self.client.post(reverse('polls:login'), {'email': 'test@example.com', 'password': 'secret456'},
+                                      format='json').data['access']
+        self.assertEqual(self.authorized(new_access).get(reverse('polls:profile')).status_code, status.HTTP_200_OK)
+
+    def test_change_password_keeps_updated_profile(self):
+        """测试令牌声明中的资料过期时修改密码不会覆盖数据库中的新资料，新令牌使用新资料"""
+        tokens = generate_token(self.user)
+        self.authorized(tokens['access']).patch(
+            reverse('polls:profile'), {'name': 'New', 'email': 'new@example.com'}, format='json')
+
+        response = self.authorized(tokens['access']).post(
+            reverse('polls:change-password'), {'old_password': 'secret123', 'new_password': 'secret456'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.name, self.user.email), ('New', 'new@example.com'))
+        self.assertTrue(self.user.check_password('secret456'))
+        claims = jwt.decode(response.data['access'], settings.SECRET_KEY, algorithms=['HS256'])
+        self.assertEqual((claims['name'], claims['email']), ('New', 'new@example.com'))
+
+    def test_deleting_customer_revokes_tokens(self):
+        token = generate_token(self.user)['access']
+        self.client.delete(reverse('polls:customer-detail', args=[self.user.customer_id]))
+        self.assertTrue(is_token_revoked(self.user.customer_id, jwt.decode(
+            token, settings.SECRET_KEY, algorithms=['HS256'])['iat']))
+
+    def test_revocation_precision_and_missing_iat(self):
+        """测试吊销时间精确到毫秒，同一秒内稍后签发的令牌仍然有效；没有iat的令牌视为已吊销"""
+        self.assertFalse(is_token_revoked(self.user.customer_id, None))
+        second = time.time() // 1
+        with mock.patch('polls.cache.time.time', return_value=second + 0.2):
+            revoke_customer_tokens(self.user.customer_id)
+        self.assertTrue(is_token_revoked(self.user.customer_id, second + 0.1))
+        self.assertTrue(is_token_revoked(self.user.customer_id, int(second)))
+        self.assertFalse(is_token_revoked(self.user.customer_id, second + 0.3))
+        self.assertTrue(is_token_revoked(self.user.customer_id, None))
@@ -0,0 +1,46 @@
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from polls.benchmark import compare_results, percentile, next_voter_address
+from polls.cache import redis_options
+
+
+class BenchmarkCompareTest(SimpleTestCase):
+    def setUp(self):
+        self.baseline = {'endpoints': {'public_vote': {
+            'p50_ms': 2.0, 'p99_ms': 10.0, 'throughput_rps': 1000.0, 'queries_per_request': 1.0,
+        }}}
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_no_regression_within_threshold(self):
+        current = {'endpoints': {'public_vote': {
+            'p50_ms': 2.1, 'p99_ms': 10.5, 'throughput_rps': 950.0, 'queries_per_request': 1.0,
+        }}}
+        self.assertEqual(compare_results(self.baseline, current, 0.10), [])
+
+    def test_regressions_detected(self):
+        current = {'endpoints': {'public_vote': {
+            'p50_ms': 2.0, 'p99_ms': 15.0, 'throughput_rps': 700.0, 'queries_per_request': 3.0,
+        }}}
+        regressions = compare_results(self.baseline, current, 0.10)
+        self.assertEqual({r['metric'] for r in regressions}, {'p99_ms', 'throughput_rps', 'queries_per_request'})
+
+    def test_new_endpoint_is_ignored(self):
+        current = {'endpoints': {'results': {'p50_ms': 1.0}}}
+        self.assertEqual(compare_results(self.baseline, current, 0.10), [])
+
+    def test_voter_addresses_are_not_reused(self):
+        addresses = [next_voter_address() for _ in range(300)]
+        self.assertEqual(len(set(addresses)), 300)
+
+    def test_real_redis_requires_separate_database(self):
+        """测试使用真实Redis压测时必须指定与线上不同的库"""
+        with self.assertRaisesMessage(CommandError, '--redis-url'):
+            call_command('benchmark_polls', redis='real')
+        with self.assertRaisesMessage(CommandError, '不能与线上使用的Redis相同'):
+            call_command('benchmark_polls', redis='real', redis_url=redis_options()['LOCATION'])
@@ -1,10 +1,23 @@
 # polls/tests/test_cache.py
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.http import Http404
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
-from unittest import mock
+from unittest import mock, skipUnless
+import threading
+import time
 from polls.models import Customer, Poll, Option
-from polls.cache import get_poll_from_cache, set_poll_to_cache, increment_option_count
+from polls.cache import (
+    get_poll_from_cache, set_poll_to_cache, increment_option_count, clear_poll_cache, local_poll_cache, LocalCache,
+    build_redis_client, redis_options, get_or_load_poll, poll_cache_key, poll_rebuild_lock_key,
+    get_poll_version, poll_version_key, get_or_load_versioned_poll,
+    POLL_CACHE_TTL, POLL_CACHE_TTL_JITTER, POLL_CLOSED, POLL_MISSING_MARKER,
+)
+
+try:
+    import fakeredis
+except ImportError:  # Lua脚本相关测试需要fakeredis[lua]，见requirements-dev.txt
+    fakeredis = None
 
 
 # 模拟 Redis
@@ -15,18 +28,61 @@ class MockRedis:
     def get(self, key):
         return self.data.get(key)
 
-    def set(self, key, value):
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
         self.data[key] = value
         return True
 
+    def incrby(self, key, amount):
+        self.data[key] = int(self.data.get(key, 0)) + amount
+        return self.data[key]
+
+    def incr(self, key):
+        return self.incrby(key, 1)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hsetnx(self, key, field, value):
+        fields = self.data.setdefault(key, {})
+        if str(field) in fields:
+            return 0
+        fields[str(field)] = value
+        return 1
+
     def expire(self, key, time):
         return True
 
-    def delete(self, key):
-        if key in self.data:
-            del self.data[key]
+    def delete(self, *keys):
+        for key in keys:
+            if key in self.data:
+                del self.data[key]
         return True
 
+    def publish(self, channel, message):
+        return 0
+
+    def pipeline(self, transaction=True):
+        return MockPipeline(self)
+
+
+class MockPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
 
 class CacheTest(TestCase):
     @mock.patch('polls.cache.redis_client', MockRedis())
@@ -60,4 +116,256 @@ class CacheTest(TestCase):
         # 从缓存获取投票数据
         cached_data = get_poll_from_cache(self.poll.poll_id)
 
-        self.assertEqual(cached_data, self.poll_data)
\ No newline at end of file
+        self.assertEqual(cached_data, self.poll_data)
+        # 写入缓存的同一次往返内递增版本号
+        self.assertIsNotNone(get_poll_version(self.poll.poll_id))
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class AtomicCounterTest(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        self.poll_data = {
+            'poll_id': 1,
+            'title': '计数测试投票',
+            'active': True,
+            'options': [
+                {'option_id': 10, 'content': '选项1', 'count': 3},
+                {'option_id': 11, 'content': '选项2', 'count': 0},
+            ]
+        }
+        set_poll_to_cache(1, self.poll_data)
+
+    def test_increment_returns_new_count(self):
+        """测试原子计数返回新的票数并反映在缓存读取中"""
+        self.assertEqual(increment_option_count(1, 10), 4)
+        self.assertEqual(increment_option_count(1, 10), 5)
+        cached = get_poll_from_cache(1)
+        self.assertEqual([o['count'] for o in cached['options']], [5, 0])
+
+    def test_increment_unknown_option_or_poll(self):
+        """测试缓存中不存在的选项或投票返回None"""
+        self.assertIsNone(increment_option_count(1, 99))
+        self.assertIsNone(increment_option_count(2, 10))
+
+    def test_increment_inactive_poll(self):
+        """测试已结束的投票不在缓存中计票，返回POLL_CLOSED"""
+        set_poll_to_cache(1, dict(self.poll_data, active=False))
+        self.assertEqual(increment_option_count(1, 10), POLL_CLOSED)
+
+    def test_set_does_not_overwrite_counts(self):
+        """测试重新写入缓存时不会覆盖尚未同步的计数"""
+        increment_option_count(1, 11)
+        set_poll_to_cache(1, self.poll_data)
+        cached = get_poll_from_cache(1)
+        self.assertEqual(cached['options'][1]['count'], 1)
+
+    def test_clear_removes_counts(self):
+        """测试清除缓存同时删除元数据和计数"""
+        clear_poll_cache(1)
+        self.assertIsNone(get_poll_from_cache(1))
+        self.assertIsNone(increment_option_count(1, 10))
+
+
+class LocalCacheTest(TestCase):
+    def setUp(self):
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+        self.redis = MockRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.poll_data = {'poll_id': 1, 'title': '本地缓存投票', 'active': True, 'options': []}
+
+    def test_repeated_reads_served_locally(self):
+        """测试重复读取由进程内缓存提供，不再访问Redis"""
+        set_poll_to_cache(1, self.poll_data)
+        self.assertEqual(get_poll_from_cache(1), self.poll_data)
+        with mock.patch.object(self.redis, 'pipeline', side_effect=AssertionError('不应访问Redis')):
+            self.assertEqual(get_poll_from_cache(1), self.poll_data)
+
+    def test_write_and_clear_invalidate_local_copy(self):
+        """测试写入和清除缓存会删除本地副本"""
+        set_poll_to_cache(1, self.poll_data)
+        get_poll_from_cache(1)
+
+        set_poll_to_cache(1, dict(self.poll_data, title='新标题'))
+        self.assertEqual(get_poll_from_cache(1)['title'], '新标题')
+
+        clear_poll_cache(1)
+        self.assertIsNone(get_poll_from_cache(1))
+
+    def test_lru_eviction_and_ttl(self):
+        """测试超出容量时淘汰最久未使用的条目，过期条目不再返回"""
+        cache = LocalCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+        cache.set('d', 4, ttl=-1)
+        self.assertIsNone(cache.get('d'))
+        with mock.patch('polls.cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get('a'))
+
+
+class RedisClientConfigTest(TestCase):
+    @override_settings(POLLS_REDIS={'MAX_CONNECTIONS': 8, 'SOCKET_TIMEOUT': 0.2},
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                           'LOCATION': 'redis://cache-host:6380/3'}})
+    def test_client_built_from_settings(self):
+        """测试客户端使用CACHES中的地址和POLLS_REDIS中的连接池配置"""
+        client = build_redis_client()
+        pool = client.connection_pool
+        self.assertEqual(pool.max_connections, 8)
+        self.assertEqual(pool.connection_kwargs['host'], 'cache-host')
+        self.assertEqual(pool.connection_kwargs['port'], 6380)
+        self.assertEqual(pool.connection_kwargs['db'], 3)
+        self.assertEqual(pool.connection_kwargs['socket_timeout'], 0.2)
+        self.assertEqual(pool.connection_kwargs['retry'].get_retries(), redis_options()['RETRY_ATTEMPTS'])
+
+    @override_settings(POLLS_REDIS={'LOCATION': 'redis://:secret@ignored/2',
+                                    'SENTINELS': [('sentinel-1', 26379)], 'SENTINEL_SERVICE': 'polls'})
+    def test_sentinel_client(self):
+        """测试配置Sentinel时通过服务名发现主节点，并沿用地址中的db和密码"""
+        client = build_redis_client()
+        pool = client.connection_pool
+        self.assertEqual(pool.service_name, 'polls')
+        self.assertEqual(pool.connection_kwargs['db'], 2)
+        self.assertEqual(pool.connection_kwargs['password'], 'secret')
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class StampedeProtectionTest(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+        self.poll_data = {'poll_id': 1, 'title': 'Hot Poll', 'active': True,
+                          'options': [{'option_id': 1, 'content': 'A', 'count': 3}]}
+        self.loader = mock.Mock(return_value=self.poll_data)
+
+    def test_miss_rebuilds_once_and_sets_jittered_ttl(self):
+        """测试未命中时调用一次loader重建，之后命中缓存，过期时间带抖动"""
+        self.assertEqual(get_or_load_poll(1, self.loader)['title'], 'Hot Poll')
+        local_poll_cache.clear()
+        get_or_load_poll(1, self.loader)
+        self.loader.assert_called_once()
+
+        ttl = self.redis.ttl(poll_cache_key(1))
+        self.assertLessEqual(ttl, POLL_CACHE_TTL)
+        self.assertGreaterEqual(ttl, POLL_CACHE_TTL * (1 - POLL_CACHE_TTL_JITTER) - 1)
+        self.assertFalse(self.redis.exists(poll_rebuild_lock_key(1)))
+
+    def test_waits_for_concurrent_rebuild(self):
+        """测试其他worker持有重建锁时等待其结果，而不是访问数据库"""
+        self.redis.set(poll_rebuild_lock_key(1), 'other-worker', px=3000)
+        timer = threading.Timer(0.1, set_poll_to_cache, args=(1, self.poll_data))
+        timer.start()
+        self.addCleanup(timer.join)
+
+        self.assertEqual(get_or_load_poll(1, self.loader)['options'][0]['count'], 3)
+        self.loader.assert_not_called()
+
+    @mock.patch('polls.cache.random.random', return_value=0.5)
+    def test_early_refresh_by_single_worker(self, _random):
+        """测试即将过期时提前刷新，其他worker持有锁时继续使用当前数据"""
+        set_poll_to_cache(1, self.poll_data, rebuild_time=100.0)
+        self.redis.expire(poll_cache_key(1), 1)
+
+        self.redis.set(poll_rebuild_lock_key(1), 'other-worker', px=3000)
+        self.assertEqual(get_or_load_poll(1, self.loader)['title'], 'Hot Poll')
+        self.loader.assert_not_called()
+
+        self.redis.delete(poll_rebuild_lock_key(1))
+        get_or_load_poll(1, self.loader)
+        self.loader.assert_called_once()
+        self.assertGreater(self.redis.ttl(poll_cache_key(1)), 1)
+
+    def test_missing_poll_cached_under_rebuild_key(self):
+        """测试投票不存在时在重建锁键上记录，之后的请求直接返回404而不等待或访问数据库"""
+        self.loader.side_effect = Http404
+        with self.assertRaises(Http404):
+            get_or_load_poll(1, self.loader)
+        self.assertEqual(self.redis.get(poll_rebuild_lock_key(1)), POLL_MISSING_MARKER.encode())
+        self.assertLessEqual(self.redis.pttl(poll_rebuild_lock_key(1)), 5000)
+
+        started = time.monotonic()
+        with self.assertRaises(Http404):
+            get_or_load_poll(1, self.loader)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.loader.assert_called_once()
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class PollVersionTest(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+        self.poll_data = {'poll_id': 1, 'identifier': '12345678', 'title': 'Poll', 'active': True,
+                          'options': [{'option_id': 1, 'content': 'A', 'count': 0}]}
+
+    def test_version_increases_on_edit_vote_and_clear(self):
+        """测试编辑、投票和清除缓存都会递增版本号"""
+        self.assertIsNone(get_poll_version(1))
+        set_poll_to_cache(1, self.poll_data)
+        versions = [get_poll_version(1)]
+        set_poll_to_cache(1, dict(self.poll_data, title='Edited'), bump_version=True)
+        versions.append(get_poll_version(1))
+        increment_option_count(1, 1)
+        versions.append(get_poll_version(1))
+        clear_poll_cache(1)
+        versions.append(get_poll_version(1))
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_refill_keeps_version(self):
+        """测试从数据库重新填充缓存不改变版本号，已有的ETag仍然有效"""
+        set_poll_to_cache(1, self.poll_data)
+        before = get_poll_version(1)
+        self.redis.delete(poll_cache_key(1))
+        set_poll_to_cache(1, self.poll_data, rebuild_time=0.01)
+        self.assertEqual(get_poll_version(1), before)
+
+    def test_version_stays_monotonic_after_key_expires(self):
+        """测试版本号键过期后重建的版本号仍大于之前的版本号"""
+        set_poll_to_cache(1, self.poll_data)
+        before = get_poll_version(1)
+        self.redis.delete(poll_version_key(1))
+        time.sleep(0.01)  # 初值为毫秒时间戳
+        set_poll_to_cache(1, self.poll_data)
+        self.assertGreater(get_poll_version(1), before)
+
+    def test_versioned_read_uses_local_cache(self):
+        """测试带版本号的读取命中进程内缓存，条件请求读到更新的版本号时不使用旧条目"""
+        set_poll_to_cache(1, self.poll_data)
+        loader = mock.Mock(side_effect=AssertionError('不应访问数据库'))
+        poll_data, version = get_or_load_versioned_poll(1, loader)
+        self.assertIsNotNone(version)
+
+        with mock.patch.object(self.redis, 'pipeline', side_effect=AssertionError('不应访问Redis')):
+            self.assertEqual(get_or_load_versioned_poll(1, loader), (poll_data, version))
+
+        increment_option_count(1, 1)
+        current = get_poll_version(1)
+        poll_data, version = get_or_load_versioned_poll(1, loader, min_version=current)
+        self.assertEqual((poll_data['options'][0]['count'], version), (1, current))
+
+    def test_identifier_must_map_to_poll(self):
+        set_poll_to_cache(1, self.poll_data)
+        self.assertEqual(get_poll_version(1, '12345678'), get_poll_version(1))
+        self.assertIsNone(get_poll_version(1, '87654321'))
@@ -1,6 +1,16 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.hashers import make_password
+from unittest import mock
 from polls.models import Customer, Administrator, Poll, Option
+from polls import identifiers
+from polls.identifiers import allocate_identifiers, permute, IDENTIFIER_SPACE
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
 
 
 class CustomerModelTest(TestCase):
@@ -55,6 +65,79 @@ class PollModelTest(TestCase):
     def test_poll_str(self):
         self.assertEqual(str(self.poll), "Sample Poll")
 
+    def test_identifier_is_eight_digits(self):
+        self.assertEqual(len(self.poll.identifier), 8)
+        self.assertTrue(self.poll.identifier.isdigit())
+
+    def test_save_does_not_query_identifier(self):
+        """测试保存新投票时只执行INSERT，不预先查询投票码"""
+        poll = Poll(customer=self.customer, title="No Pre-check")
+        with CaptureQueriesContext(connection) as ctx:
+            poll.save()
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries]
+        self.assertNotIn('SELECT', statements)
+        self.assertEqual(statements.count('INSERT'), 1)
+
+    def test_save_retries_on_identifier_conflict(self):
+        """测试投票码冲突时重新分配"""
+        with mock.patch('polls.models.allocate_identifiers',
+                        side_effect=[[self.poll.identifier], ['12345678']]) as allocate:
+            poll = Poll.objects.create(customer=self.customer, title="Conflict")
+        self.assertEqual(poll.identifier, '12345678')
+        # 冲突后改用随机投票码，而不是继续尝试相邻的序列号
+        self.assertEqual(allocate.call_args_list, [mock.call(1, sequential=True), mock.call(1, sequential=False)])
+
+
+class IdentifierAllocatorTest(TestCase):
+    def test_permute_is_bijective(self):
+        """测试置换结果在范围内且互不相同"""
+        values = [permute(n) for n in range(10000)]
+        self.assertEqual(len(set(values)), 10000)
+        self.assertTrue(all(0 <= v < IDENTIFIER_SPACE for v in values))
+
+    @mock.patch('polls.identifiers._redis_retry_at', 0.0)
+    def test_allocate_from_sequence(self):
+        """测试批量分配只递增一次序列，结果不重复"""
+        if fakeredis is None:
+            self.skipTest("需要安装fakeredis")
+        redis = fakeredis.FakeRedis()
+        with mock.patch('polls.cache.redis_client', redis):
+            first = allocate_identifiers(100)
+            second = allocate_identifiers(1)
+        self.assertEqual(int(redis.get(identifiers.IDENTIFIER_SEQUENCE_KEY)), 101)
+        self.assertEqual(len(set(first + second)), 101)
+        self.assertTrue(all(len(i) == 8 and i.isdigit() for i in first))
+
+    @mock.patch('polls.identifiers._redis_retry_at', 0.0)
+    def test_lost_sequence_resumes_after_existing_polls(self):
+        """测试序列键丢失后从已有投票之后继续分配，不会重复生成已有的投票码"""
+        if fakeredis is None:
+            self.skipTest("需要安装fakeredis")
+        redis = fakeredis.FakeRedis()
+        customer = Customer.objects.create(name="Test User", email="test@example.com", password="pwd")
+        with mock.patch('polls.cache.redis_client', redis):
+            for i in range(10):
+                Poll.objects.create(customer=customer, title=f"投票{i}")
+            redis.flushall()
+            with mock.patch('polls.models.allocate_identifiers', wraps=allocate_identifiers) as allocate:
+                for i in range(4):
+                    Poll.objects.create(customer=customer, title=f"新投票{i}")
+        self.assertEqual(allocate.call_count, 4)
+        self.assertEqual(int(redis.get(identifiers.IDENTIFIER_SEQUENCE_KEY)), 14)
+        self.assertEqual(Poll.objects.values('identifier').distinct().count(), 14)
+
+    @mock.patch('polls.identifiers._redis_retry_at', 0.0)
+    def test_allocate_falls_back_without_redis(self):
+        """测试Redis不可用时退化为不重复的随机投票码"""
+        client = mock.Mock()
+        client.incrby.side_effect = Exception("connection refused")
+        with mock.patch('polls.cache.redis_client', client):
+            result = allocate_identifiers(50)
+            allocate_identifiers(1)
+        self.assertEqual(len(set(result)), 50)
+        # 冷却期内不再访问Redis
+        client.incrby.assert_called_once()
+
 
 class OptionModelTest(TestCase):
     def setUp(self):
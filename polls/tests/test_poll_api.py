@@ -1,4 +1,6 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -6,7 +8,21 @@ import json
 from django.utils import timezone
 import datetime
 
-from polls.models import Poll, Option, Customer, Administrator
+from polls.models import Poll, Option, OptionCountShard, Customer, Administrator
+from polls.jwt import generate_token
+from polls.cache import (
+    increment_option_count, get_poll_from_cache, set_poll_to_cache, local_poll_cache, bloom_filter_size,
+    poll_voters_key,
+)
+from polls.serializers import PollSerializer
+from polls.views import VOTER_COOKIE_NAME
+from unittest import mock, skipUnless
+import redis
+
+try:
+    import fakeredis
+except ImportError:  # Lua脚本相关测试需要fakeredis[lua]，见requirements-dev.txt
+    fakeredis = None
 
 
 class TestPollResults(TestCase):
@@ -61,6 +77,105 @@ class TestPollResults(TestCase):
         self.assertEqual(response.data['options'][0]['percentage'], 66.7)  # 10/15 = 66.7%
         self.assertEqual(response.data['options'][1]['percentage'], 33.3)  # 5/15 = 33.3%
 
+    def test_poll_results_without_votes(self):
+        """测试总票数为0时百分比均为0.0"""
+        Option.objects.filter(poll=self.poll).update(count=0)
+        url = reverse('polls:poll-results', args=[self.poll.poll_id])
+        response = self.client.get(url)
+
+        self.assertEqual(response.data['total_votes'], 0)
+        self.assertEqual([o['percentage'] for o in response.data['options']], [0.0, 0.0])
+
+    @skipUnless(fakeredis, "需要安装fakeredis[lua]")
+    def test_poll_results_served_from_cache(self):
+        """测试缓存命中时不访问数据库，且结果包含缓存中的新票数"""
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+        with mock.patch('polls.cache.redis_client', fakeredis.FakeRedis()):
+            url = reverse('polls:poll-results', args=[self.poll.poll_id])
+            self.client.get(url)
+            increment_option_count(self.poll.poll_id, self.option2.option_id)
+            # 进程内缓存允许短暂陈旧，模拟其TTL到期
+            local_poll_cache.clear()
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+
+        self.assertEqual(response.data['total_votes'], 16)
+        self.assertEqual(response.data['options'][1]['count'], 6)
+        self.assertEqual(response.data['options'][1]['percentage'], 37.5)
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class TestBatchPollResults(TestCase):
+    """测试批量获取投票结果API"""
+
+    def setUp(self):
+        redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.polls = []
+        for i in range(5):
+            poll = Poll.objects.create(customer=self.customer, title=f"投票{i}", active=True)
+            Option.objects.create(poll=poll, content="选项1", count=i)
+            hot = Option.objects.create(poll=poll, content="选项2", count=0, shard_count=1)
+            OptionCountShard.objects.create(option=hot, shard=0, count=1)
+            self.polls.append(poll)
+
+        self.client = APIClient()
+        self.url = reverse('polls:batch-poll-results')
+
+    def test_batch_results_by_id_and_identifier(self):
+        """测试按投票ID和投票码批量获取结果，顺序与请求一致，不存在的单独列出"""
+        ids = ','.join(str(p.poll_id) for p in self.polls[:3]) + ',999999'
+        response = self.client.get(self.url, {'ids': ids, 'identifiers': self.polls[4].identifier})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['poll_id'] for r in response.data['results']],
+                         [p.poll_id for p in self.polls[:3]] + [self.polls[4].poll_id])
+        self.assertEqual(response.data['results'][2]['total_votes'], 3)
+        self.assertEqual(response.data['not_found'], ['999999'])
+
+    def test_batch_results_query_count(self):
+        """测试未命中时用固定数量的查询加载，命中后不访问数据库"""
+        ids = ','.join(str(p.poll_id) for p in self.polls)
+        with self.assertNumQueries(3):  # 投票、选项和分片计数各一条查询
+            self.client.get(self.url, {'ids': ids})
+
+        increment_option_count(self.polls[0].poll_id, self.polls[0].options.first().option_id)
+        local_poll_cache.clear()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'ids': ids})
+        self.assertEqual(response.data['results'][0]['total_votes'], 2)
+
+    def test_identifiers_resolved_from_cache_with_unique_voters(self):
+        """测试投票码从映射缓存解析、不存在的投票码被否定缓存，结果与单个投票结果接口结构相同"""
+        identifiers = f'{self.polls[0].identifier},87654321'
+        self.client.get(self.url, {'identifiers': identifiers})
+        increment_option_count(self.polls[0].poll_id, self.polls[0].options.first().option_id, voter_id='ip:a')
+        local_poll_cache.clear()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'identifiers': identifiers})
+        self.assertEqual(response.data['not_found'], ['87654321'])
+        single = self.client.get(reverse('polls:poll-results', args=[self.polls[0].poll_id])).data
+        self.assertEqual(response.data['results'][0], single)
+        self.assertEqual(response.data['results'][0]['unique_voters'], 1)
+
+    def test_batch_results_invalid_params(self):
+        """测试缺少参数或ID格式错误时返回400"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'ids': '1,abc'}).status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class TestPublicVote(TestCase):
     """测试公开投票API"""
@@ -169,6 +284,201 @@ class TestPublicVote(TestCase):
         self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+@override_settings(VOTER_LIMIT_MODE='off')
+class TestIdempotentVote(TestCase):
+    """测试带幂等键的重复投票提交"""
+
+    def setUp(self):
+        patcher = mock.patch('polls.cache.redis_client', fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.poll = Poll.objects.create(customer=self.customer, title="幂等投票", active=True)
+        self.option = Option.objects.create(poll=self.poll, content="选项1", count=0)
+        self.client = APIClient()
+        self.url = reverse('polls:public-vote-api', args=[self.poll.poll_id])
+
+    def cached_count(self):
+        return get_poll_from_cache(self.poll.poll_id)['options'][0]['count']
+
+    def test_duplicate_submission_not_counted(self):
+        """测试同一幂等键重复提交只计一票，且重复提交不访问数据库"""
+        data = {'option_id': self.option.option_id}
+        response = self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('duplicate', response.data)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['duplicate'])
+        local_poll_cache.clear()
+        self.assertEqual(self.cached_count(), 1)
+
+    def test_distinct_keys_and_payload_key(self):
+        """测试不同幂等键分别计票，幂等键也可以放在请求体中"""
+        for key in ('a', 'b', 'b'):
+            self.client.post(self.url, {'option_id': self.option.option_id, 'idempotency_key': key}, format='json')
+        self.client.post(self.url, {'option_id': self.option.option_id}, format='json')
+        local_poll_cache.clear()
+        self.assertEqual(self.cached_count(), 3)
+
+    def test_idempotency_key_too_long(self):
+        """测试幂等键过长时返回400"""
+        response = self.client.post(self.url, {'option_id': self.option.option_id}, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='x' * 300)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class TestVoterLimit(TestCase):
+    """测试每个投票人只能投一票"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.poll = Poll.objects.create(customer=self.customer, title="限投投票", active=True)
+        self.option = Option.objects.create(poll=self.poll, content="选项1", count=0)
+        self.client = APIClient()
+        self.url = reverse('polls:public-vote-api', args=[self.poll.poll_id])
+
+    def vote(self, client=None, **extra):
+        return (client or self.client).post(self.url, {'option_id': self.option.option_id}, format='json', **extra)
+
+    def assert_voter_limit(self):
+        self.assertEqual(self.vote().status_code, status.HTTP_200_OK)
+        response = self.vote()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], "您已经投过票了")
+        # 不同IP的匿名投票人不受影响
+        self.assertEqual(self.vote(APIClient(), REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_200_OK)
+
+        results = self.client.get(reverse('polls:poll-results', args=[self.poll.poll_id])).data
+        self.assertEqual(results['total_votes'], 2)
+        self.assertEqual(results['unique_voters'], 2)
+
+    def test_second_vote_rejected(self):
+        """测试同一投票人第二次投票被拒绝"""
+        self.assert_voter_limit()
+
+    @override_settings(VOTER_LIMIT_MODE='bloom', VOTER_BLOOM_EXPECTED_VOTERS=1000)
+    def test_second_vote_rejected_with_bloom_filter(self):
+        """测试布隆过滤器模式下同一投票人第二次投票被拒绝，过滤器大小由预期投票人数决定"""
+        self.assert_voter_limit()
+        bits, _ = bloom_filter_size()
+        self.assertLessEqual(self.redis.strlen(poll_voters_key(self.poll.poll_id)), -(-bits // 8))
+
+    def test_vote_cookie_identifies_voter_across_ips(self):
+        """测试只在投票时下发投票人Cookie，更换IP后凭Cookie仍被识别为同一投票人"""
+        self.client.get(reverse('polls:public-vote'))
+        self.assertNotIn(VOTER_COOKIE_NAME, self.client.cookies)
+
+        self.assertEqual(self.vote().status_code, status.HTTP_200_OK)
+        self.assertIn(VOTER_COOKIE_NAME, self.client.cookies)
+        self.assertEqual(self.vote(REMOTE_ADDR='10.0.0.9').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_anonymous_voters_behind_proxy_not_merged(self):
+        """测试默认不按IP限制匿名投票人，同一代理后没有Cookie的投票人各自计票"""
+        for _ in range(3):
+            self.assertEqual(self.vote(APIClient(), REMOTE_ADDR='10.0.0.1').status_code, status.HTTP_200_OK)
+
+    @override_settings(VOTER_ANONYMOUS_IP_LIMIT=True)
+    def test_anonymous_voter_limited_per_ip(self):
+        """测试开启按IP限制后没有Cookie时按IP限制，伪造User-Agent不能再投一票"""
+        self.assertEqual(self.vote(APIClient(), HTTP_USER_AGENT='a').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.vote(APIClient(), HTTP_USER_AGENT='b').status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(VOTER_ANONYMOUS_IP_LIMIT=True, VOTER_TRUSTED_PROXIES=['10.0.0.0/24'])
+    def test_client_ip_resolved_from_trusted_proxy(self):
+        """测试只信任已配置代理转发的 X-Forwarded-For，客户端伪造的地址不起作用"""
+        def vote(forwarded_for, remote_addr='10.0.0.1'):
+            return self.vote(APIClient(), REMOTE_ADDR=remote_addr, HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        self.assertEqual(vote('203.0.113.1'), status.HTTP_200_OK)
+        self.assertEqual(vote('203.0.113.2'), status.HTTP_200_OK)
+        self.assertEqual(vote('198.51.100.7, 203.0.113.1'), status.HTTP_400_BAD_REQUEST)
+        # 直接连接的客户端不能通过 X-Forwarded-For 冒充其他地址
+        self.assertEqual(vote('203.0.113.3', remote_addr='192.0.2.1'), status.HTTP_200_OK)
+        self.assertEqual(vote('203.0.113.4', remote_addr='192.0.2.1'), status.HTTP_400_BAD_REQUEST)
+
+    def test_customer_limited_across_devices(self):
+        """测试登录用户换设备也只能投一票"""
+        tokens = generate_token(self.customer)
+        for ip in ('10.0.0.3', '10.0.0.4'):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+            response = self.vote(client, REMOTE_ADDR=ip)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class TestClosedPollVote(TestCase):
+    """测试已结束的投票不会通过数据库回退路径计票"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.poll = Poll.objects.create(customer=self.customer, title="已结束投票", active=False)
+        self.option = Option.objects.create(poll=self.poll, content="选项1", count=0)
+        set_poll_to_cache(self.poll.poll_id, PollSerializer(self.poll).data)
+        self.client = APIClient()
+        self.urls = [
+            reverse('polls:public-vote-api', args=[self.poll.poll_id]),
+            reverse('polls:poll-vote', args=[self.poll.poll_id]),
+        ]
+
+    def assert_rejected(self):
+        for url in self.urls:
+            response = self.client.post(url, {'option_id': self.option.option_id}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.option.refresh_from_db()
+        self.assertEqual(self.option.count, 0)
+
+    def test_vote_on_cached_closed_poll_rejected(self):
+        """测试缓存中已结束的投票直接拒绝，不回退到数据库计票"""
+        self.assert_rejected()
+        local_poll_cache.clear()
+        self.assertEqual(get_poll_from_cache(self.poll.poll_id)['options'][0]['count'], 0)
+
+    def test_vote_on_closed_poll_rejected_when_redis_unavailable(self):
+        """测试Redis不可用时仍先校验投票状态，只有进行中的投票才直接写入数据库"""
+        with mock.patch.object(self.redis, 'evalsha', side_effect=redis.exceptions.ConnectionError('down')):
+            self.assert_rejected()
+            Poll.objects.filter(pk=self.poll.pk).update(active=True)
+            response = self.client.post(self.urls[1], {'option_id': self.option.option_id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.option.refresh_from_db()
+        self.assertEqual(self.option.count, 1)
+
+
 class TestGetPollByIdentifier(TestCase):
     """测试通过标识符查找投票问卷API"""
 
@@ -220,4 +530,157 @@ class TestGetPollByIdentifier(TestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
         # 验证响应内容
-        self.assertEqual(response.data['error'], "找不到该投票问卷")
\ No newline at end of file
+        self.assertEqual(response.data['error'], "找不到该投票问卷")
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class TestCachedIdentifierLookup(TestCase):
+    """测试投票码查找走缓存，并对不存在的投票码做否定缓存"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+        customer = Customer.objects.create(name="测试用户", email="test@example.com", password="testpwd")
+        self.poll = Poll.objects.create(customer=customer, title="测试投票", identifier="12345678")
+        self.option = Option.objects.create(poll=self.poll, content="选项1", count=2)
+        self.client = APIClient()
+
+    def test_lookup_is_served_from_cache(self):
+        url = reverse('polls:find-poll', args=["12345678"])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        local_poll_cache.clear()
+
+        increment_option_count(self.poll.poll_id, self.option.option_id)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['poll_id'], self.poll.poll_id)
+        self.assertEqual(response.data['options'][0]['count'], 3)
+
+    def test_unknown_identifier_is_negatively_cached(self):
+        url = reverse('polls:find-poll', args=["87654321"])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['error'], "找不到该投票问卷")
+
+    def test_malformed_identifier_skips_lookup(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:find-poll', args=["abc"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.redis.keys('poll:ident:*'), [])
+
+    def test_deleted_poll_mapping_becomes_negative(self):
+        url = reverse('polls:find-poll', args=["12345678"])
+        self.client.get(url)
+        local_poll_cache.clear()
+        self.redis.delete(f'poll:{self.poll.poll_id}')
+        self.poll.delete()
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.redis.get('poll:ident:12345678'), b'0')
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class TestConditionalGet(TestCase):
+    """测试投票详情、结果和投票码查找的ETag与304响应"""
+
+    def setUp(self):
+        patcher = mock.patch('polls.cache.redis_client', fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+        customer = Customer.objects.create(name="测试用户", email="test@example.com", password="testpwd")
+        self.poll = Poll.objects.create(customer=customer, title="测试投票", identifier="12345678")
+        self.option = Option.objects.create(poll=self.poll, content="选项1", count=0)
+        self.client = APIClient()
+
+    def assert_revalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        # 投票后版本号变化，旧ETag不再命中
+        increment_option_count(self.poll.poll_id, self.option.option_id)
+        local_poll_cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_poll_detail(self):
+        self.assert_revalidates(reverse('polls:poll-detail', args=[self.poll.poll_id]))
+
+    def test_poll_results(self):
+        self.assert_revalidates(reverse('polls:poll-results', args=[self.poll.poll_id]))
+
+    def test_find_poll_by_identifier(self):
+        self.assert_revalidates(reverse('polls:find-poll', args=["12345678"]))
+
+    def test_etag_of_another_poll_does_not_match(self):
+        url = reverse('polls:find-poll', args=["12345678"])
+        etag = self.client.get(url)['ETag']
+        other_etag = etag.replace(f'"{self.poll.poll_id}-', '"999999-')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=other_etag).status_code, status.HTTP_200_OK)
+
+    def test_edit_changes_etag(self):
+        url = reverse('polls:poll-detail', args=[self.poll.poll_id])
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(self.poll.customer)
+        self.client.patch(reverse('polls:poll-update', args=[self.poll.poll_id]), {'title': '新标题'}, format='json')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], '新标题')
+
+
+class TestListQueryCount(TestCase):
+    """测试投票列表接口的查询次数不随投票数量增长"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_token(self.customer)["access"]}')
+
+    def create_polls(self, n):
+        for i in range(n):
+            poll = Poll.objects.create(customer=self.customer, title=f"投票{i}", active=True)
+            Option.objects.create(poll=poll, content="选项1")
+            # 热点选项的票数包括分片计数，序列化时不应逐个选项查询分片
+            hot = Option.objects.create(poll=poll, content="选项2", shard_count=2)
+            OptionCountShard.objects.bulk_create(OptionCountShard(option=hot, shard=j, count=1) for j in range(2))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_list_endpoints_query_count_is_constant(self):
+        """测试投票数量从2增加到12时各列表接口的查询次数不变"""
+        urls = [
+            reverse('polls:my-polls'),
+            reverse('polls:api_admin_dashboard'),
+            reverse('polls:poll-list'),
+            reverse('polls:option-list'),
+        ]
+        self.create_polls(2)
+        baseline = {url: self.count_queries(url) for url in urls}
+
+        self.create_polls(10)
+        for url in urls:
+            self.assertEqual(self.count_queries(url), baseline[url], url)
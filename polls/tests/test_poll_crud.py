@@ -6,8 +6,17 @@ import json
 from django.utils import timezone
 import datetime
 
+from unittest import mock, skipUnless
+
 from polls.models import Poll, Option, Customer, Administrator
 from polls.jwt import generate_token
+from polls.cache import set_poll_to_cache, get_poll_from_cache, increment_option_count, local_poll_cache
+from polls.serializers import PollSerializer
+
+try:
+    import fakeredis
+except ImportError:  # Lua脚本相关测试需要fakeredis[lua]，见requirements-dev.txt
+    fakeredis = None
 
 
 class TestPollCreate(TestCase):
@@ -103,6 +112,56 @@ class TestPollCreate(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class TestPollBulkCreate(TestCase):
+    """测试批量创建投票API"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.tokens = generate_token(self.customer)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.tokens["access"]}')
+        self.url = reverse('polls:poll-bulk-create')
+
+    def test_bulk_create_polls(self):
+        """测试一次请求创建多个投票，投票和选项各只用一条INSERT"""
+        data = {'polls': [
+            {'title': f'课堂投票{i}', 'options': ['A', 'B', 'C'],
+             'cut_off': (timezone.now() + datetime.timedelta(days=1)).isoformat()}
+            for i in range(20)
+        ]}
+
+        with self.assertNumQueries(4):  # 保存点、投票INSERT、选项INSERT、释放保存点
+            response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['polls']), 20)
+        identifiers = [poll['identifier'] for poll in response.data['polls']]
+        self.assertEqual(len(set(identifiers)), 20)
+        self.assertEqual(Poll.objects.filter(customer=self.customer).count(), 20)
+        self.assertEqual(Option.objects.filter(poll__customer=self.customer).count(), 60)
+
+    def test_bulk_create_is_atomic(self):
+        """测试任意一个投票无效时整批都不创建"""
+        data = {'polls': [
+            {'title': '有效投票', 'options': ['A', 'B']},
+            {'title': '无效投票', 'options': ['只有一个选项']},
+        ]}
+        response = self.client.post(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Poll.objects.exists())
+
+    def test_bulk_create_without_authentication(self):
+        """测试未认证时批量创建投票"""
+        self.client.credentials()
+        response = self.client.post(self.url, {'polls': [{'title': 'x', 'options': ['A', 'B']}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class TestPollUpdate(TestCase):
     """测试投票更新API"""
 
@@ -248,6 +307,49 @@ class TestPollUpdate(TestCase):
         self.poll.refresh_from_db()
         self.assertEqual(self.poll.title, '更新标题')
 
+    def test_update_query_count_is_constant(self):
+        """测试编辑大量选项时查询数不随选项数量增长"""
+        options = Option.objects.bulk_create([Option(poll=self.poll, content=f"选项{i}") for i in range(50)])
+        data = {
+            'title': '批量编辑',
+            'options': [{'option_id': o.option_id, 'content': f'改{i}'} for i, o in enumerate(options[:25])]
+                       + [{'option_id': o.option_id, 'delete': True} for o in options[25:]],
+            'new_options': [f'新{i}' for i in range(10)],
+        }
+
+        # 取投票、取选项、保存点、更新标题、删除（含级联的分片计数）、批量更新、批量创建、释放保存点、
+        # 序列化返回（选项和分片计数各一条）
+        with self.assertNumQueries(12):
+            response = self.client.patch(self.url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Option.objects.filter(poll=self.poll).count(), 2 + 25 + 10)
+        self.assertEqual(Option.objects.get(pk=options[0].pk).content, '改0')
+        self.assertEqual(len(response.data['options']), 37)
+
+    @skipUnless(fakeredis, "需要安装fakeredis[lua]")
+    def test_update_patches_cache_without_losing_votes(self):
+        """测试编辑后缓存就地更新，未同步的票数保留，已删除选项的计数被移除"""
+        redis = fakeredis.FakeRedis()
+        with mock.patch('polls.cache.redis_client', redis):
+            local_poll_cache.clear()
+            self.addCleanup(local_poll_cache.clear)
+            set_poll_to_cache(self.poll.poll_id, PollSerializer(self.poll).data)
+            increment_option_count(self.poll.poll_id, self.option1.option_id)
+
+            data = {
+                'title': '新标题',
+                'options': [{'option_id': self.option2.option_id, 'delete': True}],
+                'new_options': ['新选项'],
+            }
+            response = self.client.patch(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            cached = get_poll_from_cache(self.poll.poll_id)
+        self.assertEqual(cached['title'], '新标题')
+        counts = {option['content']: option['count'] for option in cached['options']}
+        self.assertEqual(counts, {'原选项1': 1, '新选项': 0})
+
     def test_update_poll_without_authentication(self):
         """测试未认证时更新投票"""
         # 清除认证头
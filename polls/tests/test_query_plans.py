@@ -0,0 +1,45 @@
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from polls import query_plans
+
+
+class TestSequentialScanDetection(TestCase):
+    """测试从执行计划中识别全表扫描"""
+
+    def test_postgresql_plans(self):
+        plan = 'Limit  (cost=0.00..1.05 rows=1 width=8)\n  ->  Seq Scan on polls_customer  (cost=0.00..210.00 rows=1)'
+        self.assertEqual(query_plans.sequential_scans(plan, 'postgresql'), ['polls_customer'])
+        plan = 'Index Scan using customer_email_idx on polls_customer  (cost=0.28..8.30 rows=1 width=8)'
+        self.assertEqual(query_plans.sequential_scans(plan, 'postgresql'), [])
+
+    def test_sqlite_plans(self):
+        self.assertEqual(query_plans.sequential_scans('3 0 0 SCAN polls_poll', 'sqlite'), ['polls_poll'])
+        self.assertEqual(query_plans.sequential_scans('2 0 0 SCAN TABLE polls_poll', 'sqlite'), ['polls_poll'])
+        self.assertEqual(query_plans.sequential_scans('5 0 0 SCAN polls_poll USING INDEX poll_created_idx', 'sqlite'), [])
+        self.assertEqual(
+            query_plans.sequential_scans('3 0 0 SEARCH polls_poll USING INDEX poll_active_cut_off_idx (cut_off<?)', 'sqlite'),
+            [],
+        )
+
+    def test_unsupported_vendor_rejected(self):
+        with mock.patch.object(query_plans.connection, 'vendor', 'oracle'):
+            with self.assertRaisesMessage(ValueError, '不支持检查 oracle 的执行计划'):
+                query_plans.find_plan_regressions({})
+
+
+@skipUnless(connection.vendor in query_plans.SEQUENTIAL_SCAN_PATTERNS, "当前数据库不支持执行计划检查")
+class TestHotQueryPlans(TestCase):
+    """在较大的数据集上检查热点查询没有退化为全表扫描"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sample = query_plans.seed_plan_dataset()
+
+    def test_hot_queries_use_indexes(self):
+        regressions = query_plans.find_plan_regressions(self.sample)
+        self.assertEqual(regressions, {}, "\n".join(
+            f"{name}: 全表扫描 {', '.join(tables)}\n{plan}" for name, (tables, plan) in regressions.items()
+        ))
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+from unittest import mock, skipUnless
+import redis
+
+from polls import streams
+from polls.cache import set_poll_to_cache, increment_option_count, local_poll_cache
+
+try:
+    import fakeredis
+    import fakeredis.aioredis
+except ImportError:  # Lua脚本相关测试需要fakeredis[lua]，见requirements-dev.txt
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class TestPollBroadcaster(TestCase):
+    """测试实时结果广播器的合并推送"""
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server)
+        self.async_redis = fakeredis.aioredis.FakeRedis(server=server)
+        for target, client in (('polls.cache.redis_client', self.redis),
+                               ('polls.cache.async_redis_client', self.async_redis)):
+            patcher = mock.patch(target, client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        set_poll_to_cache(1, {
+            'poll_id': 1,
+            'title': '实时投票',
+            'active': True,
+            'options': [
+                {'option_id': 10, 'content': '选项1', 'count': 0},
+                {'option_id': 11, 'content': '选项2', 'count': 0},
+            ]
+        })
+
+    async def test_votes_are_coalesced_for_all_subscribers(self):
+        """测试同一投票的多个订阅者共享一个广播器，连续投票合并为一次推送"""
+        first = streams.get_broadcaster(1)
+        queue_a = first.subscribe()
+        queue_b = streams.get_broadcaster(1).subscribe()
+        self.assertIs(streams.get_broadcaster(1), first)
+        await asyncio.sleep(0.05)  # 等待订阅建立
+
+        for _ in range(20):
+            increment_option_count(1, 10)
+        increment_option_count(1, 11)
+
+        results_a = await asyncio.wait_for(queue_a.get(), 2)
+        results_b = await asyncio.wait_for(queue_b.get(), 2)
+        self.assertEqual(results_a, results_b)
+        self.assertEqual(results_a['total_votes'], 21)
+        self.assertTrue(queue_a.empty())
+
+        first.unsubscribe(queue_a)
+        first.unsubscribe(queue_b)
+        self.assertNotIn(1, streams._broadcasters)
+
+    @mock.patch('polls.streams.STREAM_RECONNECT_MIN_SECONDS', 0.01)
+    async def test_broadcaster_resubscribes_after_error(self):
+        """测试订阅连接出错后广播器重新订阅，推送断开期间的最新结果并继续推送之后的变化"""
+        pubsubs = []
+        real_pubsub = self.async_redis.pubsub
+
+        def pubsub():
+            connection = real_pubsub()
+            if not pubsubs:
+                connection.get_message = mock.AsyncMock(side_effect=redis.exceptions.ConnectionError("连接断开"))
+            pubsubs.append(connection)
+            return connection
+
+        with mock.patch.object(self.async_redis, 'pubsub', side_effect=pubsub):
+            broadcaster = streams.get_broadcaster(1)
+            queue = broadcaster.subscribe()
+            self.addCleanup(broadcaster.unsubscribe, queue)
+            increment_option_count(1, 10)
+
+            results = await asyncio.wait_for(queue.get(), 2)
+            self.assertEqual(results['total_votes'], 1)
+            self.assertEqual(len(pubsubs), 2)
+            self.assertFalse(broadcaster.task.done())
+
+            increment_option_count(1, 11)
+            results = await asyncio.wait_for(queue.get(), 2)
+            self.assertEqual(results['total_votes'], 2)
+
+    async def test_stream_sends_initial_results(self):
+        """测试SSE接口首先推送当前结果"""
+        response = await self.async_client.get(reverse('polls:poll-results-stream', args=[1]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = response.streaming_content
+        event = (await anext(chunks)).decode()
+        await chunks.aclose()
+
+        self.assertTrue(event.startswith('data: '))
+        self.assertEqual(json.loads(event[len('data: '):])['poll_id'], 1)
+
+    def test_stream_not_served_under_wsgi(self):
+        """测试WSGI下不提供实时推送，页面改为请求结果接口"""
+        response = self.client.get(reverse('polls:poll-results-stream', args=[1]))
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(reverse('polls:index'))
+        self.assertFalse(response.context['results_stream_enabled'])
+        self.assertContains(response, 'const RESULTS_STREAM_ENABLED = false;')
@@ -0,0 +1,341 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from unittest import mock, skipUnless
+import datetime
+import time
+
+from polls.counters import add_option_votes
+from polls.models import Poll, Option, OptionCountShard, Customer
+from polls.cache import (
+    VOTE_BUFFER_KEY, VOTE_PROCESSING_KEY, VOTE_PROCESSING_TIMEOUT, DIRTY_POLLS_KEY, POLL_EXPIRY_KEY,
+    claim_buffered_votes, set_poll_to_cache, increment_option_count, schedule_poll_expiry, local_poll_cache,
+)
+from polls.serializers import PollSerializer
+from polls.tasks import (
+    flush_vote_buffer, sync_poll_data_to_db, update_poll_status, close_due_polls, fold_shard_counts, expire_polls,
+)
+
+try:
+    import fakeredis
+except ImportError:  # Lua脚本相关测试需要fakeredis[lua]，见requirements-dev.txt
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+@override_settings(VOTE_INGESTION_MODE='buffered', VOTER_LIMIT_MODE='off')
+class TestFlushVoteBuffer(TestCase):
+    """测试写后模式下的投票缓冲与批量落库"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.poll = Poll.objects.create(
+            customer=self.customer,
+            title="缓冲投票",
+            active=True,
+            cut_off=timezone.now() + datetime.timedelta(days=1)
+        )
+        self.option1 = Option.objects.create(poll=self.poll, content="选项1", count=2)
+        self.option2 = Option.objects.create(poll=self.poll, content="选项2", count=0)
+
+        self.client = APIClient()
+        self.url = reverse('polls:public-vote-api', args=[self.poll.poll_id])
+
+    def test_votes_are_buffered_then_flushed(self):
+        """测试投票先进入缓冲队列，再由任务按增量写入数据库"""
+        for option in (self.option1, self.option1, self.option2):
+            response = self.client.post(self.url, {'option_id': option.option_id}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.redis.llen(VOTE_BUFFER_KEY), 3)
+
+        flush_vote_buffer()
+
+        self.option1.refresh_from_db()
+        self.option2.refresh_from_db()
+        self.assertEqual(self.option1.count, 4)
+        self.assertEqual(self.option2.count, 1)
+        self.assertEqual(self.redis.llen(VOTE_BUFFER_KEY), 0)
+
+    def test_expire_then_flush_counts_each_vote_once(self):
+        """测试写后模式下投票到期关闭后再落库，缓冲的投票不会重复计入"""
+        for option in (self.option1, self.option1, self.option2):
+            self.client.post(self.url, {'option_id': option.option_id}, format='json')
+        Poll.objects.filter(poll_id=self.poll.poll_id).update(cut_off=timezone.now() - datetime.timedelta(minutes=1))
+
+        self.assertEqual(expire_polls(timezone.now()), [self.poll.poll_id])
+        flush_vote_buffer()
+
+        self.option1.refresh_from_db()
+        self.option2.refresh_from_db()
+        self.assertEqual(self.option1.count, 4)
+        self.assertEqual(self.option2.count, 1)
+
+    def test_expire_flushes_buffer_before_clearing_cache(self):
+        """测试写后模式下关闭投票时先写入缓冲投票，清除缓存后重建得到完整票数"""
+        for option in (self.option1, self.option1, self.option2):
+            self.client.post(self.url, {'option_id': option.option_id}, format='json')
+        Poll.objects.filter(poll_id=self.poll.poll_id).update(cut_off=timezone.now() - datetime.timedelta(minutes=1))
+
+        expire_polls(timezone.now())
+
+        self.assertEqual(self.redis.llen(VOTE_BUFFER_KEY), 0)
+        self.assertFalse(self.redis.exists(f'poll:{self.poll.poll_id}:counts'))
+        self.option1.refresh_from_db()
+        self.assertEqual(self.option1.count, 4)
+
+    def test_failed_flush_returns_votes_to_buffer(self):
+        """测试写库失败时批次按原顺序放回缓冲队列，不留下未完成的批次"""
+        entries = [f'{self.poll.poll_id}:{self.option1.option_id}', f'{self.poll.poll_id}:{self.option2.option_id}']
+        self.redis.rpush(VOTE_BUFFER_KEY, *entries)
+
+        with mock.patch('polls.tasks.add_option_votes', side_effect=RuntimeError("数据库不可用")):
+            with self.assertRaises(RuntimeError):
+                flush_vote_buffer()
+
+        self.assertEqual(self.redis.lrange(VOTE_BUFFER_KEY, 0, -1), [e.encode() for e in entries])
+        self.assertEqual(self.redis.zcard(VOTE_PROCESSING_KEY), 0)
+
+    def test_crashed_batch_is_recovered(self):
+        """测试worker取出批次后崩溃，超时后批次被放回队列并写入数据库"""
+        self.redis.rpush(VOTE_BUFFER_KEY, *[f'{self.poll.poll_id}:{self.option1.option_id}'] * 3)
+        claim_buffered_votes(10)  # 取出后未写库也未删除批次
+        self.assertEqual(self.redis.llen(VOTE_BUFFER_KEY), 0)
+
+        flush_vote_buffer()
+        self.option1.refresh_from_db()
+        self.assertEqual(self.option1.count, 2)  # 批次尚未超时，不会被其他worker重复处理
+
+        with mock.patch('polls.cache.time.time', return_value=time.time() + VOTE_PROCESSING_TIMEOUT + 1):
+            flush_vote_buffer()
+        self.option1.refresh_from_db()
+        self.assertEqual(self.option1.count, 5)
+        self.assertEqual(self.redis.zcard(VOTE_PROCESSING_KEY), 0)
+
+    def test_flush_uses_one_update_per_option(self):
+        """测试同一批次内同一选项只执行一条UPDATE"""
+        self.redis.rpush(VOTE_BUFFER_KEY, *[f'{self.poll.poll_id}:{self.option1.option_id}'] * 50)
+
+        with CaptureQueriesContext(connection) as ctx:
+            flush_vote_buffer()
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+        self.option1.refresh_from_db()
+        self.assertEqual(self.option1.count, 52)
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+class TestSyncPollData(TestCase):
+    """测试基于脏集合的批量同步"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.polls = []
+        for i in range(3):
+            poll = Poll.objects.create(customer=self.customer, title=f"同步投票{i}", active=True)
+            Option.objects.create(poll=poll, content="选项1", count=1)
+            Option.objects.create(poll=poll, content="选项2", count=0)
+            set_poll_to_cache(poll.poll_id, PollSerializer(poll).data)
+            self.polls.append(poll)
+
+    def test_only_dirty_polls_are_synced(self):
+        """测试只有脏集合中的投票被写回，且写回后脏集合清空"""
+        option = self.polls[0].options.first()
+        increment_option_count(self.polls[0].poll_id, option.option_id)
+        increment_option_count(self.polls[0].poll_id, option.option_id)
+        self.assertEqual(self.redis.smembers(DIRTY_POLLS_KEY), {str(self.polls[0].poll_id).encode()})
+
+        with CaptureQueriesContext(connection) as ctx:
+            sync_poll_data_to_db()
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+        option.refresh_from_db()
+        self.assertEqual(option.count, 3)
+        self.assertEqual(self.redis.scard(DIRTY_POLLS_KEY), 0)
+
+        # 没有新投票时不访问数据库
+        with self.assertNumQueries(0):
+            sync_poll_data_to_db()
+
+    def test_sync_keeps_votes_written_directly_to_db(self):
+        """测试同步只写回增量，不覆盖Redis不可用时直接写入数据库的票数"""
+        option = self.polls[0].options.first()
+        for _ in range(3):
+            increment_option_count(self.polls[0].poll_id, option.option_id)
+        sync_poll_data_to_db()
+        option.refresh_from_db()
+        self.assertEqual(option.count, 4)
+
+        add_option_votes(option.option_id, 1)
+        for _ in range(2):
+            increment_option_count(self.polls[0].poll_id, option.option_id)
+        sync_poll_data_to_db()
+
+        option.refresh_from_db()
+        self.assertEqual(option.count, 7)
+
+    def test_expire_keeps_counts_when_reconcile_fails(self):
+        """测试关闭投票时写回失败，保留计数哈希并重新标记待同步，之后的同步写回全部票数"""
+        poll = self.polls[0]
+        option = poll.options.first()
+        for _ in range(3):
+            increment_option_count(poll.poll_id, option.option_id)
+        Poll.objects.filter(poll_id=poll.poll_id).update(cut_off=timezone.now() - datetime.timedelta(minutes=1))
+        self.redis.delete(DIRTY_POLLS_KEY)
+
+        with mock.patch('polls.tasks.reconcile_poll_counts', side_effect=RuntimeError("数据库不可用")):
+            self.assertEqual(expire_polls(timezone.now()), [poll.poll_id])
+
+        self.assertFalse(self.redis.exists(f'poll:{poll.poll_id}'))
+        self.assertEqual(int(self.redis.hget(f'poll:{poll.poll_id}:counts', option.option_id)), 4)
+        self.assertEqual(self.redis.smembers(DIRTY_POLLS_KEY), {str(poll.poll_id).encode()})
+
+        sync_poll_data_to_db()
+        option.refresh_from_db()
+        self.assertEqual(option.count, 4)
+
+    def test_stale_cache_does_not_overwrite_db(self):
+        """测试缓存计数小于数据库计数时不覆盖数据库"""
+        option = self.polls[1].options.first()
+        Option.objects.filter(pk=option.pk).update(count=10)
+        self.redis.sadd(DIRTY_POLLS_KEY, self.polls[1].poll_id)
+
+        sync_poll_data_to_db()
+
+        option.refresh_from_db()
+        self.assertEqual(option.count, 10)
+
+
+@skipUnless(fakeredis, "需要安装fakeredis[lua]")
+@override_settings(VOTE_INGESTION_MODE='buffered', HOT_OPTION_PROMOTION_VOTES=10, HOT_OPTION_SHARDS=4)
+class TestHotOptionSharding(TestCase):
+    """测试热点选项的分片计数"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('polls.cache.redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        local_poll_cache.clear()
+        self.addCleanup(local_poll_cache.clear)
+
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        self.poll = Poll.objects.create(customer=self.customer, title="热门投票", active=True)
+        self.hot = Option.objects.create(poll=self.poll, content="热门", count=0)
+        self.cold = Option.objects.create(poll=self.poll, content="冷门", count=0)
+
+    def buffer_votes(self, option, n):
+        self.redis.rpush(VOTE_BUFFER_KEY, *[f'{self.poll.poll_id}:{option.option_id}'] * n)
+
+    def test_hot_option_promoted_and_folded(self):
+        """测试票数达到阈值的选项被提升，之后的增量写入分片，读取时合计，定期并入"""
+        self.buffer_votes(self.hot, 20)
+        self.buffer_votes(self.cold, 2)
+        flush_vote_buffer()
+
+        self.hot.refresh_from_db()
+        self.cold.refresh_from_db()
+        self.assertEqual((self.hot.count, self.hot.shard_count), (20, 4))
+        self.assertEqual(self.cold.shard_count, 0)
+        self.assertEqual(OptionCountShard.objects.filter(option=self.hot).count(), 4)
+
+        self.buffer_votes(self.hot, 30)
+        flush_vote_buffer()
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.count, 20)
+        self.assertEqual(self.hot.total_count(), 50)
+        self.assertEqual(PollSerializer(self.poll).data['options'][0]['count'], 50)
+
+        self.assertEqual(fold_shard_counts(), "已并入 30 张分片投票")
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.count, 50)
+        self.assertEqual(self.hot.total_count(), 50)
+
+    def test_reconcile_accounts_for_shards(self):
+        """测试直接模式写回时不重复计算分片中的票数"""
+        Option.objects.filter(pk=self.hot.pk).update(count=5, shard_count=2)
+        OptionCountShard.objects.create(option=self.hot, shard=0, count=3)
+        OptionCountShard.objects.create(option=self.hot, shard=1, count=0)
+        self.redis.hset(f'poll:{self.poll.poll_id}:counts', mapping={self.hot.option_id: 10, self.cold.option_id: 0})
+        self.redis.sadd(DIRTY_POLLS_KEY, self.poll.poll_id)
+
+        sync_poll_data_to_db()
+
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.total_count(), 10)
+
+
+class TestUpdatePollStatus(TestCase):
+    """测试基于集合的过期投票关闭"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            name="测试用户",
+            email="test@example.com",
+            password="testpwd"
+        )
+        now = timezone.now()
+        self.expired = [
+            Poll.objects.create(customer=self.customer, title=f"过期投票{i}", active=True,
+                                cut_off=now - datetime.timedelta(minutes=1))
+            for i in range(3)
+        ]
+        self.open_poll = Poll.objects.create(customer=self.customer, title="进行中投票", active=True,
+                                             cut_off=now + datetime.timedelta(days=1))
+
+    @mock.patch('polls.tasks.clear_polls_cache')
+    def test_expired_polls_closed_with_accurate_count(self, clear_polls_cache):
+        """测试一条UPDATE关闭所有过期投票、返回准确数量并批量清除缓存"""
+        result = update_poll_status()
+
+        self.assertEqual(result, "已更新 3 个过期投票问卷的状态")
+        self.assertEqual(Poll.objects.filter(active=False).count(), 3)
+        self.open_poll.refresh_from_db()
+        self.assertTrue(self.open_poll.active)
+        clear_polls_cache.assert_called_once()
+        self.assertCountEqual(clear_polls_cache.call_args[0][0], [p.poll_id for p in self.expired])
+
+    @skipUnless(fakeredis, "需要安装fakeredis[lua]")
+    def test_close_due_polls_uses_schedule(self):
+        """测试按截止时间调度集合只关闭已登记的到期投票"""
+        redis = fakeredis.FakeRedis()
+        with mock.patch('polls.cache.redis_client', redis):
+            schedule_poll_expiry({self.expired[0].poll_id: self.expired[0].cut_off,
+                                  self.open_poll.poll_id: self.open_poll.cut_off})
+            result = close_due_polls()
+
+            self.assertEqual(result, "已关闭 1 个到期投票问卷")
+            self.assertEqual(redis.zcard(POLL_EXPIRY_KEY), 1)
+        self.assertEqual(list(Poll.objects.filter(active=False)), [self.expired[0]])
@@ -1,5 +1,6 @@
+from django.conf import settings
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 from .jwt import CustomerTokenObtainPairView
 from django.urls import path, include
 from .views import admin_login, admin_logout, admin_dashboard, manage_poll, delete_poll, edit_poll, delete_option
@@ -14,6 +15,18 @@ router.register(r'administrators', views.AdministratorViewSet)
 # 应用命名空间
 app_name = 'polls'
 
+# ASGI部署时启用投票、结果和详情接口的原生异步版本，URL和响应内容不变
+if getattr(settings, 'POLLS_ASYNC_VIEWS', False):
+    poll_detail_patterns = [path('api/polls/<int:pk>/', async_views.poll_detail, name='poll-detail-async')]
+    find_poll_view = async_views.get_poll_by_identifier
+    poll_results_view = async_views.poll_results
+    public_vote_view = async_views.public_vote
+else:
+    poll_detail_patterns = []
+    find_poll_view = views.get_poll_by_identifier
+    poll_results_view = views.poll_results
+    public_vote_view = views.public_vote
+
 urlpatterns = [
     # 保留原有的模板路由，确保向后兼容
     path("admin-panel/login/", admin_login, name="admin_login"),
@@ -32,12 +45,16 @@ urlpatterns = [
 
 # 投票 API
     path('api/polls/create/', views.PollCreateAPIView.as_view(), name='poll-create'),
+    path('api/polls/bulk-create/', views.PollBulkCreateAPIView.as_view(), name='poll-bulk-create'),
     path('api/polls/my-polls/', views.UserPollsAPIView.as_view(), name='my-polls'),
     path('api/polls/<int:pk>/update/', views.PollUpdateAPIView.as_view(), name='poll-update'),
     path('api/polls/<int:pk>/delete/', views.PollDeleteAPIView.as_view(), name='poll-delete'),
-    path('api/polls/find/<str:identifier>/', views.get_poll_by_identifier, name='find-poll'),
-    path('api/polls/<int:poll_id>/results/', views.poll_results, name='poll-results'),
+    path('api/polls/find/<str:identifier>/', find_poll_view, name='find-poll'),
+    path('api/polls/<int:poll_id>/results/', poll_results_view, name='poll-results'),
+    path('api/polls/results/', views.batch_poll_results, name='batch-poll-results'),
+    path('api/polls/<int:poll_id>/results/stream/', views.poll_results_stream, name='poll-results-stream'),
     # REST API
+    *poll_detail_patterns,
     path('api/', include(router.urls)),
 
     # 用户认证 API
@@ -47,6 +64,7 @@ urlpatterns = [
 
     # 用户资料 API
     path('api/profile/', views.ProfileAPIView.as_view(), name='profile'),
+    path('api/profile/change-password/', views.ChangePasswordAPIView.as_view(), name='change-password'),
     path('api/token/', CustomerTokenObtainPairView.as_view(), name='token-obtain-pair'),
     path('', views.IndexView.as_view(), name='index'),
 
@@ -54,5 +72,5 @@ urlpatterns = [
 
     # 公开投票页面和 API
     path('public-vote/', views.PublicVoteView.as_view(), name='public-vote'),
-    path('api/polls/<int:poll_id>/public-vote/', views.public_vote, name='public-vote-api'),
+    path('api/polls/<int:poll_id>/public-vote/', public_vote_view, name='public-vote-api'),
 ]
\ No newline at end of file
@@ -1,23 +1,51 @@
-from django.http import Http404
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from .jwt import get_tokens_for_customer, generate_token
 from django.views.generic import TemplateView
-import random
 import datetime
+import hashlib
+import hmac
+import ipaddress
+import random
+import re
+import uuid
 
 from .serializers import (
     CustomerSerializer, PollSerializer, OptionSerializer,
     AdministratorSerializer, CustomerProfileSerializer,
     ChangePasswordSerializer, LoginSerializer, PollCreateSerializer, PollUpdateSerializer,
-    AdminLoginSerializer  # New serializer for admin login
+    PollBulkCreateSerializer,
+    AdminLoginSerializer,  # New serializer for admin login
+    PollDashboardSerializer
 )
+from .counters import add_option_votes
+from .forms import PollForm
+from .identifiers import IDENTIFIER_DIGITS
+from .pagination import PollCursorPagination
+from .results import build_poll_results
+from .streams import stream_poll_results
 from django.views.generic import TemplateView
 from rest_framework import viewsets, generics, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from django.contrib.auth.hashers import make_password
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
 
 from .models import Customer, Poll, Option, Administrator
 
-from .cache import get_poll_from_cache, set_poll_to_cache, increment_option_count
+from .cache import (
+    aget_poll_from_cache, set_poll_to_cache,
+    get_polls_from_cache, set_polls_to_cache, get_or_load_poll, get_or_load_versioned_poll, get_poll_version,
+    get_poll_by_identifier_from_cache, set_poll_identifiers_to_cache, clear_poll_cache,
+    increment_option_count, schedule_poll_expiry, get_unique_voter_count, get_unique_voter_counts,
+    get_poll_ids_by_identifiers, DUPLICATE_VOTE, ALREADY_VOTED, POLL_CLOSED,
+    VOTE_CACHE_UNAVAILABLE, revoke_customer_tokens, is_token_revoked,
+)
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -34,6 +62,10 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, get_object_or_404, redirect
 
 
+# 序列化投票时嵌套选项；同时预取热点选项的分片计数，计算选项总票数时不再逐个查询
+POLL_OPTIONS_PREFETCH = ('options', 'options__count_shards')
+
+
 # New API version of admin_login
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -102,10 +134,53 @@ def api_admin_logout(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def api_admin_dashboard(request):
-    """API endpoint for admin dashboard - returns all polls"""
+    """
+    API endpoint for admin dashboard - returns polls page by page
+    支持的查询参数：
+      cursor / page_size                游标分页，按创建时间倒序
+      fields=poll_id,title,active,...   只返回指定字段（可包含 customer_id、total_votes）
+      active=true|false                 按状态过滤
+      customer=<customer_id>            按创建者过滤
+      cut_off_before / cut_off_after    按截止时间过滤（ISO 8601）
+    """
     polls = Poll.objects.all()
-    serializer = PollSerializer(polls, many=True)
-    return Response(serializer.data)
+
+    active = request.query_params.get('active')
+    if active is not None:
+        polls = polls.filter(active=active.lower() in ('1', 'true', 'yes'))
+    customer = request.query_params.get('customer')
+    if customer:
+        if not customer.isdigit():
+            return Response({'error': 'invalid customer'}, status=status.HTTP_400_BAD_REQUEST)
+        polls = polls.filter(customer_id=customer)
+    for param, lookup in (('cut_off_before', 'cut_off__lt'), ('cut_off_after', 'cut_off__gte')):
+        value = request.query_params.get(param)
+        if value:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                return Response({'error': f'invalid {param}'}, status=status.HTTP_400_BAD_REQUEST)
+            polls = polls.filter(**{lookup: parsed})
+
+    fields = request.query_params.get('fields')
+    if fields:
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = set(fields) - set(PollDashboardSerializer.Meta.fields)
+        if unknown:
+            return Response({'error': f'unknown fields: {", ".join(sorted(unknown))}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+    else:
+        fields = PollSerializer.Meta.fields
+
+    # 只在需要时预取选项或聚合总票数
+    if 'options' in fields:
+        polls = polls.prefetch_related(*POLL_OPTIONS_PREFETCH)
+    if 'total_votes' in fields:
+        polls = polls.annotate(total_votes=Coalesce(Sum('options__count'), 0))
+
+    paginator = PollCursorPagination()
+    page = paginator.paginate_queryset(polls, request)
+    serializer = PollDashboardSerializer(page, many=True, fields=fields)
+    return paginator.get_paginated_response(serializer.data)
 
 
 # Keep the original template-based function for backward compatibility
@@ -129,10 +204,15 @@ def admin_logout(request):
 
 
 def admin_dashboard(request):
-    polls = Poll.objects.all()
-    for poll in polls:
-        print(f"Poll: {poll.title}, Poll ID: {poll.poll_id}")  # ✅ 确保 poll.poll_id 正确
-    return render(request, "polls/admin_dashboard.html", {"polls": polls})
+    polls = Poll.objects.order_by('-created_at', '-poll_id')
+    page = Paginator(polls, 50).get_page(request.GET.get('page'))
+    return render(request, "polls/admin_dashboard.html", {"polls": page, "page_obj": page})
+
+
+def refresh_poll_cache(poll_id, removed_option_ids=()):
+    """管理后台修改投票后刷新缓存并递增版本号，计数哈希中已有的票数不会被覆盖"""
+    poll = Poll.objects.prefetch_related(*POLL_OPTIONS_PREFETCH).get(poll_id=poll_id)
+    set_poll_to_cache(poll_id, PollSerializer(poll).data, removed_option_ids=removed_option_ids, bump_version=True)
 
 
 def edit_poll(request, poll_id):
@@ -148,14 +228,16 @@ def edit_poll(request, poll_id):
             options_data = request.POST.getlist('options[]')  # 获取所有选项内容
             existing_options = list(options)  # 将已有选项转换成列表
 
-            for index, content in enumerate(options_data):
-                if index < len(existing_options):
-                    # 更新已有的选项
-                    existing_options[index].content = content
-                    existing_options[index].save()
-                else:
-                    # 添加新选项
-                    Option.objects.create(poll=poll, content=content)
+            updated_options = existing_options[:len(options_data)]
+            for option, content in zip(updated_options, options_data):
+                # 更新已有的选项
+                option.content = content
+            Option.objects.bulk_update(updated_options, ['content'])
+            # 添加新选项
+            Option.objects.bulk_create([
+                Option(poll=poll, content=content) for content in options_data[len(existing_options):]
+            ])
+            refresh_poll_cache(poll.poll_id)
 
             return redirect("polls:admin_dashboard")  # 保存后返回后台
 
@@ -169,6 +251,7 @@ def delete_option(request, option_id):
     option = get_object_or_404(Option, pk=option_id)
     poll_id = option.poll.poll_id  # 先获取问卷 ID
     option.delete()  # 删除选项
+    refresh_poll_cache(poll_id, removed_option_ids=[option_id])
     return redirect('polls:edit_poll', poll_id=poll_id)  # 重定向回编辑页面
 
 
@@ -186,8 +269,7 @@ def manage_poll(request):
 
             # 处理选项
             options_data = request.POST.getlist('options[]')
-            for content in options_data:
-                Option.objects.create(poll=poll, content=content)
+            Option.objects.bulk_create([Option(poll=poll, content=content) for content in options_data])
 
             return redirect("polls:admin_dashboard")
     else:
@@ -199,6 +281,7 @@ def manage_poll(request):
 def delete_poll(request, poll_id):
     poll = get_object_or_404(Poll, poll_id=poll_id)  # 确保 poll_id 而不是 id
     poll.delete()
+    clear_poll_cache(poll_id)
     return redirect("polls:admin_dashboard")
 
 
@@ -255,8 +338,8 @@ class ProfileAPIView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        # self.request.user 现在应该是Customer对象
-        return self.request.user
+        # self.request.user 可能是由令牌声明构造的，资料页以数据库中的最新数据为准
+        return Customer.objects.get(customer_id=self.request.user.customer_id)
 
 
 # 修改密码API
@@ -268,11 +351,21 @@ class ChangePasswordAPIView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        user = request.user
+        # request.user 可能是由令牌声明构造的，其中的name、email可能已过期：
+        # 从数据库读取当前用户，只更新密码，新令牌中的声明也以数据库为准
+        user = Customer.objects.get(customer_id=request.user.customer_id)
         user.password = make_password(serializer.validated_data['new_password'])
-        user.save()
+        user.save(update_fields=['password'])
 
-        return Response({'message': '密码已成功修改'}, status=status.HTTP_200_OK)
+        # 旧密码下签发的令牌全部失效，返回新令牌让当前会话继续使用
+        revoke_customer_tokens(user.customer_id)
+        tokens = generate_token(user)
+
+        return Response({
+            'message': '密码已成功修改',
+            'refresh': tokens['refresh'],
+            'access': tokens['access'],
+        }, status=status.HTTP_200_OK)
 
 
 # 用户投票数据API
@@ -281,65 +374,190 @@ class CustomerPollsAPIView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Poll.objects.filter(customer=self.request.user)
+        return Poll.objects.filter(customer=self.request.user).prefetch_related(*POLL_OPTIONS_PREFETCH)
+
+
+def results_stream_enabled(request):
+    """实时结果推送只在ASGI下提供：WSGI会先读完整个事件流再发送，永不结束的流会一直占用worker"""
+    return isinstance(request, ASGIRequest)
+
+
+class ResultsStreamMixin:
+    """告知页面服务器是否提供实时结果推送，不提供时页面改为请求结果接口"""
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['results_stream_enabled'] = results_stream_enabled(self.request)
+        return context
 
-class IndexView(TemplateView):
+
+class IndexView(ResultsStreamMixin, TemplateView):
     template_name = "polls/index.html"
 
 
+# 投票幂等键的最大长度
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def get_idempotency_key(request, data=None):
+    """
+    从 Idempotency-Key 请求头或请求体的 idempotency_key 字段读取幂等键，过长时抛出ValueError
+    data为已解析的请求体，默认使用DRF的request.data
+    """
+    data = request.data if data is None else data
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if key and len(str(key)) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError(f"幂等键长度不能超过{IDEMPOTENCY_KEY_MAX_LENGTH}")
+    return key or None
+
+
+# 匿名投票人的签名Cookie，值为首次投票时使用的投票人标识
+VOTER_COOKIE_NAME = 'voter_id'
+VOTER_COOKIE_SALT = 'polls.voter'
+VOTER_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+
+def _trusted_proxies():
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in getattr(settings, 'VOTER_TRUSTED_PROXIES', [])]
+
+
+def get_client_ip(request):
+    """
+    客户端IP：REMOTE_ADDR是 VOTER_TRUSTED_PROXIES 中的代理时，从右向左取 X-Forwarded-For 中第一个不可信的地址；
+    不信任任何代理时只使用REMOTE_ADDR，客户端伪造的 X-Forwarded-For 不起作用
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    proxies = _trusted_proxies()
+    if not proxies:
+        return remote_addr
+
+    def trusted(address):
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in proxy for proxy in proxies)
+
+    if not trusted(remote_addr):
+        return remote_addr
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if address.strip()]
+    for address in reversed(forwarded):
+        if not trusted(address):
+            return address
+    return forwarded[0] if forwarded else remote_addr
+
+
+def get_voter_id(request, user=None):
+    """
+    投票人标识：已登录用户使用用户ID；匿名用户使用投票时下发的签名Cookie。
+    没有Cookie时默认分配新的随机标识，匿名投票只能做到每个浏览器一票；
+    VOTER_ANONYMOUS_IP_LIMIT 为True时改用客户端IP的HMAC（不在Redis中保存原始IP），做到每个IP一票，
+    同一出口IP后的多台设备共用一票。部署在反向代理后面时需要配置 VOTER_TRUSTED_PROXIES，
+    否则所有匿名投票人都是代理的IP
+    user为已认证的用户，默认使用request.user
+    """
+    customer_id = getattr(request.user if user is None else user, 'customer_id', None)
+    if customer_id is not None:
+        return f'customer:{customer_id}'
+    voter_id = request.get_signed_cookie(VOTER_COOKIE_NAME, default=None, salt=VOTER_COOKIE_SALT)
+    if voter_id:
+        return voter_id
+    if not getattr(settings, 'VOTER_ANONYMOUS_IP_LIMIT', False):
+        return f'anon:{uuid.uuid4().hex}'
+    digest = hmac.new(settings.SECRET_KEY.encode(), get_client_ip(request).encode(), hashlib.sha256).hexdigest()
+    return f'ip:{digest[:32]}'
+
+
+def remember_voter(request, response, voter_id):
+    """
+    匿名投票提交后下发签名Cookie记住投票人标识，之后的投票（包括更换IP后）会被识别为同一投票人
+    Cookie中已是该标识或已登录时不下发
+    """
+    if not voter_id.startswith('customer:') and \
+            request.get_signed_cookie(VOTER_COOKIE_NAME, default=None, salt=VOTER_COOKIE_SALT) != voter_id:
+        response.set_signed_cookie(VOTER_COOKIE_NAME, voter_id, salt=VOTER_COOKIE_SALT,
+                                   max_age=VOTER_COOKIE_MAX_AGE, httponly=True, samesite='Lax')
+    return response
+
+
+def record_vote_on_cache_miss(poll, option, idempotency_key=None, voter_id=None):
+    """
+    缓存未命中时的计票路径：先用数据库数据预热缓存，再重试原子计数。调用方需要先确认投票仍在进行中。
+    只有Redis不可用（VOTE_CACHE_UNAVAILABLE）时才直接更新数据库，避免缓存计数和数据库计数互相覆盖；
+    此时无法去重和限制投票人，提交同样计票。返回值与 increment_option_count 相同，
+    预热后仍未能计票时返回None，调用方应提示稍后重试。
+    """
+    prefetch_related_objects([poll], *POLL_OPTIONS_PREFETCH)
+    set_poll_to_cache(poll.poll_id, PollSerializer(poll).data)
+    result = increment_option_count(poll.poll_id, option.option_id, idempotency_key, voter_id)
+    if result == VOTE_CACHE_UNAVAILABLE:
+        add_option_votes(option.option_id, 1, option.shard_count)
+    return result
+
+
 # 原有的视图集 - 保留这些，它们处理投票系统的核心功能
 class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
 
+    def perform_destroy(self, instance):
+        customer_id = instance.customer_id
+        instance.delete()
+        # 无状态认证不查询数据库，已删除用户的令牌需要显式吊销
+        revoke_customer_tokens(customer_id)
+
 
 class PollViewSet(viewsets.ModelViewSet):
-    queryset = Poll.objects.all()
+    # 列表序列化时嵌套选项，预取避免每个投票一次选项查询
+    queryset = Poll.objects.prefetch_related(*POLL_OPTIONS_PREFETCH)
     serializer_class = PollSerializer
 
     def retrieve(self, request, pk=None):
-        # 尝试从缓存获取
-        poll_data = get_poll_from_cache(pk)
-        if poll_data:
-            return Response(poll_data)
-
-        # 缓存未命中，从数据库获取
-        poll = get_object_or_404(Poll, poll_id=pk)
-        serializer = self.get_serializer(poll)
-        data = serializer.data
-
-        # 存入缓存
-        set_poll_to_cache(pk, data)
-
-        return Response(data)
+        # If-None-Match与当前版本号一致时只读取一次版本号即返回304
+        response, current_version = not_modified_response(request, poll_id=pk)
+        if response is not None:
+            return response
+        # 优先从缓存获取；缓存未命中时只有一个worker从数据库重建，其余请求等待重建结果
+        poll_data, version = load_versioned_poll_data(pk, current_version)
+        return with_etag(Response(poll_data), pk, version)
 
     @action(detail=True, methods=['post'])
     def vote(self, request, pk=None):
         option_id = request.data.get('option_id')
         if not option_id:
             return Response({'error': 'Option ID is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 使用Redis增加投票计数
-        success = increment_option_count(pk, option_id)
-        if success:
-            return Response({'status': 'vote recorded'})
-
-        # 如果Redis操作失败，则直接操作数据库
-        option = get_object_or_404(Option, option_id=option_id, poll_id=pk)
-        option.count += 1
-        option.save()
-
-        # 更新缓存
-        poll = get_object_or_404(Poll, poll_id=pk)
-        serializer = self.get_serializer(poll)
-        set_poll_to_cache(pk, serializer.data)
-
-        return Response({'status': 'vote recorded'})
+        try:
+            idempotency_key = get_idempotency_key(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 使用Redis原子地增加投票计数，带幂等键的重复提交和已投过票的投票人不计票
+        voter_id = get_voter_id(request)
+        result = increment_option_count(pk, option_id, idempotency_key, voter_id)
+        if result is None or result == VOTE_CACHE_UNAVAILABLE:
+            # 缓存未命中或Redis不可用，从数据库校验后再计票
+            poll = get_object_or_404(Poll, poll_id=pk)
+            if not poll.active:
+                return Response({'error': 'Poll is closed'}, status=status.HTTP_400_BAD_REQUEST)
+            option = get_object_or_404(Option, option_id=option_id, poll=poll)
+            result = record_vote_on_cache_miss(poll, option, idempotency_key, voter_id)
+            if result is None:
+                return Response({'error': 'Vote could not be recorded, please retry'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if result == POLL_CLOSED:
+            return Response({'error': 'Poll is closed'}, status=status.HTTP_400_BAD_REQUEST)
+        if result == ALREADY_VOTED:
+            response = Response({'error': 'Already voted'}, status=status.HTTP_400_BAD_REQUEST)
+        elif result == DUPLICATE_VOTE:
+            response = Response({'status': 'vote recorded', 'duplicate': True})
+        else:
+            response = Response({'status': 'vote recorded'})
+        return remember_voter(request, response, voter_id)
 
 
 class OptionViewSet(viewsets.ModelViewSet):
-    queryset = Option.objects.all()
+    queryset = Option.objects.prefetch_related('count_shards')
     serializer_class = OptionSerializer
 
 
@@ -370,6 +588,8 @@ class RefreshTokenView(APIView):
 
             # 获取用户
             user_id = payload.get('user_id')
+            if is_token_revoked(user_id, payload.get('iat')):
+                return Response({'error': '令牌已失效'}, status=status.HTTP_401_UNAUTHORIZED)
             user = Customer.objects.get(customer_id=user_id)
 
             # 生成新令牌
@@ -394,7 +614,21 @@ class PollCreateAPIView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(customer=self.request.user)
+        poll = serializer.save(customer=self.request.user)
+        # 登记截止时间，到期后由 close_due_polls 准时关闭
+        schedule_poll_expiry({poll.poll_id: poll.cut_off})
+        set_poll_identifiers_to_cache({poll.identifier: poll.poll_id})
+
+
+# 批量创建投票问卷
+class PollBulkCreateAPIView(generics.CreateAPIView):
+    serializer_class = PollBulkCreateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_create(self, serializer):
+        created = serializer.save()
+        schedule_poll_expiry({poll.poll_id: poll.cut_off for poll in created['polls']})
+        set_poll_identifiers_to_cache({poll.identifier: poll.poll_id for poll in created['polls']})
 
 
 # 用户的投票问卷列表
@@ -403,7 +637,7 @@ class UserPollsAPIView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Poll.objects.filter(customer=self.request.user)
+        return Poll.objects.filter(customer=self.request.user).prefetch_related(*POLL_OPTIONS_PREFETCH)
 
 
 # 更新投票问卷
@@ -419,42 +653,52 @@ class PollUpdateAPIView(generics.UpdateAPIView):
         serializer = self.get_serializer(poll, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
 
-        # 更新投票问卷基本信息
-        poll.title = serializer.validated_data.get('title', poll.title)
-        poll.cut_off = serializer.validated_data.get('cut_off', poll.cut_off)
-        poll.save()
-
-        # 处理现有选项的更新和删除
-        if 'options' in serializer.validated_data:
-            for option_data in serializer.validated_data['options']:
-                if option_data.get('delete', False):
-                    # 删除选项
-                    if 'option_id' in option_data:
-                        try:
-                            option = Option.objects.get(option_id=option_data['option_id'], poll=poll)
-                            option.delete()
-                        except Option.DoesNotExist:
-                            pass
-                elif 'option_id' in option_data:
-                    # 更新选项
-                    try:
-                        option = Option.objects.get(option_id=option_data['option_id'], poll=poll)
-                        option.content = option_data['content']
-                        option.save()
-                    except Option.DoesNotExist:
-                        pass
-
-        # 添加新选项
-        if 'new_options' in serializer.validated_data:
-            for option_text in serializer.validated_data['new_options']:
-                Option.objects.create(poll=poll, content=option_text)
-
-        # 清除缓存
-        from .cache import clear_poll_cache
-        clear_poll_cache(poll.poll_id)
+        data = serializer.validated_data
+
+        # 一次取出所有选项，在内存中计算需要更新、删除和新增的选项
+        options = {option.option_id: option for option in poll.options.all()}
+        updated, deleted_ids = {}, set()
+        for option_data in data.get('options', []):
+            try:
+                option = options.get(int(option_data.get('option_id')))
+            except (TypeError, ValueError):
+                option = None
+            if option is None:
+                continue
+            if option_data.get('delete', False):
+                deleted_ids.add(option.option_id)
+            elif 'content' in option_data and option.content != option_data['content']:
+                option.content = option_data['content']
+                updated[option.option_id] = option
+        created = [Option(poll=poll, content=text) for text in data.get('new_options', [])]
+
+        # 更新投票问卷基本信息，只写入发生变化的字段
+        changed_fields = [field for field in ('title', 'cut_off', 'chart_type')
+                          if field in data and getattr(poll, field) != data[field]]
+        for field in changed_fields:
+            setattr(poll, field, data[field])
+
+        with transaction.atomic():
+            if changed_fields:
+                poll.save(update_fields=changed_fields)
+            if deleted_ids:
+                Option.objects.filter(poll=poll, option_id__in=deleted_ids).delete()
+            updated = [option for option_id, option in updated.items() if option_id not in deleted_ids]
+            if updated:
+                Option.objects.bulk_update(updated, ['content'])
+            if created:
+                Option.objects.bulk_create(created)
+
+        if 'cut_off' in changed_fields:
+            schedule_poll_expiry({poll.poll_id: poll.cut_off})
+
+        # 就地更新缓存：覆盖元数据、删除已移除选项的计数、为新选项补齐计数，已有票数保持不变
+        prefetch_related_objects([poll], *POLL_OPTIONS_PREFETCH)
+        poll_data = PollSerializer(poll).data
+        set_poll_to_cache(poll.poll_id, poll_data, removed_option_ids=sorted(deleted_ids), bump_version=True)
 
         # 返回更新后的投票问卷
-        return Response(PollSerializer(poll).data)
+        return Response(poll_data)
 
 
 # 删除投票问卷
@@ -466,7 +710,6 @@ class PollDeleteAPIView(generics.DestroyAPIView):
 
     def perform_destroy(self, instance):
         # 清除缓存
-        from .cache import clear_poll_cache
         clear_poll_cache(instance.poll_id)
         instance.delete()
 
@@ -475,12 +718,37 @@ class PollDeleteAPIView(generics.DestroyAPIView):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_poll_by_identifier(request, identifier):
+    """
+    分享链接使用投票码访问投票，先在一次Redis往返中解析投票码并读取投票数据
+    不存在的投票码写入短期否定缓存，重复查询不再访问数据库
+    """
+    not_found = Response({"error": "找不到该投票问卷"}, status=status.HTTP_404_NOT_FOUND)
+    if len(identifier) != IDENTIFIER_DIGITS or not identifier.isdigit():
+        return not_found
+
+    response, current_version = not_modified_response(request, identifier=identifier)
+    if response is not None:
+        return response
+
+    poll_id, poll_data, version = get_poll_by_identifier_from_cache(identifier)
+    if poll_data is not None:
+        return with_etag(Response(poll_data), poll_id, version)
+    if poll_id == 0:
+        return not_found
+    if poll_id is None:
+        poll_id = Poll.objects.filter(identifier=identifier).values_list('poll_id', flat=True).first()
+        if poll_id is None:
+            set_poll_identifiers_to_cache({identifier: None})
+            return not_found
+
     try:
-        poll = Poll.objects.get(identifier=identifier)
-        serializer = PollSerializer(poll)
-        return Response(serializer.data)
-    except Poll.DoesNotExist:
-        return Response({"error": "找不到该投票问卷"}, status=status.HTTP_404_NOT_FOUND)
+        # 由load_versioned_poll_data预热缓存，同时写入投票码映射
+        poll_data, version = load_versioned_poll_data(poll_id, current_version)
+        return with_etag(Response(poll_data), poll_id, version)
+    except Http404:
+        # 映射指向的投票已被删除
+        set_poll_identifiers_to_cache({identifier: None})
+        return not_found
 
 
 @api_view(['GET'])
@@ -488,29 +756,180 @@ def get_poll_by_identifier(request, identifier):
 def poll_results(request, poll_id):
     """
     获取投票结果
+    结果由缓存中的元数据和随投票原子递增的计数哈希直接计算，命中时不访问数据库
     """
-    poll = get_object_or_404(Poll, poll_id=poll_id)
-    serializer = PollSerializer(poll)
-    data = serializer.data
+    response, current_version = not_modified_response(request, poll_id=poll_id)
+    if response is not None:
+        return response
+    poll_data, version = load_versioned_poll_data(poll_id, current_version)
+    results = build_poll_results(poll_data)
+    # 独立投票人数为HyperLogLog的近似值
+    results['unique_voters'] = get_unique_voter_count(poll_id)
+    return with_etag(Response(results), poll_id, version)
 
-    # 计算总票数
-    total_votes = sum(option['count'] for option in data['options'])
 
-    # 计算每个选项的百分比
-    for option in data['options']:
-        if total_votes > 0:
-            option['percentage'] = round((option['count'] / total_votes) * 100, 1)
+# 批量查询投票结果时一次最多请求的投票数
+BATCH_RESULTS_MAX_POLLS = 100
+
+
+def _split_param(value):
+    return [item for item in (value or '').split(',') if item]
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def batch_poll_results(request):
+    """
+    批量获取投票结果，通过 ids（投票ID）或 identifiers（投票码）传入逗号分隔的列表
+    结果按请求顺序返回，每项与 poll_results 的结构相同；
+    投票码先从映射缓存解析，投票数据一次批量读取，未命中的部分各用一次查询从数据库加载并预热缓存
+    """
+    ids = _split_param(request.GET.get('ids'))
+    identifiers = _split_param(request.GET.get('identifiers'))
+    if not ids and not identifiers:
+        return Response({"error": "请提供ids或identifiers参数"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) + len(identifiers) > BATCH_RESULTS_MAX_POLLS:
+        return Response({"error": f"一次最多查询{BATCH_RESULTS_MAX_POLLS}个投票问卷"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not all(poll_id.isdigit() for poll_id in ids):
+        return Response({"error": "ids必须为数字"}, status=status.HTTP_400_BAD_REQUEST)
+
+    requested = [int(poll_id) for poll_id in ids]
+    if identifiers:
+        # 格式不对的投票码不可能存在，不查询也不写入否定缓存
+        valid = [identifier for identifier in identifiers
+                 if len(identifier) == IDENTIFIER_DIGITS and identifier.isdigit()]
+        id_by_identifier = get_poll_ids_by_identifiers(valid)
+        unresolved = [identifier for identifier in valid if identifier not in id_by_identifier]
+        if unresolved:
+            found = dict(Poll.objects.filter(identifier__in=unresolved).values_list('identifier', 'poll_id'))
+            resolved = {identifier: found.get(identifier) for identifier in unresolved}
+            set_poll_identifiers_to_cache(resolved)
+            id_by_identifier.update(resolved)
+        # 否定缓存中的投票码解析为0，与未找到一样处理
+        requested.extend(id_by_identifier.get(identifier) or None for identifier in identifiers)
+    poll_ids = list(dict.fromkeys(poll_id for poll_id in requested if poll_id is not None))
+
+    polls_data = get_polls_from_cache(poll_ids)
+    missing = [poll_id for poll_id in poll_ids if poll_id not in polls_data]
+    if missing:
+        db_data = {
+            poll.poll_id: PollSerializer(poll).data
+            for poll in Poll.objects.filter(poll_id__in=missing).prefetch_related(*POLL_OPTIONS_PREFETCH)
+        }
+        set_polls_to_cache(db_data)
+        # 计数哈希可能包含尚未同步到数据库的票数，以缓存中的计数为准
+        db_data.update(get_polls_from_cache(list(db_data)))
+        polls_data.update(db_data)
+
+    unique_voters = get_unique_voter_counts(list(polls_data))
+    results = []
+    not_found = []
+    for key, poll_id in zip(ids + identifiers, requested):
+        if poll_id in polls_data:
+            result = build_poll_results(polls_data[poll_id])
+            result['unique_voters'] = unique_voters[poll_id]
+            results.append(result)
         else:
-            option['percentage'] = 0
+            not_found.append(key)
+    return Response({"results": results, "not_found": not_found})
+
+
+def poll_loader(poll_id):
+    def load_from_db():
+        poll = get_object_or_404(Poll.objects.prefetch_related(*POLL_OPTIONS_PREFETCH), poll_id=poll_id)
+        return PollSerializer(poll).data
+    return load_from_db
+
+
+def load_poll_data(poll_id):
+    """读取投票数据，缓存未命中或即将过期时由一个worker从数据库加载并预热缓存"""
+    return get_or_load_poll(poll_id, poll_loader(poll_id))
+
+
+def load_versioned_poll_data(poll_id, min_version=None):
+    """
+    与 load_poll_data 相同，同时返回用作ETag的版本号：(poll_data, version)
+    min_version为条件请求时读到的当前版本号，进程内缓存中更旧的条目不会被使用
+    """
+    return get_or_load_versioned_poll(poll_id, poll_loader(poll_id), min_version)
+
+
+# 由 poll_etag 生成的ETag，格式为 "poll_id-版本号"
+POLL_ETAG_PATTERN = re.compile(r'(?:W/)?"(\d+)-(\d+)"')
+
+
+def poll_etag(poll_id, version):
+    return f'"{poll_id}-{version}"'
+
+
+def requested_poll_etags(request, poll_id=None):
+    """
+    解析If-None-Match中的投票ETag，返回 (poll_id, [(poll_id, version), ...])
+    指定poll_id时只保留该投票的ETag；没有可用的ETag时poll_id为None
+    """
+    etags = [(int(tag_poll_id), int(version))
+             for tag_poll_id, version in POLL_ETAG_PATTERN.findall(request.headers.get('If-None-Match', ''))]
+    if poll_id is not None:
+        etags = [tag for tag in etags if str(tag[0]) == str(poll_id)]
+    return (etags[0][0], etags) if etags else (None, etags)
+
+
+def not_modified_for_version(poll_id, etags, version):
+    """版本号与客户端持有的某个ETag一致时返回304响应，否则返回None"""
+    if version is None or (poll_id, version) not in etags:
+        return None
+    response = HttpResponseNotModified()
+    response['ETag'] = poll_etag(poll_id, version)
+    return response
+
+
+def not_modified_response(request, poll_id=None, identifier=None):
+    """
+    If-None-Match与投票当前版本号一致时返回304响应，返回 (响应或None, 读取到的当前版本号)
+    只读取一次版本号，不序列化、不访问数据库；按投票码访问时同一次往返内确认投票码对应该投票
+    没有条件请求头时不读取版本号，版本号为None
+    """
+    target, etags = requested_poll_etags(request, poll_id)
+    if target is None:
+        return None, None
+    version = get_poll_version(target, identifier)
+    return not_modified_for_version(target, etags, version), version
 
-    # 添加总票数信息
-    data['total_votes'] = total_votes
 
-    return Response(data)
+def with_etag(response, poll_id, version):
+    """为响应附加投票版本号ETag，并要求客户端每次使用前重新验证"""
+    if version is not None:
+        response['ETag'] = poll_etag(poll_id, version)
+        response['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def poll_results_stream(request, poll_id):
+    """
+    实时投票结果推送（Server-Sent Events），只在以ASGI方式部署时提供，WSGI下返回404
+    同一进程内观看同一投票的所有客户端共享一个Redis订阅，推送频率受 STREAM_UPDATES_PER_SECOND 限制
+    """
+    if not results_stream_enabled(request):
+        return JsonResponse({"error": "实时结果推送需要以ASGI方式部署"}, status=status.HTTP_404_NOT_FOUND)
+    poll_data = await aget_poll_from_cache(poll_id)
+    if poll_data is None:
+        try:
+            poll_data = await sync_to_async(load_poll_data)(poll_id)
+        except Http404:
+            return JsonResponse({"error": "找不到该投票问卷"}, status=status.HTTP_404_NOT_FOUND)
+
+    response = StreamingHttpResponse(
+        stream_poll_results(poll_id, build_poll_results(poll_data)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # 关闭nginx缓冲，事件立即送达
+    return response
 
 
 # 公开投票页面视图
-class PublicVoteView(TemplateView):
+class PublicVoteView(ResultsStreamMixin, TemplateView):
     template_name = "polls/public_vote.html"
 
 
@@ -522,13 +941,30 @@ def public_vote(request, poll_id):
     公开投票API，允许未登录用户进行投票
     """
     try:
+        option_id = request.data.get('option_id')
+        try:
+            idempotency_key = get_idempotency_key(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 快速路径：缓存命中时一次Redis往返即可完成校验、去重、投票人检查和计票
+        voter_id = get_voter_id(request)
+        result = increment_option_count(poll_id, option_id, idempotency_key, voter_id) if option_id else None
+        if result == POLL_CLOSED:
+            return Response({"error": "此投票已结束"}, status=status.HTTP_400_BAD_REQUEST)
+        if result == ALREADY_VOTED:
+            return remember_voter(request, Response({"error": "您已经投过票了"}, status=status.HTTP_400_BAD_REQUEST), voter_id)
+        if result == DUPLICATE_VOTE:
+            return remember_voter(request, Response({"status": "投票成功", "duplicate": True}), voter_id)
+        if result is not None and result != VOTE_CACHE_UNAVAILABLE:
+            return remember_voter(request, Response({"status": "投票成功"}), voter_id)
+
         poll = get_object_or_404(Poll, poll_id=poll_id)
 
         # 检查投票是否已结束
         if not poll.active:
             return Response({"error": "此投票已结束"}, status=status.HTTP_400_BAD_REQUEST)
 
-        option_id = request.data.get('option_id')
         if not option_id:
             return Response({"error": "请选择一个选项"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -536,17 +972,17 @@ def public_vote(request, poll_id):
         option = get_object_or_404(Option, option_id=option_id, poll=poll)
 
         # 增加投票计数
-        option.count += 1
-        option.save()
-
-        # 尝试更新缓存
-        try:
-            from .cache import increment_option_count, clear_poll_cache
-            increment_option_count(poll_id, option_id)
-        except Exception as e:
-            print(f"缓存更新失败: {str(e)}")
+        result = record_vote_on_cache_miss(poll, option, idempotency_key, voter_id)
+        if result is None:
+            return Response({"error": "暂时无法计票，请稍后重试"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if result == POLL_CLOSED:
+            return Response({"error": "此投票已结束"}, status=status.HTTP_400_BAD_REQUEST)
+        if result == ALREADY_VOTED:
+            return remember_voter(request, Response({"error": "您已经投过票了"}, status=status.HTTP_400_BAD_REQUEST), voter_id)
+        if result == DUPLICATE_VOTE:
+            return remember_voter(request, Response({"status": "投票成功", "duplicate": True}), voter_id)
 
-        return Response({"status": "投票成功"})
+        return remember_voter(request, Response({"status": "投票成功"}), voter_id)
 
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
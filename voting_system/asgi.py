@@ -3,6 +3,14 @@ ASGI config for voting_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Live results (polls.views.poll_results_stream) hold a long-lived
+Server-Sent Events connection per viewer and need this ASGI entry point,
+e.g. ``uvicorn voting_system.asgi:application``.
+
+Set ``POLLS_ASYNC_VIEWS = True`` when serving through this entry point so the
+vote, results and poll detail endpoints use the native async views in
+polls.async_views instead of holding a worker thread per request.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
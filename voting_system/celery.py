@@ -22,4 +22,16 @@ app.conf.beat_schedule = {
         'task': 'polls.tasks.update_poll_status',
         'schedule': 300.0,  # 每5分钟运行一次
     },
+    'close-due-polls-every-5-seconds': {
+        'task': 'polls.tasks.close_due_polls',
+        'schedule': 5.0,  # 按截止时间准时关闭投票
+    },
+    'flush-vote-buffer-every-second': {
+        'task': 'polls.tasks.flush_vote_buffer',
+        'schedule': 1.0,  # 写后模式下每秒批量落库一次
+    },
+    'fold-shard-counts-every-10-seconds': {
+        'task': 'polls.tasks.fold_shard_counts',
+        'schedule': 10.0,  # 把热点选项的分片票数并入选项计数
+    },
 }
\ No newline at end of file
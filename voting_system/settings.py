@@ -95,6 +95,15 @@ REST_FRAMEWORK = {
     ),
 }
 
+# 无状态认证：访问令牌带有name/email声明时直接据此构造用户，不查询数据库；
+# 吊销通过 polls.cache.revoke_customer_tokens 登记，每个请求只做一次Redis查询
+JWT_STATELESS_AUTH = True
+# 令牌缺少声明时缓存用户查询结果的时间（秒，0表示不缓存）
+JWT_PRINCIPAL_CACHE_TTL = 0
+# 已验证令牌的进程内缓存：最多缓存的令牌数，以及缓存时间上限（秒，实际不超过令牌的exp）
+JWT_TOKEN_CACHE_SIZE = 10000
+JWT_TOKEN_CACHE_MAX_TTL = 3600
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -110,6 +119,48 @@ CACHES = {
     }
 }
 
+# polls.cache 使用的Redis客户端，未设置LOCATION时使用上面 CACHES['default'] 的地址
+POLLS_REDIS = {
+    'MAX_CONNECTIONS': 50,  # 每个进程连接池的连接数上限，池耗尽时最多等待POOL_TIMEOUT秒
+    'POOL_TIMEOUT': 1.0,
+    'SOCKET_TIMEOUT': 0.5,  # 读写超时（秒）
+    'SOCKET_CONNECT_TIMEOUT': 0.5,
+    'HEALTH_CHECK_INTERVAL': 30,  # 连接空闲超过该秒数后，使用前先发送PING检查
+    'RETRY_ATTEMPTS': 1,  # 连接错误或超时后的快速重试次数
+    # Sentinel部署时填写 [('sentinel-1', 26379), ...] 和主节点服务名，LOCATION中的db和密码仍然生效
+    'SENTINELS': [],
+    'SENTINEL_SERVICE': 'mymaster',
+}
+
+# 投票写入模式：
+# 'direct'   - 票数累加在Redis计数哈希中，由 sync_poll_data_to_db 定期写回数据库
+# 'buffered' - 写后模式，投票同时追加到Redis缓冲队列，由 flush_vote_buffer 每秒批量落库
+VOTE_INGESTION_MODE = 'direct'
+
+# 投票数据的进程内一级缓存：最多缓存的投票数，以及允许的最大陈旧时间（秒，0表示关闭）
+POLL_LOCAL_CACHE_SIZE = 1024
+POLL_LOCAL_CACHE_TTL = 1.0
+
+# 每个投票人只能投一票：'set' 精确记录投票人集合；'bloom' 使用每个投票一个布隆过滤器，
+# 大小由预期投票人数和目标误判率确定（10万投票人、1%误判率时约117KB）；'off' 不限制
+VOTER_LIMIT_MODE = 'set'
+VOTER_BLOOM_EXPECTED_VOTERS = 100000
+VOTER_BLOOM_ERROR_RATE = 0.01
+# 没有投票人Cookie的匿名投票人默认各自分配新标识（每个浏览器一票）；设为True时按客户端IP限制每IP一票。
+# 部署在反向代理（如nginx）后面时需要在 VOTER_TRUSTED_PROXIES 中列出代理的地址或网段，
+# 从 X-Forwarded-For 中取得客户端IP，否则所有匿名投票人共用代理的IP，每个投票只能收到一张匿名票
+VOTER_ANONYMOUS_IP_LIMIT = False
+VOTER_TRUSTED_PROXIES = []
+
+# 热点选项的分片计数：一批缓冲投票中单个选项的票数达到阈值时自动提升为分片计数，
+# 之后该选项的增量随机写入HOT_OPTION_SHARDS个分片行之一，由 fold_option_shards 定期并入
+HOT_OPTION_SHARDS = 16
+HOT_OPTION_PROMOTION_VOTES = 1000
+
+# 以ASGI方式部署（voting_system.asgi）时设为True，投票、结果和详情接口改用 polls.async_views 中的原生异步视图；
+# WSGI部署保持False，继续使用同步视图
+POLLS_ASYNC_VIEWS = False
+
 # 配置Celery
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'